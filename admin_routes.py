@@ -4,7 +4,7 @@ from flask_login import login_required, current_user, login_user
 from werkzeug.security import generate_password_hash
 from werkzeug.utils import secure_filename
 from admissions.models import AdmissionVoucher, Application
-from models import PasswordResetRequest, PasswordResetToken, StudentFeeBalance, db, User, Admin, StudentProfile, ParentProfile, Quiz, Question, Option, StudentQuizSubmission, Assignment, CourseMaterial, Course, CourseLimit, TimetableEntry, TeacherProfile, AcademicCalendar, AcademicYear, ClassFeeStructure, StudentFeeTransaction, ParentChildLink, Exam, ExamSubmission, ExamQuestion, ExamAttempt, ExamOption, ExamSet, ExamSetQuestion, SchoolClass
+from models import PasswordResetRequest, PromotionRun, VoucherBatch, PasswordResetToken, StudentFeeBalance, db, User, Admin, StudentProfile, ParentProfile, Quiz, Question, Option, StudentQuizSubmission, Assignment, CourseMaterial, Course, CourseLimit, TimetableEntry, TeacherProfile, AcademicCalendar, AcademicYear, ClassFeeStructure, StudentFeeTransaction, ParentChildLink, Exam, ExamSubmission, ExamQuestion, ExamAttempt, ExamOption, ExamSet, ExamSetQuestion, SchoolClass
 from datetime import date, datetime, timedelta, time
 from sqlalchemy import extract, asc, desc
 from sqlalchemy.orm import joinedload
@@ -12,13 +12,23 @@ from sqlalchemy.exc import IntegrityError
 import os, json, csv, re, string, random
 from sqlalchemy import func
 from forms import AdminLoginForm, QuizForm, AdminRegisterForm, AssignmentForm, MaterialForm, CourseForm, CourseLimitForm, ExamForm, ExamSetForm, ExamQuestionForm
-from utils.promotion import promote_student
-from utils.score import calculate_student_score
-from utils.backup import generate_quiz_csv_backup, backup_students_to_csv
+from utils.backup import generate_quiz_csv_backup
 from utils.serializers import (serialize_admin, serialize_submission, serialize_user, serialize_student, serialize_quiz, serialize_question, serialize_option, serialize_submission)
 from utils.receipts import generate_receipt  # ✅ import the receipt generator
-from utils.email import send_approval_credentials_email, send_email, send_temporary_password_email, send_password_reset_email
+from utils.email import send_approval_credentials_email, send_email
+from utils.email_utils import send_temporary_password_email, send_password_reset_email
 from utils.notifications import create_assignment_notification, create_fee_notification
+from services.exam_payload_cache import ExamPayloadCache
+from services.quiz_payload_cache import QuizPayloadCache
+from services.attendance_service import AttendanceService
+from services.attendance_summary_service import AttendanceSummaryService
+from services.set_assignment_planner import SetAssignmentPlanner
+from services.notification_fanout import NotificationFanout
+from services.notification_counter_service import NotificationCounterService
+from services.notification_inbox_service import NotificationInboxService
+from services.notification_push import NotificationPush
+from services.id_allocator import IdAllocator
+from services.promotion_service import PromotionService
 import uuid, secrets
 from zipfile import ZipFile
 import tempfile
@@ -135,21 +145,12 @@ def register_user():
         if not username:
             username = generate_unique_username(first_name, middle_name, last_name, role)
 
-        prefix_map = {'student': 'STD', 'teacher': 'TCH', 'parent': 'PAR'}
-        prefix = prefix_map.get(role.lower(), 'GEN')
-
-        base_count = User.query.filter_by(role=role).count() + 1
-        count = base_count
-        while True:
-            user_id = f"{prefix}{count:03d}"
-            if not User.query.filter_by(user_id=user_id).first():
-                break
-            count += 1
-
         if User.query.filter_by(username=username).first():
             flash("Generated username already exists—please try again.", 'danger')
             return redirect(url_for('admin.register_user'))
 
+        user_id = IdAllocator.user_id(role)
+
         new_user = User(
             user_id=user_id,
             username=username,
@@ -245,6 +246,8 @@ def register_user():
                         db.session.add(ParentChildLink(parent_id=parent_profile.id, student_id=int(sid)))
 
             db.session.commit()
+            if role == 'student':
+                AttendanceService.invalidate_roster(student_profile.current_class)
             flash(f"{role.title()} '{first_name} {last_name}' registered successfully! Username: {username}", "success")
             return redirect(url_for('admin.dashboard'))
 
@@ -292,28 +295,40 @@ def get_students_by_class(class_name):
 
 
 def generate_unique_username(first_name, middle_name, last_name, role):
-    first_initial = first_name[0].lower() if first_name else ''
-    middle_initial = middle_name[0].lower() if middle_name else ''
-    surname_part = last_name.lower()
+    return IdAllocator.username(first_name, middle_name, last_name, role)
 
-    base_username = f"{first_initial}{middle_initial}{surname_part}"
+@admin_bp.route('/users/import', methods=['GET', 'POST'])
+@login_required
+def import_users():
+    """Bulk registration from a CSV/XLSX sheet: validate the whole file first, then import."""
+    from services.user_import_service import UserImportService
 
-    domain_map = {
-        'student': 'st.knust.edu.gh',
-        'teacher': 'tch.knust.edu.gh',
-        'parent': 'par.knust.edu.gh'
-    }
-    domain = domain_map.get(role, 'knust.edu.gh')
+    admin_only()
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash("Choose a CSV or XLSX file to upload.", "warning")
+            return redirect(url_for('admin.import_users'))
 
-    full_username = f"{base_username}@{domain}"
+        dry_run = request.form.get('action') != 'import'
+        try:
+            result = UserImportService.run(upload, dry_run=dry_run, skip_invalid=bool(request.form.get('skip_invalid')))
+        except ValueError as e:
+            flash(str(e), "danger")
+            return redirect(url_for('admin.import_users'))
+        except IntegrityError:
+            flash("Another registration took one of these IDs or usernames meanwhile. Nothing was imported; please try again.", "danger")
+            return redirect(url_for('admin.import_users'))
 
-    counter = 1
-    unique_username = full_username
-    while User.query.filter_by(username=unique_username).first():
-        unique_username = f"{base_username}{counter}@{domain}"
-        counter += 1
+        if result["created"]:
+            if result["by_role"].get('student'):
+                AttendanceService.invalidate_roster()
+            flash(f"Imported {result['created']} user(s).", "success")
+        elif not dry_run and result["errors"]:
+            flash("Nothing was imported: fix the errors below or tick 'skip invalid rows'.", "danger")
 
-    return unique_username
+    return render_template('admin/import_users.html', result=result)
 
 @admin_bp.route('/generate-username', methods=['POST'])
 @login_required
@@ -369,6 +384,7 @@ def manage_quizzes():
 @admin_bp.route('/edit/<model>/<int:record_id>', methods=['GET', 'POST'])
 @login_required
 def edit_record(model, record_id):
+    admin_only()
     if model == 'parents':
         parent = ParentProfile.query.get_or_404(record_id)
     elif model == 'students':
@@ -772,6 +788,7 @@ def edit_quiz(quiz_id):
                     a_index += 1
 
         db.session.commit()
+        QuizPayloadCache.invalidate(quiz.id)
         flash("Quiz updated successfully!", "success")
         return redirect(url_for('admin.manage_quizzes'))
 
@@ -787,6 +804,7 @@ def delete_quiz(quiz_id):
     quiz = Quiz.query.get_or_404(quiz_id)
     db.session.delete(quiz)
     db.session.commit()
+    QuizPayloadCache.invalidate(quiz_id)
     flash("Quiz deleted successfully.", "success")
     return redirect(url_for('admin.manage_quizzes'))
 
@@ -1083,6 +1101,7 @@ def create_exam_question(exam_id):
 
             # commit everything
             db.session.commit()
+            ExamPayloadCache.invalidate(exam.id)
             flash("Question created.", "success")
             return redirect(url_for('admin.exam_sets', exam_id=exam.id))
 
@@ -1150,6 +1169,7 @@ def edit_exam(exam_id):
         exam.assignment_mode = form.assignment_mode.data
         exam.assignment_seed = (form.assignment_seed.data or None)
         db.session.commit()
+        ExamPayloadCache.invalidate(exam.id)
         flash("Exam updated successfully!", "success")
         return redirect(url_for("admin.manage_exams"))
 
@@ -1260,6 +1280,7 @@ def edit_exam_question(exam_id, question_id):
                 # No further action needed: question row already created
 
             db.session.commit()
+            ExamPayloadCache.invalidate(exam.id)
             flash("Question updated successfully!", "success")
             return redirect(url_for('admin.exam_sets', exam_id=exam.id))
 
@@ -1325,6 +1346,7 @@ def delete_exam_question(exam_id, question_id):
     try:
         db.session.delete(question)
         db.session.commit()
+        ExamPayloadCache.invalidate(exam.id)
         flash("Question deleted successfully.", "success")
     except Exception as e:
         db.session.rollback()
@@ -1335,12 +1357,21 @@ def delete_exam_question(exam_id, question_id):
 @admin_bp.route('/exams/delete/<int:exam_id>', methods=['POST', 'GET'])
 @login_required
 def delete_exam(exam_id):
+    from models import AttemptState, AttemptStateAnswer, ExamSetAssignment, ExamSubmissionClaim
+
     admin_only()
     exam = Exam.query.get_or_404(exam_id)
 
     try:
+        # side tables are keyed by exam_id alone; an exam that reuses this id must not inherit them
+        states = db.select(AttemptState.id).where(AttemptState.kind == 'exam', AttemptState.assessment_id == exam.id)
+        AttemptStateAnswer.query.filter(AttemptStateAnswer.state_id.in_(states)).delete(synchronize_session=False)
+        AttemptState.query.filter_by(kind='exam', assessment_id=exam.id).delete(synchronize_session=False)
+        ExamSubmissionClaim.query.filter_by(exam_id=exam.id).delete(synchronize_session=False)
+        ExamSetAssignment.query.filter_by(exam_id=exam.id).delete(synchronize_session=False)
         db.session.delete(exam)
         db.session.commit()
+        ExamPayloadCache.discard(exam_id)
         flash("Exam deleted successfully.", "success")
     except Exception as e:
         db.session.rollback()
@@ -1349,16 +1380,41 @@ def delete_exam(exam_id):
 
     return redirect(url_for('admin.manage_exams'))
 
+# Publish: prebuild the take-exam payload of every set so exam start is a cache hit
+@admin_bp.route('/exam/<int:exam_id>/publish', methods=['POST'])
+@login_required
+def publish_exam(exam_id):
+    admin_only()
+    exam = Exam.query.get_or_404(exam_id)
+    try:
+        version = ExamPayloadCache.publish(exam)
+
+        # seat-aware, balanced set plan for the whole roster
+        row_width = request.form.get('row_width', type=int) or 0
+        assigned = SetAssignmentPlanner.plan(exam, row_width=row_width)
+
+        flash(f"Exam published (version {version}, {assigned} students assigned to sets).", "success")
+    except Exception as e:
+        current_app.logger.exception("Failed publishing exam")
+        db.session.rollback()
+        flash(f"Error publishing exam: {e}", "danger")
+    return redirect(url_for('admin.exam_sets', exam_id=exam.id))
+
 # 4. Delete a set
 @admin_bp.route('/exam/<int:exam_id>/sets/<int:set_id>/delete', methods=['POST'])
 @login_required
 def delete_exam_set(exam_id, set_id):
+    from models import ExamSetAssignment
+
     admin_only()
     exam = Exam.query.get_or_404(exam_id)
     exam_set = ExamSet.query.filter_by(id=set_id, exam_id=exam.id).first_or_404()
     try:
+        # its students become late joiners and get a remaining set from SetAssignmentPlanner.set_for
+        ExamSetAssignment.query.filter_by(exam_id=exam.id, set_id=exam_set.id).delete(synchronize_session=False)
         db.session.delete(exam_set)
         db.session.commit()
+        ExamPayloadCache.invalidate(exam.id)
         flash("Set deleted.", "success")
     except Exception as e:
         current_app.logger.exception("Failed deleting set")
@@ -1407,6 +1463,7 @@ def add_questions_to_set(exam_id, set_id):
             added.append(qid)
 
         db.session.commit()
+        ExamPayloadCache.invalidate(exam.id)
         return jsonify({"status": "ok", "added": added, "skipped": skipped}), 200
 
     except Exception as e:
@@ -1435,6 +1492,7 @@ def remove_question_from_set(exam_id, set_id):
 
         db.session.delete(sq)
         db.session.commit()
+        ExamPayloadCache.invalidate(exam.id)
         return jsonify({"status": "ok", "removed": qid}), 200
     except Exception as e:
         current_app.logger.exception("Failed removing question from set")
@@ -1465,6 +1523,7 @@ def reorder_set_questions(exam_id, set_id):
             sq.order = idx
             db.session.add(sq)
         db.session.commit()
+        ExamPayloadCache.invalidate(exam.id)
         return jsonify({"status": "ok"}), 200
     except Exception as e:
         current_app.logger.exception("Failed reordering set")
@@ -1658,6 +1717,7 @@ def add_event():
     )
     db.session.add(calendar)
     db.session.commit()
+    AttendanceService.invalidate_calendar()
     return '', 204
 
 @admin_bp.route('/events/edit/<int:event_id>', methods=['POST'])
@@ -1670,6 +1730,7 @@ def edit_event(event_id):
     event.break_type = request.form.get('break_type')
     event.is_workday = bool(request.form.get('is_workday'))
     db.session.commit()
+    AttendanceService.invalidate_calendar()
     return '', 204
 
 @admin_bp.route('/events/delete/<int:event_id>', methods=['POST'])
@@ -1679,6 +1740,7 @@ def delete_event(event_id):
     event = AcademicCalendar.query.get_or_404(event_id)
     db.session.delete(event)
     db.session.commit()
+    AttendanceService.invalidate_calendar()
     return '', 204
 
 
@@ -1794,15 +1856,162 @@ def result_template_settings():
                            templates=templates, current=current)
 
 
+@admin_bp.route("/settings/notification-retention", methods=["GET", "POST"])
+@login_required
+def notification_retention_settings():
+    from services.notification_retention_service import NotificationRetentionService, SINKS
+
+    admin_only()
+    if request.method == "POST":
+        if request.form.get("action") == "run":
+            # a few batches inline; large backlogs go through compact_notifications.py
+            result = NotificationRetentionService.run(max_batches=5, force=True)
+            flash(f"Archived {result['recipients']} recipient(s) and "
+                  f"{result['notifications']} notification(s).", "success")
+        else:
+            try:
+                NotificationRetentionService.update_policy(
+                    enabled=bool(request.form.get("enabled")),
+                    read_after_days=request.form.get("read_after_days", 90),
+                    sink=request.form.get("sink", "table"),
+                    batch_size=request.form.get("batch_size", 1000),
+                )
+                flash("Notification retention policy saved.", "success")
+            except (TypeError, ValueError):
+                flash("Days and batch size must be whole numbers.", "danger")
+        return redirect(url_for("admin.notification_retention_settings"))
+
+    return render_template("admin/notification_retention_settings.html",
+                           policy=NotificationRetentionService.policy(),
+                           stats=NotificationRetentionService.stats(),
+                           sinks=SINKS)
+
+
 # View all tables and records
 @admin_bp.route('/database')
 @login_required
 def view_database():
-    data = {}
-    for name, model in MODELS.items():
-        records = model.query.all()
-        data[name] = [serialize(row) for row in records]  # <-- generic serializer
-    return render_template('admin/database.html', data=data)
+    admin_only()
+    # only the table list; rows are fetched one table and one page at a time
+    tables = [{"name": name, "slug": slugify_model_name(name)} for name in MODELS]
+    return render_template('admin/database.html', tables=tables)
+
+@admin_bp.route('/database/api/<model>')
+@login_required
+def database_table_page(model):
+    """
+    JSON page of one table. Query args: after (cursor), limit, columns
+    (comma separated), q (text search), sort, dir, f_<column>=<value>
+    (equality filters), count=exact.
+    """
+    admin_only()
+    from services.db_browser_service import DatabaseBrowserService
+
+    Model = resolve_model_from_slug(model)
+    if not Model:
+        return jsonify({"error": "Unknown model", "model": model}), 404
+
+    columns = [c for c in request.args.get('columns', '').split(',') if c] or None
+    filters = {k[2:]: v for k, v in request.args.items() if k.startswith('f_')}
+    search = request.args.get('q', '').strip() or None
+    try:
+        result = DatabaseBrowserService.page(
+            Model,
+            after=request.args.get('after') or None,
+            limit=request.args.get('limit', 50, type=int),
+            columns=columns,
+            search=search,
+            filters=filters,
+            sort=request.args.get('sort') or None,
+            direction=request.args.get('dir', 'asc'),
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Bad filter or cursor: {e}"}), 400
+
+    result["schema"] = DatabaseBrowserService.describe(Model)
+    if not request.args.get('after'):  # counts only with the first page
+        if request.args.get('count') == 'exact' or filters or search:
+            result["count"], result["exact"] = DatabaseBrowserService.count(Model, search, filters), True
+        else:
+            result["count"], result["exact"] = DatabaseBrowserService.estimate(Model)
+    return jsonify(result)
+
+@admin_bp.route('/database/api/<model>/record/<record_id>')
+@login_required
+def database_record(model, record_id):
+    admin_only()
+    from services.db_browser_service import DatabaseBrowserService
+
+    Model = resolve_model_from_slug(model)
+    if not Model:
+        return jsonify({"error": "Unknown model", "model": model}), 404
+    try:
+        row = DatabaseBrowserService.record(Model, record_id)
+    except (ValueError, TypeError):
+        row = None
+    if row is None:
+        return jsonify({"error": "Record not found", "model": model, "id": record_id}), 404
+    return jsonify(row)
+
+@admin_bp.route('/database/export/<model>')
+@login_required
+def export_table(model):
+    """Stream a whole table as ?format=csv|ndjson (optionally ?columns=a,b) at constant memory."""
+    from flask import Response, stream_with_context
+    from services.table_export_service import TableExportService, FORMATS
+
+    admin_only()
+    Model = resolve_model_from_slug(model)
+    if not Model:
+        return jsonify({"error": "Unknown model", "model": model}), 404
+
+    fmt = request.args.get('format', 'csv')
+    names = [c for c in request.args.get('columns', '').split(',') if c] or None
+    try:
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format: {fmt}")
+        TableExportService.columns(Model, names)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return Response(
+        stream_with_context(TableExportService.stream(Model, fmt, names)),
+        mimetype=FORMATS[fmt][0],
+        headers={"Content-Disposition": f"attachment; filename={TableExportService.filename(model, fmt)}"},
+    )
+
+@admin_bp.route('/database/export/<model>/snapshot', methods=['POST'])
+@login_required
+def export_table_snapshot(model):
+    """Build the export as a file in the background; download it from export_file when ready."""
+    from services.table_export_service import TableExportService
+
+    admin_only()
+    Model = resolve_model_from_slug(model)
+    if not Model:
+        return jsonify({"error": "Unknown model", "model": model}), 404
+
+    names = [c for c in request.values.get('columns', '').split(',') if c] or None
+    try:
+        name = TableExportService.snapshot(Model, model, request.values.get('format', 'csv'), names)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"file": name, "status": "building", "url": url_for('admin.export_file', filename=name)}), 202
+
+@admin_bp.route('/database/exports/<filename>')
+@login_required
+def export_file(filename):
+    """A finished export, served with Range support so large downloads can resume."""
+    from services.table_export_service import TableExportService
+
+    admin_only()
+    filename = secure_filename(filename)
+    status = TableExportService.status(filename)
+    if status is None:
+        abort(404)
+    if status == 'building':
+        return jsonify({"file": filename, "status": status}), 202
+    return send_from_directory(TableExportService.folder(), filename, as_attachment=True, conditional=True)
 
 # Update a record (POST JSON with fields to update)
 import re
@@ -1831,6 +2040,7 @@ def resolve_model_from_slug(slug: str):
 @admin_bp.route('/update/<model>/<record_id>', methods=['POST'])
 @login_required
 def update_record(model, record_id):
+    admin_only()
     # resolve model slug -> SQLAlchemy model
     Model = resolve_model_from_slug(model)
     if not Model:
@@ -1845,6 +2055,7 @@ def update_record(model, record_id):
     record = Model.query.get(pk)
     if not record:
         return jsonify({"error": "Record not found", "model": model, "id": record_id}), 404
+    old_teacher_id = getattr(record, 'teacher_id', None)
 
     data = request.get_json(silent=True)
     if not data:
@@ -1915,40 +2126,102 @@ def update_record(model, record_id):
         current_app.logger.exception("DB commit failed during admin update")
         return jsonify({"error": "DB commit failed", "details": str(e)}), 500
 
+    if Model is AttendanceRecord:
+        # rollups are maintained on save; direct edits need a rebuild (of both teachers if it moved)
+        AttendanceSummaryService.rebuild(record.teacher_id)
+        if old_teacher_id is not None and old_teacher_id != record.teacher_id:
+            AttendanceSummaryService.rebuild(old_teacher_id)
+
     return jsonify(serialize(record)), 200
 
 # Delete a record
 @admin_bp.route('/delete/<model>/<int:record_id>', methods=['DELETE'])
 @login_required
 def delete_record(model, record_id):
-    if model not in MODELS:
+    admin_only()
+    Model = resolve_model_from_slug(model)
+    if not Model:
         return f"Unknown model: {model}", 400
 
-    Model = MODELS[model]
     record = Model.query.get(record_id)
     if not record:
         return f"Record with ID {record_id} not found.", 404
 
+    teacher_id = getattr(record, 'teacher_id', None)
+    # unread counters are maintained incrementally; take this notice's recipients off them
+    notified = NotificationInboxService.delete_recipients(record.id) if Model is Notification else []
     db.session.delete(record)
     db.session.commit()
+    if Model is AttendanceRecord:
+        AttendanceSummaryService.rebuild(teacher_id)
+    if notified:
+        NotificationCounterService.publish(notified)
     return '', 204
 
 #========================== Student Promotion ==========================
 @admin_bp.route('/admin/promote-students')
+@login_required
 def promote_all_students():
-    backup_filename = backup_students_to_csv()
+    """Promotion runs: build a preview, review it, then apply or roll back."""
+    admin_only()
+    PromotionService.expire_stale()
+    runs = PromotionRun.query.order_by(PromotionRun.id.desc()).limit(20).all()
+    return render_template('admin/promotions.html', runs=runs)
 
-    students = StudentProfile.query.all()
-    for student in students:
-        score = calculate_student_score(student.user_id)
-        promote_student(student, score)
+@admin_bp.route('/admin/promote-students/preview', methods=['POST'])
+@login_required
+def promotion_preview():
+    admin_only()
+    run = PromotionService.preview(created_by=getattr(current_user, 'admin_id', None) or current_user.get_id())
+    flash(f"Preview built for {run.total} student(s). Review it before applying.", "info")
+    return redirect(url_for('admin.promotion_run', run_id=run.id))
 
-    db.session.commit()
+@admin_bp.route('/admin/promote-students/<int:run_id>')
+@login_required
+def promotion_run(run_id):
+    admin_only()
+    run = PromotionRun.query.get_or_404(run_id)
+    status = request.args.get('status') or None
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = 200
+    rows, matching = PromotionService.plan(run, status=status, offset=(page - 1) * per_page, limit=per_page)
+    return render_template(
+        'admin/promotion_run.html',
+        run=run,
+        can_rollback=PromotionService.is_latest_applied(run),
+        summary=PromotionService.summary(run),
+        rows=rows,
+        status=status,
+        page=page,
+        pages=max((matching + per_page - 1) // per_page, 1),
+        matching=matching,
+    )
 
-    # Store filename in session to display download link
-    session['last_backup_file'] = backup_filename
-    flash(f"All students processed for promotion. Backup saved as {backup_filename}", "success")
-    return redirect(url_for('admin.dashboard'))
+@admin_bp.route('/admin/promote-students/<int:run_id>/<action>', methods=['POST'])
+@login_required
+def promotion_action(run_id, action):
+    admin_only()
+    if action not in ('apply', 'rollback', 'mark_failed'):
+        abort(404)
+    run = PromotionRun.query.get_or_404(run_id)
+    if action == 'mark_failed':
+        if PromotionService.mark_failed(run):
+            flash("Run marked as failed. Review it and roll it back if needed.", "warning")
+        else:
+            flash("This run is not in progress.", "danger")
+        return redirect(url_for('admin.promotion_run', run_id=run.id))
+    error = PromotionService.start(run, action)
+    if error:
+        flash(error, "danger")
+    else:
+        flash("Promotion started." if action == 'apply' else "Rollback started.", "info")
+    return redirect(url_for('admin.promotion_run', run_id=run.id))
+
+@admin_bp.route('/admin/promote-students/<int:run_id>/status')
+@login_required
+def promotion_status(run_id):
+    admin_only()
+    return jsonify(PromotionService.progress(PromotionRun.query.get_or_404(run_id)))
 
 @admin_bp.route('/admin/download-backup/<filename>')
 def download_backup(filename):
@@ -2094,14 +2367,13 @@ def send_notification(type, title, message, recipients, sender=None, related_typ
         related_type=related_type,
         related_id=related_id
     )
-    db.session.add(notif)
-    db.session.flush()  # ensures notif.id is available
 
     # Create recipient links
-    for user in recipients:
-        db.session.add(NotificationRecipient(notification_id=notif.id, user_id=user.user_id))
+    user_ids = [user.user_id for user in recipients]
+    NotificationFanout.send(notif, user_ids)
 
     db.session.commit()
+    NotificationPush.publish(notif, user_ids)
     return notif
 
 #--------------- Course Materials Management ---------------
@@ -2455,91 +2727,6 @@ from collections import defaultdict
 
 from datetime import datetime
 
-def create_fee_notification(fee_group, sender=None):
-    """
-    Create a notification for a fee assignment.
-
-    Args:
-        fee_group: ClassFeeStructure object
-        sender: User/Admin object creating the notification. Defaults to current_user.
-    """
-    if sender is None:
-        sender = current_user
-
-    # Determine sender_id and type
-    if hasattr(sender, 'admin_id'):
-        sender_id = sender.admin_id
-        sender_type = 'admin'
-    elif hasattr(sender, 'user_id'):
-        sender_id = sender.user_id
-        sender_type = 'user'
-    else:
-        sender_id = None
-        sender_type = 'system'
-
-    # Parse items if stored as JSON
-    items = fee_group.items
-    if isinstance(items, str):
-        try:
-            items = json.loads(items)
-        except Exception:
-            items = []
-
-    # Build message text
-    items_text = '\n'.join([f"  • {item['description']}: {item['amount']} GHS" for item in items])
-    message = (
-        f"A new fee has been assigned for your class {fee_group.class_level}.\n\n"
-        f"Academic Year: {fee_group.academic_year}\n"
-        f"Semester: {fee_group.semester}\n"
-        f"Description: {fee_group.description}\n"
-        f"Total Amount: {fee_group.amount} GHS\n\n"
-        f"Breakdown:\n{items_text}\n\n"
-        f"Please check your Fees section for details."
-    )
-
-    # Create Notification object
-    notification = Notification(
-        type='fee',
-        title=f'New Fee Assigned: {fee_group.description}',
-        message=message,
-        sender_id=sender_id,
-        sender_type=sender_type,
-        related_type='fee',
-        related_id=fee_group.id,
-        created_at=datetime.utcnow()
-    )
-    db.session.add(notification)
-    db.session.flush()  # Get notification.id
-
-    # Map class_level string to SchoolClass
-    school_class = SchoolClass.query.filter_by(name=fee_group.class_level).first()
-    if not school_class:
-        db.session.rollback()
-        raise ValueError(f"No class found matching '{fee_group.class_level}'")
-
-    # Get all students in the class
-    students = User.query.filter_by(class_id=school_class.id, role='student').all()
-
-    # Create recipients for students and optionally parents
-    for student in students:
-        # Notify student
-        db.session.add(NotificationRecipient(
-            notification_id=notification.id,
-            user_id=student.user_id,
-            is_read=False
-        ))
-
-        # Notify parents if you have a relationship student.parents
-        if hasattr(student, 'parents'):
-            for parent in student.parents:
-                db.session.add(NotificationRecipient(
-                    notification_id=notification.id,
-                    user_id=parent.user_id,
-                    is_read=False
-                ))
-
-    db.session.commit()
-
 @admin_bp.route('/assign-fees', methods=['GET', 'POST'])
 @login_required
 def assign_fees():
@@ -2791,8 +2978,10 @@ def reset_user_password(request_id):
 
     try:
         send_temporary_password_email(user, temp_password)
+        db.session.commit()
         flash(f'Password for {user.user_id} has been reset and emailed.', 'success')
     except Exception as e:
+        db.session.rollback()
         current_app.logger.exception(f"Failed to send email: {e}")
         flash(f'Password reset succeeded, but email failed for {user.user_id}.', 'warning')
 
@@ -2968,26 +3157,27 @@ def toggle_assessment_period(pid):
 @admin_bp.route('/admissions')
 @login_required
 def manage_admissions():
-    status = request.args.get('status')
-
-    query = Application.query
-    if status:
-        query = query.filter_by(status=status)
+    from services.admissions_listing_service import AdmissionsListingService
+    from services.application_progress_service import ApplicationProgressService
 
-    applications = query.order_by(Application.submitted_at.desc()).all()
+    status = request.args.get('status') or None
+    q = request.args.get('q', '').strip()
+    after = request.args.get('after') or None
 
-    stats = {
-        'total': Application.query.count(),
-        'submitted': Application.query.filter_by(status='submitted').count(),
-        'approved': Application.query.filter_by(status='approved').count(),
-        'rejected': Application.query.filter_by(status='rejected').count()
-    }
+    try:
+        applications, next_cursor = AdmissionsListingService.page(status=status, search=q or None, after=after)
+    except ValueError:
+        return redirect(url_for('admin.manage_admissions', status=status, q=q or None))
 
     return render_template(
         'admin/manage_admissions.html',
         applications=applications,
+        next_cursor=next_cursor,
+        is_first_page=after is None,
         status=status,
-        stats=stats
+        q=q,
+        stats=AdmissionsListingService.stats(),
+        funnel=ApplicationProgressService.funnel()
     )
 
 @admin_bp.route('/admissions/<int:app_id>')
@@ -3033,14 +3223,7 @@ def update_application_status(app_id, new_status):
             )
 
             # Generate unique student ID
-            prefix = 'STD'
-            base_count = User.query.filter_by(role='student').count() + 1
-            count = base_count
-            while True:
-                student_id = f"{prefix}{count:03d}"
-                if not User.query.filter_by(user_id=student_id).first():
-                    break
-                count += 1
+            student_id = IdAllocator.user_id('student')
 
             # Generate temporary password
             temp_password = uuid.uuid4().hex[:8]
@@ -3075,6 +3258,7 @@ def update_application_status(app_id, new_status):
 
             try:
                 db.session.commit()
+                AttendanceService.invalidate_roster(student_profile.current_class)
                 flash(f"Student account created! Username: {username}", "success")
 
                 # Send credentials to applicant
@@ -3095,7 +3279,11 @@ def update_application_status(app_id, new_status):
     return redirect(url_for('admin.manage_admissions'))
 
 @admin_bp.route('/vouchers', methods=['GET', 'POST'])
+@login_required
 def manage_vouchers():
+    from services.voucher_service import VoucherService, MAX_BATCH
+
+    admin_only()
     if request.method == 'POST':
         try:
             count = int(request.form.get('count', 1))
@@ -3111,21 +3299,60 @@ def manage_vouchers():
         else:
             amount = float(current_app.config.get('VOUCHER_DEFAULT_AMOUNT', 50.0))
 
-        vouchers = []
-        for _ in range(max(1, count)):
-            pin = f"{random.randint(100000, 999999)}"
-            serial = f"{random.randint(10000000, 99999999)}"
-            v = AdmissionVoucher(pin=pin, serial=serial, amount=amount)
-            db.session.add(v)
-            vouchers.append(v)
+        valid_days = request.form.get('valid_days', type=int)
+        try:
+            batch = VoucherService.mint(
+                count, amount, valid_days=valid_days,
+                created_by=getattr(current_user, 'admin_id', None) or current_user.get_id()
+            )
+        except IntegrityError:
+            flash("A voucher code was taken while minting; nothing was created. Please try again.", "danger")
+            return redirect(url_for('admin.manage_vouchers'))
 
-        db.session.commit()
-        flash(f'Generated {len(vouchers)} voucher(s).', 'success')
+        flash(f'Generated {batch.count} voucher(s) in batch #{batch.id}.', 'success')
         return redirect(url_for('admin.manage_vouchers'))
 
-    # Fetch all vouchers with related applicant info
-    vouchers = AdmissionVoucher.query.order_by(AdmissionVoucher.created_at.desc()).all()
-    return render_template('admin/vouchers.html', vouchers=vouchers)
+    # recent vouchers only; whole batches are exported as CSV/PDF
+    vouchers = AdmissionVoucher.query.order_by(AdmissionVoucher.created_at.desc()).limit(200).all()
+    batches = VoucherBatch.query.order_by(VoucherBatch.id.desc()).limit(20).all()
+    return render_template(
+        'admin/vouchers.html',
+        vouchers=vouchers,
+        batches=batches,
+        stats=VoucherService.stats(),
+        pdf_parts={b.id: VoucherService.pdf_parts(b) for b in batches},
+        max_batch=current_app.config.get('VOUCHER_MAX_BATCH', MAX_BATCH)
+    )
+
+@admin_bp.route('/vouchers/batches/<int:batch_id>.csv')
+@login_required
+def export_voucher_batch_csv(batch_id):
+    from flask import Response, stream_with_context
+    from services.voucher_service import VoucherService
+
+    admin_only()
+    batch = VoucherBatch.query.get_or_404(batch_id)
+    return Response(
+        stream_with_context(VoucherService.csv_stream(batch)),
+        mimetype='text/csv',
+        headers={"Content-Disposition": f"attachment; filename=vouchers-batch-{batch.id}.csv"}
+    )
+
+@admin_bp.route('/vouchers/batches/<int:batch_id>.pdf')
+@login_required
+def export_voucher_batch_pdf(batch_id):
+    from flask import send_file
+    from services.voucher_service import VoucherService
+
+    admin_only()
+    batch = VoucherBatch.query.get_or_404(batch_id)
+    part = min(max(request.args.get('part', 1, type=int), 1), VoucherService.pdf_parts(batch))
+    return send_file(
+        VoucherService.pdf(batch, part),
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f"vouchers-batch-{batch.id}-part-{part}.pdf"
+    )
 
 @admin_bp.route('/vouchers/create', methods=['GET', 'POST'])
 def create_voucher():
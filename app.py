@@ -2,6 +2,7 @@
 
 import os
 import logging
+from contextlib import contextmanager
 from datetime import datetime
 from flask import Flask, render_template, redirect, url_for, flash, request, abort, jsonify, send_from_directory
 from werkzeug.utils import secure_filename
@@ -40,6 +41,7 @@ app.config.setdefault('MATERIALS_FOLDER', os.path.join(app.instance_path, 'mater
 app.config.setdefault('PAYMENT_PROOF_FOLDER', os.path.join(app.instance_path, 'payment_proofs'))
 app.config.setdefault('RECEIPT_FOLDER', os.path.join(app.instance_path, 'receipts'))
 app.config.setdefault('PROFILE_PICS_FOLDER', os.path.join(app.instance_path, 'profile_pics'))
+app.config.setdefault('EXAM_PAYLOAD_FOLDER', os.path.join(app.instance_path, 'exam_payloads'))
 
 for folder in [
     app.instance_path,
@@ -48,6 +50,7 @@ for folder in [
     app.config['PAYMENT_PROOF_FOLDER'],
     app.config['RECEIPT_FOLDER'],
     app.config['PROFILE_PICS_FOLDER'],
+    app.config['EXAM_PAYLOAD_FOLDER'],
 ]:
     os.makedirs(folder, exist_ok=True)
 
@@ -146,6 +149,20 @@ def load_user(user_id):
     return None
 
 # ===== One-Time Initialization Function =====
+@contextmanager
+def non_fatal(step):
+    """Run an optional startup step: a failure is logged and startup carries on."""
+    try:
+        yield
+    except Exception as e:
+        logger.exception("⚠ %s warning (non-fatal): %s", step, e)
+
+
+def log_indexes(names):
+    for name in names:
+        logger.info("✓ Index %s created", name)
+
+
 def one_time_init():
     logger.info("=" * 70)
     logger.info("STARTING ONE-TIME APP INITIALIZATION")
@@ -158,6 +175,58 @@ def one_time_init():
     db.create_all()
     logger.info("✓ Database tables created/verified")
 
+    # Attendance (student, date, teacher) unique index for upserts; until it
+    # exists, saves use plain inserts/updates instead of native upserts
+    try:
+        from services.attendance_service import AttendanceService
+        if AttendanceService.ensure_unique_index():
+            logger.info("✓ Attendance unique index created")
+    except Exception as e:
+        logger.error("✗ Attendance unique index missing, native upserts disabled: %s", e)
+
+    # Claims for exam submissions made before claims existed (submit only checks claims)
+    with non_fatal("Exam submission claim"):
+        from services.exam_submission_service import ExamSubmissionService
+        added = ExamSubmissionService.backfill_claims()
+        if added:
+            logger.info("✓ %s legacy exam submission claim(s) added", added)
+
+    # Unread counters for recipients from before counters existed (fan-out only upserts deltas)
+    with non_fatal("Notification counter"):
+        from services.notification_counter_service import NotificationCounterService
+        created = NotificationCounterService.backfill()
+        if created:
+            logger.info("✓ %s notification counter(s) backfilled", created)
+
+    # Notification inbox indexes (grouped listing, keyset pages)
+    with non_fatal("Notification index"):
+        from services.notification_inbox_service import NotificationInboxService
+        log_indexes(NotificationInboxService.ensure_indexes())
+
+    # Username prefix index (allocator's LIKE 'base%' lookups)
+    with non_fatal("Username index"):
+        from services.id_allocator import IdAllocator
+        log_indexes(IdAllocator.ensure_indexes())
+
+    # Admissions listing indexes (keyset pages, per-application counts)
+    with non_fatal("Admissions index"):
+        from services.admissions_listing_service import AdmissionsListingService
+        log_indexes(AdmissionsListingService.ensure_indexes())
+
+    # Application progress bitmask column (added and backfilled on older databases)
+    with non_fatal("Application progress"):
+        from services.application_progress_service import ApplicationProgressService
+        if ApplicationProgressService.ensure_column():
+            logger.info("✓ Application progress column added and backfilled")
+
+    # Voucher batch_id column (added and linked on older databases), then the
+    # (pin, serial) lookup and batch export indexes
+    with non_fatal("Voucher schema"):
+        from services.voucher_service import VoucherService
+        if VoucherService.ensure_column():
+            logger.info("✓ Voucher batch column added and linked")
+        log_indexes(VoucherService.ensure_indexes())
+
     # Default Admin
     super_admin = Admin.query.filter_by(username='SuperAdmin').first()
     if not super_admin:
@@ -170,7 +239,7 @@ def one_time_init():
         logger.info("✓ SuperAdmin already exists")
 
     # Default classes
-    try:
+    with non_fatal("Class setup"):
         from utils.helpers import get_class_choices
         existing = {c.name for c in SchoolClass.query.all()}
         created = 0
@@ -183,8 +252,6 @@ def one_time_init():
             logger.info(f"✓ Created {created} default classes")
         else:
             logger.info("✓ All default classes already exist")
-    except Exception as e:
-        logger.exception("⚠ Class setup warning (non-fatal): %s", e)
 
     logger.info("=" * 70)
     logger.info("✓✓✓ APP INITIALIZATION COMPLETE - READY TO SERVE REQUESTS ✓✓✓")
@@ -0,0 +1,44 @@
+# compact_notifications.py
+# Archive read notifications older than the retention policy allows.
+#
+#   python compact_notifications.py --dry-run
+#   python compact_notifications.py --batches 50 --sink jsonl
+#
+# Each batch is its own short transaction, so this can run (e.g. from cron)
+# while the app is serving requests and be stopped at any time.
+import argparse
+
+from app import app
+from services.notification_retention_service import NotificationRetentionService, SINKS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old read notifications in small batches.")
+    parser.add_argument("--batches", type=int, default=None, help="stop after this many batches (default: until done)")
+    parser.add_argument("--batch-size", type=int, default=None, help="rows per batch (default: policy setting)")
+    parser.add_argument("--days", type=int, default=None, help="override the policy's read_after_days")
+    parser.add_argument("--sink", choices=SINKS, default=None, help="archive target (default: policy setting)")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be archived")
+    parser.add_argument("--force", action="store_true", help="run even if the policy is disabled")
+    args = parser.parse_args()
+
+    with app.app_context():
+        days = max(args.days, 1) if args.days is not None else None
+        batch_size = max(args.batch_size, 1) if args.batch_size is not None else None
+
+        cutoff = NotificationRetentionService.cutoff(days=days)
+        print(f"Cutoff: read notifications created before {cutoff:%Y-%m-%d %H:%M}")
+        result = NotificationRetentionService.run(
+            max_batches=args.batches, dry_run=args.dry_run, sink=args.sink, force=args.force,
+            days=days, batch_size=batch_size
+        )
+
+        if args.dry_run:
+            print(f"{result['eligible']} recipient row(s) would be archived.")
+        else:
+            print(f"Archived {result['recipients']} recipient(s) and {result['notifications']} "
+                  f"notification(s) in {result['batches']} batch(es).")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ class Config:
     PAYMENT_PROOF_FOLDER = os.path.join('static', 'uploads', 'payments')
     RECEIPT_FOLDER = os.path.join('static', 'uploads', 'receipts')
     PROFILE_PICS_FOLDER = os.path.join('static', 'uploads', 'profile_pictures')
+    EXPORT_FOLDER = os.path.join(os.getcwd(), 'backups', 'exports')  # full-table exports (export_table.py)
 
     # Sessions
     SESSION_TYPE = 'filesystem'
@@ -26,4 +27,15 @@ class Config:
     ZOOM_CLIENT_ID = os.environ.get('ZOOM_CLIENT_ID')
     ZOOM_CLIENT_SECRET = os.environ.get('ZOOM_CLIENT_SECRET')
 
+    # Email outbox (see services/email_outbox_service.py)
+    EMAIL_OUTBOX_WORKER = os.environ.get('EMAIL_OUTBOX_WORKER', '1') != '0'  # '0' when outbox_worker.py runs separately
+    EMAIL_RATE_PER_MINUTE = int(os.environ.get('EMAIL_RATE_PER_MINUTE', 60))
+    EMAIL_OUTBOX_BATCH = 50
+    EMAIL_MAX_ATTEMPTS = 6
 
+    # Bulk user import (see services/user_import_service.py); 1 hashes in-process,
+    # unset means one spawned process per CPU (in-process under eventlet)
+    USER_IMPORT_HASH_WORKERS = int(os.environ.get('USER_IMPORT_HASH_WORKERS', 0)) or None
+
+    # Promotion runs still applying/rolling back after this long are taken as interrupted
+    PROMOTION_STALE_MINUTES = int(os.environ.get('PROMOTION_STALE_MINUTES', 30))
@@ -0,0 +1,58 @@
+# dedupe_attendance.py
+# Remove duplicate attendance marks so the (student, date, teacher) unique
+# index can be created. Nothing is deleted without --apply.
+#
+#   python dedupe_attendance.py            # list what would be removed
+#   python dedupe_attendance.py --apply    # back up, delete, rebuild rollups, create the index
+#
+# For every duplicated (student, date, teacher) the newest row is kept.
+# With --apply the removed rows are first written to a CSV in EXPORT_FOLDER.
+import argparse
+import csv
+import os
+from datetime import datetime
+
+from app import app
+from services.attendance_service import AttendanceService
+from services.table_export_service import TableExportService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove duplicate attendance marks (keeps the newest).")
+    parser.add_argument("--apply", action="store_true", help="delete the listed rows (default: only report)")
+    parser.add_argument("--show", type=int, default=50, help="rows to list in the report (default: 50)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if AttendanceService.unique_index_ready(refresh=True):
+            print("The attendance unique index already exists; nothing to do.")
+            return
+
+        rows = AttendanceService.duplicates()
+        print(f"{len(rows)} duplicate attendance record(s) would be removed.")
+        for row in rows[:args.show]:
+            print(f"  id {row.id}: student {row.student_id}, {row.date}, teacher {row.teacher_id}, "
+                  f"{'present' if row.is_present else 'absent'} (keeping id {row.keep_id})")
+        if len(rows) > args.show:
+            print(f"  ... and {len(rows) - args.show} more")
+
+        if not args.apply:
+            print("Run again with --apply to back them up and delete them.")
+            return
+
+        path = os.path.join(TableExportService.folder(), f"attendance-duplicates-{datetime.utcnow():%Y%m%d%H%M%S}.csv")
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['id', 'student_id', 'date', 'teacher_id', 'is_present', 'kept_id'])
+            writer.writerows(
+                [r.id, r.student_id, r.date.isoformat(), r.teacher_id, int(bool(r.is_present)), r.keep_id]
+                for r in rows
+            )
+        print(f"Backed up to {path}")
+
+        removed = AttendanceService.dedupe([r.id for r in rows])
+        print(f"Removed {removed} row(s) and created the unique index.")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,12 @@ from models import User, Quiz, StudentQuizSubmission, Question, StudentProfile,
 from datetime import date, datetime, timedelta, time
 from sqlalchemy.orm import joinedload
 from forms import ExamLoginForm   # adjust path depending on your project structure
+from services.attempt_state_service import AttemptStateService
+from services.exam_payload_cache import ExamPayloadCache
+from services.exam_dashboard_service import ExamDashboardService
+from services.exam_submission_service import ExamSubmissionService
+from services.set_assignment_planner import SetAssignmentPlanner
+from utils.extensions import db
 
 
 exam_bp = Blueprint('exam', __name__, url_prefix='/exam')
@@ -44,28 +50,8 @@ def exam_dashboard():
         flash("Only students can access exams.", "danger")
         return redirect(url_for("exam.exam_login"))
 
-    exams = Exam.query.all()
-    now = datetime.utcnow()
-
     # Prepare data for template
-    exam_data = []
-    for exam in exams:
-        submission = ExamSubmission.query.filter_by(
-            exam_id=exam.id,
-            student_id=current_user.id
-        ).first()
-        status = 'Upcoming'
-        if exam.start_datetime <= now <= exam.end_datetime:
-            status = 'Ongoing'
-        elif now > exam.end_datetime:
-            status = 'Ended'
-
-        exam_data.append({
-            "exam": exam,
-            "status": status,
-            "attempted": bool(submission),
-            "submission_id": submission.id if submission else None
-        })
+    exam_data = ExamDashboardService.for_student(current_user)
 
     return render_template('exam/dashboard.html', exams=exam_data)
 
@@ -93,64 +79,48 @@ def take_exam(exam_id, attempt_id):
     if current_user.role != 'student':
         abort(403)
 
-    exam = Exam.query.get_or_404(exam_id)
-    now = datetime.utcnow()
+    # get attempt record (with assigned set)
+    attempt = ExamAttempt.query.filter_by(
+        id=attempt_id,
+        exam_id=exam_id,
+        student_id=current_user.id
+    ).first_or_404()
+
+    # prebuilt payload for the assigned set (whole exam pool if no set assigned)
+    exam_data = ExamPayloadCache.get(exam_id, attempt.set_id)
+    if exam_data is None:
+        abort(404)
 
     # check timing
-    if now < exam.start_datetime:
+    now = datetime.utcnow()
+    start_datetime, end_datetime = ExamPayloadCache.window(exam_data)
+    if now < start_datetime:
         flash("This exam is not yet available.", "warning")
         return redirect(url_for('student.exams'))
 
-    if now > exam.end_datetime:
+    if now > end_datetime:
         flash("This exam is closed.", "danger")
         return redirect(url_for('student.exams'))
 
-    # get attempt record (with assigned set)
-    attempt = ExamAttempt.query.filter_by(
-        id=attempt_id,
-        exam_id=exam.id,
-        student_id=current_user.id
-    ).first_or_404()
-
     if attempt.submitted:
         flash("You have already submitted this exam.", "danger")
-        return redirect(url_for('student.exam_instructions', exam_id=exam.id, attempt_id=attempt.id))
-
-    # ✅ Load questions from assigned set (if any)
-    if attempt.set_id:
-        set_questions = (
-            db.session.query(ExamQuestion)
-            .join(ExamSetQuestion, ExamSetQuestion.question_id == ExamQuestion.id)
-            .filter(ExamSetQuestion.set_id == attempt.set_id)
-            .options(joinedload(ExamQuestion.options))
-            .order_by(ExamSetQuestion.order)
-            .all()
-        )
-    else:
-        # fallback: whole exam pool if no set assigned
-        set_questions = exam.questions
-
-    exam_data = {
-        "id": exam.id,
-        "title": exam.title,
-        "duration_minutes": exam.duration_minutes,
-        "start_datetime": exam.start_datetime.strftime("%Y-%m-%d %H:%M:%S"),
-        "end_datetime": exam.end_datetime.strftime("%Y-%m-%d %H:%M:%S"),
-        "questions": [
-            {
-                "id": q.id,
-                "question_text": q.question_text,
-                "options": [{"id": opt.id, "text": opt.text} for opt in q.options]
-            }
-            for q in set_questions
-        ]
-    }
+        return redirect(url_for('student.exam_instructions', exam_id=exam_id, attempt_id=attempt.id))
+
+    # server-side clock: created once, deadline fixed at start
+    state = AttemptStateService.start(
+        'exam', exam_id, current_user.id,
+        duration_minutes=exam_data["duration_minutes"],
+        hard_end=end_datetime,
+        attempt_id=attempt.id
+    )
 
     return render_template(
         "exam/take_exam.html",
         exam_json=exam_data,
         session=session,
-        attempt=attempt
+        attempt=attempt,
+        attempt_state=state,
+        saved_answers=AttemptStateService.answers_map(state)
     )
 
 @exam_bp.route('/exams/<int:exam_id>/password', methods=['GET','POST'])
@@ -169,9 +139,9 @@ def exam_password(exam_id):
             id=session[selected_set_key], exam_id=exam.id
         ).first()
 
-    # ✅ Otherwise fallback to auto-assignment logic
+    # ✅ Otherwise fallback to auto-assignment logic (recorded once the password is posted)
     if not chosen_set_obj:
-        chosen_set_obj = pick_set_for_student(exam, current_user)
+        chosen_set_obj = pick_set_for_student(exam, current_user, assign=request.method == 'POST')
 
     if not chosen_set_obj:
         flash("No set assigned to you yet.", "danger")
@@ -216,7 +186,7 @@ def exam_instructions(exam_id):
         sel_id = session.get(selected_set_key)
         preview_set = ExamSet.query.filter_by(id=sel_id, exam_id=exam.id).first()
     else:
-        preview_set = pick_set_for_student(exam, current_user)
+        preview_set = pick_set_for_student(exam, current_user, assign=request.method == 'POST')
 
     if request.method == 'POST':
         if not can_attempt:
@@ -252,37 +222,13 @@ def exam_instructions(exam_id):
         preview_set=preview_set
     )
 
-from hashlib import sha256
-import random
-from flask import session
-
-def pick_set_for_student(exam, student_user):
+def pick_set_for_student(exam, student_user, assign=False):
     """
-    Return an ExamSet object according to exam.assignment_mode.
-    NOTE: does NOT persist assignment (except for deterministic hash which is stable).
+    Return the ExamSet planned for this student at publish time.
+    Returns None in 'choice' mode (student picks the set).
+    A late joiner's set is only saved when assign is True.
     """
-    sets = ExamSet.query.filter_by(exam_id=exam.id).all()
-    if not sets:
-        return None
-
-    mode = (exam.assignment_mode or 'random')
-
-    if mode == 'random':
-        # preview: random choice (not persisted). The actual persisted pick is created when student starts.
-        return random.choice(sets)
-
-    if mode == 'hash':
-        # deterministic mapping by hashing student id + optional seed
-        seed = (exam.assignment_seed or '') + (student_user.user_id or str(student_user.id))
-        h = sha256(seed.encode()).hexdigest()
-        idx = int(h, 16) % len(sets)
-        return sets[idx]
-
-    if mode == 'choice':
-        # no automatic pick — let student choose (return None to indicate choice required)
-        return None
-
-    return random.choice(sets)
+    return SetAssignmentPlanner.set_for(exam, student_user, assign=assign)
 
 
 @exam_bp.route('/exams/<int:exam_id>/select-set', methods=['GET','POST'])
@@ -326,30 +272,44 @@ def select_exam_set(exam_id):
 @exam_bp.route('/start-exam-timer/<int:exam_id>', methods=['POST'])
 @login_required
 def start_exam_timer(exam_id):
-    key = f'exam_{exam_id}_start_time'
-    if key not in session:
-        session[key] = datetime.utcnow().isoformat()
-        session.modified = True
-    return jsonify({'status': 'started'})
+    exam = Exam.query.get_or_404(exam_id)
+    state = AttemptStateService.start(
+        'exam', exam.id, current_user.id,
+        duration_minutes=exam.duration_minutes,
+        hard_end=exam.end_datetime
+    )
+    return jsonify({
+        'status': 'started',
+        'started_at': state.started_at.isoformat(),
+        'deadline': state.deadline.isoformat(),
+        'seconds_left': state.seconds_left()
+    })
 
 @exam_bp.route('/autosave_exam_answer', methods=['POST'])
 @login_required
 def autosave_exam_answer():
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     exam_id = data.get('exam_id')
-    question_id = str(data.get('question_id'))
-    selected_option_id = str(data.get('selected_option_id'))
+    question_id = data.get('question_id')
+    selected_option_id = data.get('selected_option_id')
 
     if not all([exam_id, question_id, selected_option_id]):
         return jsonify({'error': 'Incomplete data'}), 400
 
-    session_key = f'autosaved_exam_{exam_id}_{current_user.user_id}'
-    if session_key not in session:
-        session[session_key] = {}
+    try:
+        exam_id = int(exam_id)
+        question_id = int(question_id)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid data'}), 400
 
-    session[session_key][question_id] = selected_option_id
-    session.modified = True
-    return jsonify({'status': 'saved'})
+    state = AttemptStateService.get('exam', exam_id, current_user.id)
+    if not state:
+        return jsonify({'error': 'Exam not started'}), 409
+
+    if not AttemptStateService.save_answer(state, question_id, str(selected_option_id)):
+        return jsonify({'error': 'Time is up', 'seconds_left': 0}), 409
+
+    return jsonify({'status': 'saved', 'seconds_left': state.seconds_left()})
 
 
 @exam_bp.route('/submit_exam/<int:exam_id>', methods=['POST'])
@@ -357,54 +317,30 @@ def autosave_exam_answer():
 def submit_exam(exam_id):
     exam = Exam.query.get_or_404(exam_id)
 
-    # ✅ check if this student already has a submission
-    existing = ExamSubmission.query.filter_by(
-        exam_id=exam.id, student_id=current_user.id
-    ).first()
+    form_answers = {}
+    for key, value in request.form.items():
+        if key.startswith('answers[') and key.endswith(']'):
+            form_answers[key[len('answers['):-1]] = value
 
-    if existing:
-        flash("You have already submitted this exam. Only one submission is allowed.", "warning")
-        return redirect(url_for('exam.exam_result', submission_id=existing.id))
-
-    autosaved_key = f'autosaved_exam_{exam.id}_{current_user.user_id}'
-    autosaved_answers = session.get(autosaved_key, {})
-
-    score = 0
-    for q in exam.questions:
-        submitted_option_id = request.form.get(f"answers[{q.id}]")
-        if not submitted_option_id:
-            submitted_option_id = autosaved_answers.get(str(q.id))
-
-        if submitted_option_id:
-            try:
-                submitted_option_id = int(submitted_option_id)
-                correct_option = next((opt for opt in q.options if opt.is_correct), None)
-                if correct_option and submitted_option_id == correct_option.id:
-                    score += q.marks
-            except (ValueError, TypeError):
-                continue
-
-    submission = ExamSubmission(
-        student_id=current_user.id,
-        exam_id=exam.id,
-        score=score,
-        submitted_at=datetime.utcnow()
+    # same key for every retry of one attempt, so a double-click or network replay is a no-op
+    idempotency_key = (
+        request.headers.get('Idempotency-Key')
+        or request.form.get('idempotency_key')
+        or f"exam-{exam.id}-student-{current_user.id}"
     )
-    db.session.add(submission)
 
-    attempt = ExamAttempt(
-        student_id=current_user.id,
-        exam_id=exam.id,
-        score=score,
-        submitted_at=datetime.utcnow()
+    submission_id, created = ExamSubmissionService.submit(
+        exam.id, current_user.id, form_answers, idempotency_key
     )
-    db.session.add(attempt)
+    if submission_id is None:
+        flash("Your submission could not be saved. Please try again.", "danger")
+        return redirect(url_for('exam.exam_dashboard'))
 
-    session.pop(autosaved_key, None)
-    session.pop(f'exam_{exam.id}_start_time', None)
+    if not created:
+        flash("You have already submitted this exam. Only one submission is allowed.", "warning")
 
-    db.session.commit()
-    return redirect(url_for('exam.exam_result', submission_id=submission.id))
+    ExamDashboardService.invalidate(current_user.id)
+    return redirect(url_for('exam.exam_result', submission_id=submission_id))
 
 @exam_bp.route('/has-submitted-exam/<int:exam_id>')
 @login_required
@@ -0,0 +1,40 @@
+# export_table.py
+# Export a whole admin table (see MODELS in admin_routes) at constant memory.
+#
+#   python export_table.py Users
+#   python export_table.py "Fee Transactions" --format ndjson --columns id,amount,created_at
+#   python export_table.py Attendance --out /tmp/attendance.csv
+#
+# Without --out the file goes to EXPORT_FOLDER, where the admin download
+# route can serve it with Range support.
+import argparse
+import os
+
+from app import app
+from admin_routes import MODELS, slugify_model_name
+from services.table_export_service import TableExportService, FORMATS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a table to CSV or NDJSON.")
+    parser.add_argument("table", help="table name or slug, e.g. 'Users' or 'fee_transactions'")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--columns", default="", help="comma separated column names (default: all)")
+    parser.add_argument("--out", default=None, help="output path (default: EXPORT_FOLDER)")
+    args = parser.parse_args()
+
+    by_slug = {slugify_model_name(name): model for name, model in MODELS.items()}
+    slug = slugify_model_name(args.table)
+    model = by_slug.get(slug)
+    if model is None:
+        parser.error(f"unknown table {args.table!r}; choose from: {', '.join(sorted(by_slug))}")
+
+    names = [c for c in args.columns.split(",") if c] or None
+    with app.app_context():
+        path = args.out or os.path.join(TableExportService.folder(), TableExportService.filename(slug, args.format))
+        size = TableExportService.write(model, args.format, path, names)
+        print(f"Wrote {size} bytes to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -66,6 +66,7 @@ class Application(db.Model):
     # Application lifecycle
     status = db.Column(db.String(30), default='draft')
     submitted_at = db.Column(db.DateTime)
+    progress = db.Column(db.Integer, nullable=False, default=0)  # completed-step bits, see ApplicationProgressService
 
     # Relationships
     documents = db.relationship('ApplicationDocument', backref='application', cascade='all, delete-orphan')
@@ -94,6 +95,7 @@ class AdmissionVoucher(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     valid_until = db.Column(db.DateTime, nullable=True)
     purchaser_email = db.Column(db.String(120), nullable=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('voucher_batch.id'), nullable=True)  # None for single purchases
 
     def mark_as_used(self, applicant_id):
         """Mark voucher as used by this applicant"""
@@ -142,3 +144,300 @@ class ApplicationPayment(db.Model):
     method = db.Column(db.String(50))  # momo, card, voucher
     status = db.Column(db.String(20), default='pending')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class AttemptState(db.Model):
+    """
+    Server-side timer and answer store for an in-progress quiz or exam.
+    Kept out of the Flask session so the session row stays tiny.
+    """
+    __tablename__ = 'attempt_state'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'assessment_id', 'student_id', name='uq_attempt_state_owner'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # quiz, exam
+    assessment_id = db.Column(db.Integer, nullable=False, index=True)
+    student_id = db.Column(db.Integer, nullable=False, index=True)
+    attempt_id = db.Column(db.Integer, nullable=True)
+
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    deadline = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    answers = db.relationship('AttemptStateAnswer', backref='state', cascade='all, delete-orphan', lazy='dynamic')
+
+    def seconds_left(self, now=None):
+        now = now or datetime.utcnow()
+        return max(0, int((self.deadline - now).total_seconds()))
+
+    def is_expired(self, now=None, grace_seconds=0):
+        now = now or datetime.utcnow()
+        return now > self.deadline + timedelta(seconds=grace_seconds)
+
+
+class AttemptStateAnswer(db.Model):
+    __tablename__ = 'attempt_state_answer'
+    __table_args__ = (
+        db.UniqueConstraint('state_id', 'question_id', name='uq_attempt_state_answer'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    state_id = db.Column(db.Integer, db.ForeignKey('attempt_state.id'), nullable=False, index=True)
+    question_id = db.Column(db.Integer, nullable=False)
+    value = db.Column(db.String(255))
+    saved_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ExamPayloadVersion(db.Model):
+    """
+    Version stamp for the prebuilt take-exam payloads of an exam.
+    Bumped whenever the exam, its sets or its questions change.
+    """
+    __tablename__ = 'exam_payload_version'
+
+    exam_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    published_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class QuizPayloadVersion(db.Model):
+    """
+    Version stamp for the cached take-quiz payload of a quiz.
+    Bumped whenever the quiz or its questions change.
+    """
+    __tablename__ = 'quiz_payload_version'
+
+    quiz_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ExamSubmissionClaim(db.Model):
+    """
+    One row per (exam, student), inserted in the same transaction as the
+    ExamSubmission. The unique constraints make concurrent or repeated
+    submits collapse onto the first one.
+    """
+    __tablename__ = 'exam_submission_claim'
+    __table_args__ = (
+        db.UniqueConstraint('exam_id', 'student_id', name='uq_exam_submission_claim_owner'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    exam_id = db.Column(db.Integer, nullable=False, index=True)
+    student_id = db.Column(db.Integer, nullable=False, index=True)
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False)
+    submission_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ExamSetAssignment(db.Model):
+    """Precomputed exam set for each student on the roster, written at publish time."""
+    __tablename__ = 'exam_set_assignment'
+    __table_args__ = (
+        db.UniqueConstraint('exam_id', 'student_id', name='uq_exam_set_assignment_student'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    exam_id = db.Column(db.Integer, nullable=False, index=True)
+    student_id = db.Column(db.Integer, nullable=False)
+    set_id = db.Column(db.Integer, nullable=False)
+    seat_index = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class AssessmentStatistics(db.Model):
+    """
+    Stored item analysis for one quiz or exam. The compact response matrix
+    (students x items, option ids) is kept so new submissions can be folded
+    in without re-reading every answer.
+    """
+    __tablename__ = 'assessment_statistics'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'assessment_id', name='uq_assessment_statistics_owner'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # quiz, exam
+    assessment_id = db.Column(db.Integer, nullable=False)
+    watermark = db.Column(db.Integer, nullable=False, default=0)  # last submission id folded in
+
+    item_ids = db.Column(db.Text)     # JSON list of question ids (matrix columns)
+    answer_key = db.Column(db.Text)   # JSON list of correct option ids, same order
+    student_ids = db.Column(db.Text)  # JSON list of student ids (matrix rows)
+    responses = db.Column(db.LargeBinary)
+
+    results = db.Column(db.Text)      # JSON, served as-is to dashboards
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class AttendanceMonth(db.Model):
+    """
+    One student's marks from one teacher for one calendar month, bit-packed:
+    bit (day - 1) of marked_bits is set when the day was recorded and the
+    same bit of present_bits when the student was present.
+    """
+    __tablename__ = 'attendance_month'
+    __table_args__ = (
+        db.UniqueConstraint('teacher_id', 'student_id', 'month', name='uq_attendance_month_owner'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    teacher_id = db.Column(db.Integer, nullable=False, index=True)
+    student_id = db.Column(db.Integer, nullable=False, index=True)
+    class_name = db.Column(db.String(50), index=True)
+    month = db.Column(db.Date, nullable=False)  # first day of the month
+    marked_bits = db.Column(db.Integer, nullable=False, default=0)
+    present_bits = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AttendanceDaySummary(db.Model):
+    """Present / recorded counts for one class, teacher and day."""
+    __tablename__ = 'attendance_day_summary'
+    __table_args__ = (
+        db.UniqueConstraint('teacher_id', 'class_name', 'date', name='uq_attendance_day_summary_owner'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    teacher_id = db.Column(db.Integer, nullable=False, index=True)
+    class_name = db.Column(db.String(50))
+    date = db.Column(db.Date, nullable=False)
+    present = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AttendanceStudentSummary(db.Model):
+    """Running totals and streaks of one student's marks from one teacher."""
+    __tablename__ = 'attendance_student_summary'
+    __table_args__ = (
+        db.UniqueConstraint('teacher_id', 'student_id', name='uq_attendance_student_summary_owner'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    teacher_id = db.Column(db.Integer, nullable=False, index=True)
+    student_id = db.Column(db.Integer, nullable=False, index=True)
+    class_name = db.Column(db.String(50), index=True)
+    present = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    current_streak = db.Column(db.Integer, nullable=False, default=0)  # consecutive presents up to last_date
+    longest_streak = db.Column(db.Integer, nullable=False, default=0)
+    last_date = db.Column(db.Date)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def rate(self):
+        return round(self.present * 100.0 / self.total, 1) if self.total else None
+
+
+class NotificationUnreadCounter(db.Model):
+    """
+    Unread notification count per user (keyed by User.user_id, like
+    NotificationRecipient). Upserted by fan-out (or created on first read
+    from a COUNT), then kept up to date by mark-read and delete.
+    """
+    __tablename__ = 'notification_unread_counter'
+
+    user_id = db.Column(db.String(50), primary_key=True)
+    unread = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class NotificationRetentionPolicy(db.Model):
+    """Single-row retention settings for notifications (edited in admin settings)."""
+    __tablename__ = 'notification_retention_policy'
+
+    id = db.Column(db.Integer, primary_key=True)
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    read_after_days = db.Column(db.Integer, nullable=False, default=90)  # archive read notifications older than this
+    sink = db.Column(db.String(10), nullable=False, default='table')  # 'table' or 'jsonl'
+    batch_size = db.Column(db.Integer, nullable=False, default=1000)
+    last_run_at = db.Column(db.DateTime)
+    last_archived = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class NotificationArchive(db.Model):
+    """An archived Notification: the columns that are searched, the rest as JSON."""
+    __tablename__ = 'notification_archive'
+
+    id = db.Column(db.Integer, primary_key=True)  # original Notification.id
+    type = db.Column(db.String(50), index=True)
+    title = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, index=True)
+    payload = db.Column(db.Text, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class NotificationRecipientArchive(db.Model):
+    """An archived (read) NotificationRecipient."""
+    __tablename__ = 'notification_recipient_archive'
+
+    id = db.Column(db.Integer, primary_key=True)  # original NotificationRecipient.id
+    notification_id = db.Column(db.Integer, nullable=False, index=True)
+    user_id = db.Column(db.String(50), nullable=False, index=True)
+    read_at = db.Column(db.DateTime)
+
+
+class EmailOutbox(db.Model):
+    """Queued outgoing email; delivered by EmailOutboxService's worker."""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_due', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    html = db.Column(db.Text)
+    category = db.Column(db.String(50), index=True)  # e.g. 'password_reset'
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending, sending, sent, failed
+    claim_token = db.Column(db.String(32))  # set by the worker that is sending it
+    claimed_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+
+class IdCounter(db.Model):
+    """Last number handed out for a user ID prefix (STD, TCH, PAR...); see IdAllocator."""
+    __tablename__ = 'id_counter'
+
+    prefix = db.Column(db.String(10), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class PromotionRun(db.Model):
+    """One end-of-year promotion: reviewed plan, apply progress and rollback snapshot (see PromotionService)."""
+    __tablename__ = 'promotion_run'
+
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='preview')  # preview, applying, applied, rolling_back, rolled_back, failed
+    created_by = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)  # changed since the preview
+    summary = db.Column(db.Text)  # JSON: counts per status and per class move
+    plan_path = db.Column(db.String(255))
+    snapshot_path = db.Column(db.String(255))
+    error = db.Column(db.Text)
+
+
+class VoucherBatch(db.Model):
+    """One bulk minting run; its AdmissionVouchers point back through batch_id (see VoucherService)."""
+    __tablename__ = 'voucher_batch'
+
+    id = db.Column(db.Integer, primary_key=True)
+    minted_at = db.Column(db.DateTime, nullable=False, index=True)
+    count = db.Column(db.Integer, nullable=False)
+    amount = db.Column(db.Float, nullable=False, default=0.0)
+    valid_until = db.Column(db.DateTime)
+    created_by = db.Column(db.String(50))
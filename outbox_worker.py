@@ -0,0 +1,34 @@
+# outbox_worker.py
+# Deliver queued email (EmailOutbox) outside the web process.
+#
+#   python outbox_worker.py          # run until stopped
+#   python outbox_worker.py --once   # drain what is due, then exit
+#
+# Set EMAIL_OUTBOX_WORKER=0 for the web app when this runs as its own
+# service. For local testing point MAIL_SERVER/MAIL_PORT at a stand-in:
+#   python -m aiosmtpd -n -l localhost:8025
+import argparse
+
+from app import app
+from services.email_outbox_service import EmailOutboxService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send queued outbox email.")
+    parser.add_argument("--once", action="store_true", help="exit when nothing is due")
+    parser.add_argument("--retry-failed", action="store_true", help="requeue failed messages first")
+    args = parser.parse_args()
+
+    if args.retry_failed:
+        with app.app_context():
+            app.config['EMAIL_OUTBOX_WORKER'] = False  # this process is the worker
+            print(f"Requeued {EmailOutboxService.retry_failed()} failed message(s).")
+
+    EmailOutboxService.run_forever(app, once=args.once)
+
+    with app.app_context():
+        print("Outbox:", EmailOutboxService.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,9 @@ from models import TimetableEntry, db, User, ParentProfile, ParentChildLink, Stu
 from datetime import datetime
 import os
 from werkzeug.utils import secure_filename
+from services.attendance_summary_service import AttendanceSummaryService
+from services.notification_counter_service import NotificationCounterService
+from services.notification_inbox_service import NotificationInboxService
 
 parent_bp = Blueprint('parent', __name__, url_prefix='/parent')
 
@@ -49,11 +52,7 @@ def dashboard():
 
     total_children = len(children)
 
-    # Optional: compute unread notifications for parent (if you have a Notification model)
-    try:
-        unread_notifications_count = db.session.query(Notification).filter_by(user_id=current_user.user_id, read=False).count()
-    except Exception:
-        unread_notifications_count = 0
+    unread_notifications_count = NotificationCounterService.get(current_user.user_id)
 
     # Optional: compute upcoming items across children (exams/assignments/events)
     try:
@@ -182,9 +181,10 @@ def view_attendance(child_id):
     student_profile = StudentProfile.query.filter_by(id=child_id).first_or_404()
     user = User.query.filter_by(user_id=student_profile.user_id).first_or_404()
 
-    # Fetch attendance records for this student (order by date)
-    attendance_records = (db.session.query(AttendanceRecord)
-                          .filter_by(student_id=student_profile.id)
+    # Fetch attendance records for this student (order by date);
+    # records are keyed by User.id, like everywhere attendance is written
+    attendance_records = (db.session.query(AttendanceRecord.date, AttendanceRecord.is_present)
+                          .filter(AttendanceRecord.student_id == user.id)
                           .order_by(AttendanceRecord.date.desc())
                           .all())
 
@@ -198,7 +198,8 @@ def view_attendance(child_id):
         'parent/view_attendance.html',
         student=student_profile,
         user=user,
-        records=formatted_records
+        records=formatted_records,
+        summary=AttendanceSummaryService.student_summary(user.id)
     )
 
 @parent_bp.route('/report/<int:child_id>')
@@ -305,27 +306,13 @@ def reports_list():
     return render_template('parent/reports_list.html', children=children)
 
 
-@parent_bp.app_context_processor
-def inject_parent_notification_count():
-    unread_count = 0
-    if current_user.is_authenticated and hasattr(current_user, "user_id"):
-        unread_count = NotificationRecipient.query.filter_by(
-            user_id=current_user.user_id,
-            is_read=False
-        ).count()
-    return dict(unread_count=unread_count)
-
 @parent_bp.route('/notifications')
 @login_required
 def notifications():
-    notifications = (
-        NotificationRecipient.query
-        .join(Notification)  # use the class, not a string
-        .filter(NotificationRecipient.user_id == current_user.user_id)
-        .order_by(Notification.created_at.desc())  # order by the Notification's created_at
-        .all()
+    notifications, next_before = NotificationInboxService.items(
+        current_user.user_id, before=request.args.get('before', type=int)
     )
-    return render_template('parent/notifications.html', notifications=notifications)
+    return render_template('parent/notifications.html', notifications=notifications, next_before=next_before)
 
 @parent_bp.route('/notifications/view/<int:recipient_id>')
 @login_required
@@ -341,10 +328,21 @@ def view_parent_notification(recipient_id):
     if not recipient.is_read:
         recipient.is_read = True
         recipient.read_at = datetime.utcnow()
+        NotificationCounterService.adjust(current_user.user_id, -1)
         db.session.commit()
+        NotificationCounterService.publish([current_user.user_id])
 
     return render_template('parent/notification_detail.html', recipient=recipient)
 
+@parent_bp.route('/notifications/open/<int:notification_id>')
+@login_required
+def open_parent_notification(notification_id):
+    """Open a notification by its id (live-pushed list items don't know the recipient row)."""
+    recipient = NotificationRecipient.query.filter_by(
+        notification_id=notification_id, user_id=current_user.user_id
+    ).first_or_404()
+    return redirect(url_for('parent.view_parent_notification', recipient_id=recipient.id))
+
 @parent_bp.route('/notifications/mark_read/<int:recipient_id>', methods=['POST'])
 @login_required
 def mark_parent_notification_read(recipient_id):
@@ -355,17 +353,16 @@ def mark_parent_notification_read(recipient_id):
     if not recipient.is_read:
         recipient.is_read = True
         recipient.read_at = datetime.utcnow()
+        NotificationCounterService.adjust(current_user.user_id, -1)
         db.session.commit()
+        NotificationCounterService.publish([current_user.user_id])
 
     return jsonify({"success": True, "id": recipient_id})
 
 @parent_bp.route('/notifications/unread_count')
 @login_required
 def get_unread_count():
-    unread_count = NotificationRecipient.query.filter_by(
-        user_id=current_user.user_id,
-        is_read=False
-    ).count()
+    unread_count = NotificationCounterService.get(current_user.user_id)
     return jsonify({"unread_count": unread_count})
 
 @parent_bp.route('/fees')
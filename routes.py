@@ -11,6 +11,8 @@ from werkzeug.utils import secure_filename
 from PIL import Image
 from utils.extensions import db
 from .models import AdmissionVoucher, Applicant, Application, ApplicationResult
+from services.voucher_service import VoucherService
+from services.application_progress_service import ApplicationProgressService, PERSONAL, GUARDIAN, PROGRAMME, EDUCATION, RESULTS
 from .forms import (ApplicantRegistrationForm, ApplicantLoginForm, PersonalInfoForm, GuardianForm, ProgrammeChoiceForm, EducationForm, ExamInfoForm, ExamResultForm, PassportUploadForm, DeclarationForm, PurchaseVoucherForm, VoucherAuthenticationForm)
 from datetime import datetime, timedelta
 
@@ -41,52 +43,9 @@ def get_next_application_step(application):
     """
     Returns a string route like 'admissions.personal_info', 'admissions.guardian', ...
     If the application is complete (or none), returns 'admissions.preview' or None.
+    Read from application.progress, so no documents/results are loaded.
     """
-    if not application:
-        return 'admissions.personal_info'
-
-    # STEP 1: Personal info required fields
-    required_personal = (
-        application.surname,
-        application.other_names,
-        application.gender,
-        application.dob,
-        application.nationality,
-        application.phone,
-        application.email
-    )
-    if not all(required_personal):
-        return 'admissions.personal_info'
-
-    # STEP 2: Guardian
-    if not application.guardian_name:
-        return 'admissions.guardian'
-
-    # STEP 3: Programme choices
-    if not application.first_choice:
-        return 'admissions.programme'
-
-    # STEP 4: Education history - depends on your data model; assume some fields
-    if not application.documents:  # or check explicit fields if you saved schools
-        # if you track education entries in another model, check those here
-        return 'admissions.education'
-
-    # STEP 5-6: Exams & results - check ApplicationResult entries
-    results_count = ApplicationResult.query.filter_by(application_id=application.id).count()
-    if results_count == 0:
-        return 'admissions.exam_results'
-
-    # STEP 7: Passport / photo - check ApplicationDocument (type='photo') or session info
-    has_photo = any(d.document_type == 'photo' and d.file_path for d in application.documents)
-    if not has_photo:
-        return 'admissions.passport_upload'
-
-    # if everything present but status is still draft, go to preview
-    if application.status != 'submitted':
-        return 'admissions.preview'
-
-    # already submitted
-    return None
+    return ApplicationProgressService.next_step(application)
 
 # =====================================================
 # Landing Page
@@ -213,7 +172,7 @@ def voucher_authentication():
         pin = form.voucher_pin.data.strip()
         serial = form.serial_number.data.strip()
 
-        voucher = AdmissionVoucher.query.filter_by(pin=pin, serial=serial).first()
+        voucher = VoucherService.find(pin, serial)
         if not voucher:
             flash("Invalid voucher PIN or Serial Number.", "danger")
             return redirect(url_for('admissions.voucher_authentication'))
@@ -273,7 +232,7 @@ def voucher_validate():
         pin = request.form.get('pin')
         serial = request.form.get('serial')
 
-        voucher = AdmissionVoucher.query.filter_by(pin=pin, serial=serial).first()
+        voucher = VoucherService.find(pin, serial)
         if not voucher:
             flash('Invalid voucher credentials.', 'danger')
             return redirect(url_for('admissions.voucher_validate'))
@@ -321,8 +280,7 @@ def purchase_voucher():
                 serial = voucher.serial
             else:
                 # 2️⃣ Generate a new voucher
-                pin = ''.join(random.choices(string.digits, k=8))
-                serial = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+                pin, serial = VoucherService.codes(1)[0]
 
                 voucher = AdmissionVoucher(
                     pin=pin,
@@ -430,6 +388,7 @@ def personal_info():
         application.phone = form.phone.data
         application.email = form.email.data
         application.postal_address = form.postal_address.data
+        ApplicationProgressService.mark(application, PERSONAL, ApplicationProgressService.personal_complete(application))
 
         db.session.commit()
         return redirect(url_for('admissions.guardian'))
@@ -472,6 +431,7 @@ def guardian():
         application.guardian_phone = form.phone.data
         application.guardian_email = form.email.data
         application.guardian_address = form.address.data
+        ApplicationProgressService.mark(application, GUARDIAN, bool(application.guardian_name))
 
         db.session.commit()
         return redirect(url_for('admissions.programme'))
@@ -505,6 +465,7 @@ def programme():
         application.third_stream = form.third_stream.data
         application.fourth_choice = form.fourth_choice.data
         application.fourth_stream = form.fourth_stream.data
+        ApplicationProgressService.mark(application, PROGRAMME, bool(application.first_choice))
 
         db.session.commit()
         return redirect(url_for('admissions.education'))
@@ -531,6 +492,10 @@ def education():
     form = EducationForm()
 
     if form.validate_on_submit():
+        application = Application.query.filter_by(applicant_id=session['applicant_id']).first()
+        if application:
+            ApplicationProgressService.mark(application, EDUCATION)
+            db.session.commit()
         return redirect(url_for('admissions.exam_info'))
 
     return render_template('admissions/education.html', form=form)
@@ -580,6 +545,7 @@ def exam_results():
                 grade=grd
             )
             db.session.add(result)
+        ApplicationProgressService.mark(application, RESULTS, bool(subjects))
 
         db.session.commit()
         flash('Exam results saved successfully.', 'success')
@@ -588,20 +554,17 @@ def exam_results():
     return render_template('admissions/exam_results.html', form=form, application=application)
 
 
-from PIL import Image
-from werkzeug.utils import secure_filename
-
-from PIL import Image
-from werkzeug.utils import secure_filename
-import colorsys
-import os
-
 @admissions_bp.route('/application/passport', methods=['GET', 'POST'])
 @applicant_login_required
 def passport_upload():
+    from services.passport_photo_service import PassportPhotoService
+
     form = PassportUploadForm()
     error = None
     applicant_id = session['applicant_id']
+    application = Application.query.filter_by(applicant_id=applicant_id).first()
+    if not application:
+        return redirect(url_for('admissions.personal_info'))
 
     # Directory where uploaded images are stored
     upload_dir = os.path.join(
@@ -609,56 +572,29 @@ def passport_upload():
         'admissions', 'static', 'uploads',
         str(applicant_id)
     )
-    os.makedirs(upload_dir, exist_ok=True)
 
-    # Check for existing passport image in folder
-    existing_files = [f for f in os.listdir(upload_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-    existing_passport = existing_files[0] if existing_files else None
+    # The chosen photo is recorded on the application, no folder listing needed
+    photo = PassportPhotoService.current(application)
+    existing_passport = os.path.basename(photo.file_path) if photo else None
 
     if form.validate_on_submit():
-        passport = form.passport.data
-        filename = secure_filename(passport.filename)
-        temp_path = os.path.join(upload_dir, 'temp_' + filename)
-        passport.save(temp_path)
-
+        os.makedirs(upload_dir, exist_ok=True)
         try:
-            img = Image.open(temp_path)
-            img = img.convert('RGB')
-            width, height = img.size
-
-            if width == 0 or height == 0:
-                raise ValueError("Uploaded image is empty")
-
-            # Sample pixels at 5x5 grid
-            sample_points = [(min(int(width*i/4), width-1), min(int(height*j/4), height-1))
-                             for i in range(5) for j in range(5)]
-
-            def is_green_pixel(rgb):
-                r, g, b = rgb
-                h, s, v = colorsys.rgb_to_hsv(r/255, g/255, b/255)
-                return 0.23 <= h <= 0.42 and s >= 0.3 and v >= 0.3
-
-            green_count = sum(1 for px in sample_points if is_green_pixel(img.getpixel(px)))
-            if green_count / len(sample_points) >= 0.6:
-                final_path = os.path.join(upload_dir, filename)
-                os.rename(temp_path, final_path)
-                session['uploaded_passport'] = filename
-                existing_passport = filename
-                return redirect(url_for('admissions.preview'))
-            else:
-                error = "Passport photo must have a green background."
-                os.remove(temp_path)
-
-        except Exception as e:
-            error = f"Error processing image: {str(e)}"
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            photo = PassportPhotoService.save(
+                form.passport.data, application, upload_dir, url_prefix=f"uploads/{applicant_id}/"
+            )
+        except ValueError as e:
+            error = str(e)
+        else:
+            session['uploaded_passport'] = existing_passport = os.path.basename(photo.file_path)
+            return redirect(url_for('admissions.preview'))
 
     return render_template(
         'admissions/passport.html',
         form=form,
         error=error,
-        existing_passport=existing_passport
+        existing_passport=existing_passport,
+        existing_thumbnail=PassportPhotoService.thumbnail_name(existing_passport) if existing_passport else None
     )
 
 
@@ -0,0 +1,126 @@
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import and_, case, func, or_, select
+
+from models import db, Applicant, Application, ApplicationDocument, ApplicationResult
+from utils.helpers import escape_like
+from utils.schema import ensure_indexes
+
+# listing order (newest submission first) overall and per status, and the per-application counts
+ADMISSIONS_INDEXES = (
+    db.Index('ix_application_submitted_id', Application.submitted_at, Application.id),
+    db.Index('ix_application_status_submitted_id', Application.status, Application.submitted_at, Application.id),
+    db.Index('ix_application_document_application', ApplicationDocument.application_id),
+    db.Index('ix_application_result_application', ApplicationResult.application_id),
+)
+
+SEARCH_COLUMNS = (
+    Application.surname, Application.other_names, Application.email,
+    Application.first_choice, Application.second_choice, Application.third_choice, Application.fourth_choice,
+)
+
+
+class AdmissionsListingService:
+    """
+    The admin admissions list.
+
+    Stats are one GROUP BY status. Pages are ordered newest submission
+    first (drafts, which have no submitted_at, last) and keyset paged on
+    (submitted_at, id), so page N costs the same as page 1. Each page comes
+    with its applicants' login emails and document/result counts from two
+    grouped queries, instead of lazy loads per row. Search matches name,
+    email and any programme choice.
+    """
+
+    @staticmethod
+    def stats():
+        """{'total', 'submitted', 'approved', 'rejected', ...every other status}."""
+        counts = dict(
+            db.session.query(Application.status, func.count(Application.id))
+            .group_by(Application.status)
+            .all()
+        )
+        stats = {'total': sum(counts.values()), 'submitted': 0, 'approved': 0, 'rejected': 0}
+        for status, n in counts.items():
+            stats[status or 'draft'] = stats.get(status or 'draft', 0) + n
+        return stats
+
+    @staticmethod
+    def page(status=None, search=None, after=None, limit=None):
+        """
+        ([{application, applicant_email, documents, results}], next_cursor).
+        after is the previous page's next_cursor; None means the first page.
+        """
+        limit = limit or current_app.config.get('ADMISSIONS_PAGE_SIZE', 50)
+        is_draft = case((Application.submitted_at.is_(None), 1), else_=0)
+
+        query = (
+            db.session.query(Application, Applicant.email)
+            .outerjoin(Applicant, Applicant.id == Application.applicant_id)
+        )
+        if status:
+            query = query.filter(Application.status == status)
+        if search:
+            like = f"%{escape_like(search.lower())}%"
+            query = query.filter(or_(*[func.lower(c).like(like, escape='\\') for c in SEARCH_COLUMNS]))
+        if after:
+            query = query.filter(AdmissionsListingService._after(after))
+
+        rows = (
+            query.order_by(is_draft, Application.submitted_at.desc(), Application.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        more = len(rows) > limit
+        rows = rows[:limit]
+
+        ids = [a.id for a, _ in rows]
+        documents = AdmissionsListingService._counts(ApplicationDocument, ids)
+        results = AdmissionsListingService._counts(ApplicationResult, ids)
+        items = [{
+            "application": a,
+            "applicant_email": email,
+            "documents": documents.get(a.id, 0),
+            "results": results.get(a.id, 0),
+        } for a, email in rows]
+
+        next_cursor = AdmissionsListingService._cursor(rows[-1][0]) if more else None
+        return items, next_cursor
+
+    @staticmethod
+    def ensure_indexes():
+        """Create the listing indexes on databases created before they existed."""
+        return ensure_indexes(ADMISSIONS_INDEXES)
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _counts(Model, ids):
+        if not ids:
+            return {}
+        return dict(db.session.execute(
+            select(Model.application_id, func.count(Model.id))
+            .where(Model.application_id.in_(ids))
+            .group_by(Model.application_id)
+        ).all())
+
+    @staticmethod
+    def _cursor(application):
+        """'<submitted_at iso>~<id>', or '~<id>' for a draft."""
+        submitted = application.submitted_at.isoformat() if application.submitted_at else ''
+        return f"{submitted}~{application.id}"
+
+    @staticmethod
+    def _after(cursor):
+        """Rows after the cursor in (drafts last, submitted_at desc, id desc) order."""
+        submitted, _, last_id = cursor.partition('~')
+        last_id = int(last_id)
+        if not submitted:
+            return and_(Application.submitted_at.is_(None), Application.id < last_id)
+        submitted = datetime.fromisoformat(submitted)
+        return or_(
+            Application.submitted_at < submitted,
+            and_(Application.submitted_at == submitted, Application.id < last_id),
+            Application.submitted_at.is_(None),
+        )
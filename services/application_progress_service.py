@@ -0,0 +1,130 @@
+from sqlalchemy import and_, case, exists, func, select
+
+from models import db, Application, ApplicationDocument, ApplicationResult
+from utils.schema import add_column
+
+# Application.progress bits, one per completed step
+PERSONAL = 1
+GUARDIAN = 2
+PROGRAMME = 4
+EDUCATION = 8
+RESULTS = 16
+PHOTO = 32
+
+# (bit, route of the step that sets it, funnel label), in application order
+STEPS = (
+    (PERSONAL, 'admissions.personal_info', 'Personal info'),
+    (GUARDIAN, 'admissions.guardian', 'Guardian'),
+    (PROGRAMME, 'admissions.programme', 'Programme'),
+    (EDUCATION, 'admissions.education', 'Education'),
+    (RESULTS, 'admissions.exam_results', 'Exam results'),
+    (PHOTO, 'admissions.passport_upload', 'Passport photo'),
+)
+COMPLETE = PERSONAL | GUARDIAN | PROGRAMME | EDUCATION | RESULTS | PHOTO
+
+PERSONAL_FIELDS = (
+    Application.surname, Application.other_names, Application.gender, Application.dob,
+    Application.nationality, Application.phone, Application.email,
+)
+
+
+class ApplicationProgressService:
+    """
+    Application completeness as a bitmask on Application.progress.
+
+    Each step's POST handler sets (or clears) its bit along with the data it
+    saves, so the next step is read off the row already loaded - no
+    document or result queries. The admin funnel is one aggregate over the
+    column: an application has reached a step when every bit up to and
+    including it is set.
+
+    Databases created before the column existed get it added, and filled
+    from the saved data with one UPDATE per step, by ensure_column().
+    """
+
+    @staticmethod
+    def mark(application, bit, done=True):
+        """Set (or clear) a step bit. The caller commits."""
+        progress = application.progress or 0
+        application.progress = progress | bit if done else progress & ~bit
+
+    @staticmethod
+    def personal_complete(application):
+        return all(getattr(application, c.key) for c in PERSONAL_FIELDS)
+
+    @staticmethod
+    def next_step(application):
+        """
+        The route of the first unfinished step, 'admissions.preview' when all
+        are done but not submitted, or None once submitted.
+        """
+        if not application:
+            return 'admissions.personal_info'
+        progress = application.progress or 0
+        for bit, route, _ in STEPS:
+            if not progress & bit:
+                return route
+        if application.status != 'submitted':
+            return 'admissions.preview'
+        return None
+
+    @staticmethod
+    def funnel():
+        """[{'label', 'count'}] for every step reached, then submitted, from one query."""
+        progress = func.coalesce(Application.progress, 0)
+        columns = [func.count(Application.id)]
+        mask = 0
+        for bit, _, _ in STEPS:
+            mask |= bit
+            columns.append(func.sum(case((progress.op('&')(mask) == mask, 1), else_=0)))
+        columns.append(func.sum(case((Application.status.in_(('submitted', 'approved', 'rejected')), 1), else_=0)))
+
+        total, *counts = db.session.execute(select(*columns)).one()
+        labels = ['Started'] + [label for _, _, label in STEPS] + ['Submitted']
+        return [
+            {"label": label, "count": int(count or 0)}
+            for label, count in zip(labels, [total] + counts)
+        ]
+
+    @staticmethod
+    def backfill():
+        """Recompute every application's bits from its saved data."""
+        has_document = exists().where(ApplicationDocument.application_id == Application.id)
+        has_result = exists().where(ApplicationResult.application_id == Application.id)
+        has_photo = exists().where(and_(
+            ApplicationDocument.application_id == Application.id,
+            ApplicationDocument.document_type == 'photo',
+            ApplicationDocument.file_path.isnot(None),
+        ))
+        conditions = (
+            (PERSONAL, and_(*[ApplicationProgressService._filled(c) for c in PERSONAL_FIELDS])),
+            (GUARDIAN, ApplicationProgressService._filled(Application.guardian_name)),
+            (PROGRAMME, ApplicationProgressService._filled(Application.first_choice)),
+            (EDUCATION, has_document),  # as before: education counted done once any document exists
+            (RESULTS, has_result),
+            (PHOTO, has_photo),
+        )
+        with db.engine.begin() as conn:
+            conn.execute(db.update(Application).values(progress=0))
+            for bit, condition in conditions:
+                conn.execute(
+                    db.update(Application)
+                    .where(condition)
+                    .values(progress=Application.progress.op('|')(bit))
+                )
+
+    @staticmethod
+    def ensure_column():
+        """Add and backfill Application.progress on databases created before it. True if added."""
+        if not add_column(Application.__tablename__, 'progress', 'INTEGER NOT NULL DEFAULT 0'):
+            return False
+        ApplicationProgressService.backfill()
+        return True
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _filled(column):
+        if isinstance(column.type, db.String):
+            return and_(column.isnot(None), column != '')
+        return column.isnot(None)
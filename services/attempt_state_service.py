@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, AttemptState, AttemptStateAnswer
+
+# Late submits (slow networks, auto-submit racing the clock) are still accepted
+# for this many seconds after the deadline.
+SUBMIT_GRACE_SECONDS = 30
+
+
+class AttemptStateService:
+
+    @staticmethod
+    def get(kind, assessment_id, student_id):
+        return AttemptState.query.filter_by(
+            kind=kind,
+            assessment_id=assessment_id,
+            student_id=student_id
+        ).first()
+
+    @staticmethod
+    def start(kind, assessment_id, student_id, duration_minutes, hard_end=None, attempt_id=None):
+        """
+        Return the running state for this student, creating it on first call.
+        The deadline is fixed at creation: start + duration, capped by hard_end.
+        """
+        state = AttemptStateService.get(kind, assessment_id, student_id)
+        if state and not state.finished_at:
+            return state
+
+        now = datetime.utcnow()
+        deadline = now + timedelta(minutes=duration_minutes or 0)
+        if hard_end and hard_end < deadline:
+            deadline = hard_end
+
+        if state:
+            # previous attempt finished -> reuse the row for the new attempt
+            state.answers.delete(synchronize_session=False)
+            state.started_at = now
+            state.deadline = deadline
+            state.finished_at = None
+            state.attempt_id = attempt_id
+            db.session.commit()
+            return state
+
+        state = AttemptState(
+            kind=kind,
+            assessment_id=assessment_id,
+            student_id=student_id,
+            attempt_id=attempt_id,
+            started_at=now,
+            deadline=deadline
+        )
+        db.session.add(state)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # two tabs started at once: the other insert won
+            db.session.rollback()
+            state = AttemptStateService.get(kind, assessment_id, student_id)
+        return state
+
+    @staticmethod
+    def save_answer(state, question_id, value):
+        """
+        Upsert a single answer. Cost is one indexed lookup and one row write,
+        regardless of how many questions were already answered.
+        Returns False when the deadline has passed.
+        """
+        if state.finished_at or state.is_expired():
+            return False
+
+        ans = AttemptStateAnswer.query.filter_by(state_id=state.id, question_id=question_id).first()
+        if ans:
+            ans.value = value
+        else:
+            db.session.add(AttemptStateAnswer(state_id=state.id, question_id=question_id, value=value))
+        db.session.commit()
+        return True
+
+    @staticmethod
+    def answers_map(state):
+        if not state:
+            return {}
+        rows = (
+            db.session.query(AttemptStateAnswer.question_id, AttemptStateAnswer.value)
+            .filter(AttemptStateAnswer.state_id == state.id)
+            .all()
+        )
+        return {str(qid): value for qid, value in rows}
+
+    @staticmethod
+    def accepts_submission(state, now=None):
+        return state is not None and not state.is_expired(now, grace_seconds=SUBMIT_GRACE_SECONDS)
+
+    @staticmethod
+    def finish(state):
+        """Mark the attempt finished. Caller commits together with the submission."""
+        if state:
+            state.finished_at = datetime.utcnow()
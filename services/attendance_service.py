@@ -0,0 +1,255 @@
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import and_, func, inspect, select
+
+from models import db, AttendanceRecord, AcademicCalendar, User, StudentProfile
+from services.attendance_summary_service import AttendanceSummaryService
+
+# one mark per student, day and teacher; lets saves be a single upsert
+ATTENDANCE_UNIQUE_INDEX = db.Index(
+    'uq_attendance_record_student_date_teacher',
+    AttendanceRecord.student_id, AttendanceRecord.date, AttendanceRecord.teacher_id,
+    unique=True
+)
+
+
+class AttendanceService:
+    """
+    Attendance capture: class rosters and the academic calendar are cached
+    per process (short TTL + explicit invalidation), and a whole sheet of
+    marks, or several days of them, is written with one multi-row upsert
+    in the same transaction as the summary rollups.
+    """
+
+    UPSERT_CHUNK = 200  # rows per INSERT (keeps SQLite under its bound-parameter limit)
+
+    _rosters = {}     # class_name -> (expires_at, [{"id", "full_name"}])
+    _calendar = None  # (expires_at, {"YYYY-MM-DD": break_type})
+    _unique = None    # (checked_at, index exists); native upserts need the unique index
+    _guard = threading.Lock()
+
+    @staticmethod
+    def roster(class_name):
+        """Students of a class, ordered by last name, as plain dicts."""
+        cached = AttendanceService._rosters.get(class_name)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        students = (
+            User.query
+                .join(StudentProfile, StudentProfile.user_id == User.user_id)
+                .filter(StudentProfile.current_class == class_name)
+                .order_by(User.last_name)
+                .all()
+        )
+        rows = [{"id": s.id, "full_name": s.full_name} for s in students]
+
+        with AttendanceService._guard:
+            AttendanceService._rosters[class_name] = (time.monotonic() + AttendanceService._ttl(), rows)
+        return rows
+
+    @staticmethod
+    def disabled_dates():
+        """{"YYYY-MM-DD": break_type} for every academic calendar entry."""
+        cached = AttendanceService._calendar
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        entries = AcademicCalendar.query.with_entities(
+            AcademicCalendar.date, AcademicCalendar.break_type
+        ).all()
+        dates = {entry.date.isoformat(): entry.break_type for entry in entries}
+
+        with AttendanceService._guard:
+            AttendanceService._calendar = (time.monotonic() + AttendanceService._ttl(), dates)
+        return dates
+
+    @staticmethod
+    def invalidate_roster(class_name=None):
+        """Drop one class roster, or all of them when class_name is None."""
+        with AttendanceService._guard:
+            if class_name is None:
+                AttendanceService._rosters.clear()
+            else:
+                AttendanceService._rosters.pop(class_name, None)
+
+    @staticmethod
+    def invalidate_calendar():
+        with AttendanceService._guard:
+            AttendanceService._calendar = None
+
+    @staticmethod
+    def recorded(teacher_id, on_date):
+        """{student_id: is_present} already recorded by a teacher on a day."""
+        return dict(
+            db.session.query(AttendanceRecord.student_id, AttendanceRecord.is_present)
+            .filter(AttendanceRecord.teacher_id == teacher_id, AttendanceRecord.date == on_date)
+            .all()
+        )
+
+    @staticmethod
+    def save(teacher_id, marks):
+        """
+        marks: iterable of (student_id, date, is_present). Existing marks for
+        the same (student, date, teacher) are overwritten. Returns
+        (inserted, updated).
+        """
+        rows = {}
+        for student_id, on_date, is_present in marks:
+            rows[(student_id, on_date)] = bool(is_present)  # last mark wins within one request
+        if not rows:
+            return 0, 0
+
+        AttendanceSummaryService.ensure_built(teacher_id)
+
+        existing = {
+            (sid, d) for sid, d in
+            db.session.query(AttendanceRecord.student_id, AttendanceRecord.date)
+            .filter(
+                AttendanceRecord.teacher_id == teacher_id,
+                AttendanceRecord.date.in_({d for _, d in rows}),
+                AttendanceRecord.student_id.in_({sid for sid, _ in rows})
+            )
+            .all()
+            if (sid, d) in rows
+        }
+
+        values = [
+            {"student_id": sid, "date": d, "teacher_id": teacher_id, "is_present": present}
+            for (sid, d), present in sorted(rows.items())  # same lock order in every save
+        ]
+        for i in range(0, len(values), AttendanceService.UPSERT_CHUNK):
+            AttendanceService._upsert(values[i:i + AttendanceService.UPSERT_CHUNK], existing)
+        AttendanceSummaryService.apply(teacher_id, values)
+        db.session.commit()
+
+        updated = sum(1 for key in rows if key in existing)
+        return len(rows) - updated, updated
+
+    @staticmethod
+    def unique_index_ready(refresh=False):
+        """
+        Whether the (student, date, teacher) unique index exists. A missing
+        index is rechecked at most once per cache TTL.
+        """
+        cached = AttendanceService._unique
+        if cached and not refresh and (cached[1] or cached[0] + AttendanceService._ttl() > time.monotonic()):
+            return cached[1]
+        table = AttendanceRecord.__table__.name
+        ready = ATTENDANCE_UNIQUE_INDEX.name in {ix['name'] for ix in inspect(db.engine).get_indexes(table)}
+        AttendanceService._unique = (time.monotonic(), ready)
+        return ready
+
+    @staticmethod
+    def ensure_unique_index():
+        """
+        Create the (student, date, teacher) unique index on databases created
+        before it existed. Never deletes anything: if duplicate marks exist,
+        raises RuntimeError; remove them with dedupe_attendance.py first.
+        """
+        if AttendanceService.unique_index_ready(refresh=True):
+            return False
+        duplicates = AttendanceService.duplicates()
+        if duplicates:
+            raise RuntimeError(
+                f"{len(duplicates)} duplicate attendance record(s) block the unique index; "
+                "review and remove them with dedupe_attendance.py"
+            )
+        ATTENDANCE_UNIQUE_INDEX.create(db.engine, checkfirst=True)
+        AttendanceService._unique = (time.monotonic(), True)
+        return True
+
+    @staticmethod
+    def duplicates():
+        """
+        Rows that dedupe() would remove: every mark of a (student, date,
+        teacher) except the newest, ordered by that key.
+        """
+        key = (AttendanceRecord.student_id, AttendanceRecord.date, AttendanceRecord.teacher_id)
+        keep = (
+            select(*key, func.max(AttendanceRecord.id).label('keep_id'))
+            .group_by(*key)
+            .having(func.count(AttendanceRecord.id) > 1)
+            .subquery()
+        )
+        return db.session.execute(
+            select(AttendanceRecord.id, *key, AttendanceRecord.is_present, keep.c.keep_id)
+            .join(keep, and_(
+                AttendanceRecord.student_id == keep.c.student_id,
+                AttendanceRecord.date == keep.c.date,
+                AttendanceRecord.teacher_id == keep.c.teacher_id,
+            ))
+            .where(AttendanceRecord.id != keep.c.keep_id)
+            .order_by(*key, AttendanceRecord.id)
+        ).all()
+
+    @staticmethod
+    def dedupe(ids):
+        """
+        Delete the given duplicate rows by id (from duplicates(), after they
+        have been reviewed), rebuild the affected teachers' rollups, then
+        create the unique index. Returns the number of rows deleted.
+        """
+        ids = list(ids)
+        teachers = set()
+        for i in range(0, len(ids), AttendanceService.UPSERT_CHUNK):
+            chunk = ids[i:i + AttendanceService.UPSERT_CHUNK]
+            teachers.update(t for (t,) in db.session.query(AttendanceRecord.teacher_id).filter(AttendanceRecord.id.in_(chunk)).distinct())
+            AttendanceRecord.query.filter(AttendanceRecord.id.in_(chunk)).delete(synchronize_session=False)
+        db.session.commit()
+        for teacher_id in teachers:
+            AttendanceSummaryService.rebuild(teacher_id)
+        AttendanceService.ensure_unique_index()
+        return len(ids)
+
+    @staticmethod
+    def parse_date(value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            return None
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _ttl():
+        return current_app.config.get('ATTENDANCE_CACHE_TTL', 300)
+
+    @staticmethod
+    def _upsert(values, existing):
+        dialect = db.session.get_bind().dialect.name
+        if not AttendanceService.unique_index_ready():
+            # without the index ON CONFLICT raises (PostgreSQL) or never fires (MySQL)
+            dialect = None
+
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(AttendanceRecord).values(values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['student_id', 'date', 'teacher_id'],
+                set_={'is_present': stmt.excluded.is_present}
+            )
+            db.session.execute(stmt)
+            return
+
+        if dialect in ('mysql', 'mariadb'):
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(AttendanceRecord).values(values)
+            db.session.execute(stmt.on_duplicate_key_update(is_present=stmt.inserted.is_present))
+            return
+
+        # other backends, or no unique index yet: one executemany for new rows, one per changed row
+        new_rows = [v for v in values if (v['student_id'], v['date']) not in existing]
+        if new_rows:
+            db.session.execute(AttendanceRecord.__table__.insert(), new_rows)
+        for v in values:
+            if (v['student_id'], v['date']) in existing:
+                AttendanceRecord.query.filter_by(
+                    student_id=v['student_id'], date=v['date'], teacher_id=v['teacher_id']
+                ).update({'is_present': v['is_present']}, synchronize_session=False)
@@ -0,0 +1,382 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import insert, select, update
+
+from models import (
+    db, AttendanceRecord, User, StudentProfile,
+    AttendanceMonth, AttendanceDaySummary, AttendanceStudentSummary
+)
+
+PRESENT, ABSENT, UNMARKED = 'P', 'A', '-'
+
+
+class AttendanceSummaryService:
+    """
+    Attendance rollups kept next to the raw records and updated in the same
+    transaction as every save:
+
+    - AttendanceMonth: per student and month, marks bit-packed into two ints
+      (the source of the pivot matrix for any date range)
+    - AttendanceDaySummary: present / recorded per class and day
+    - AttendanceStudentSummary: present / recorded, streaks, last day
+
+    Per-class totals are summed from the student summaries.
+
+    Concurrent saves are safe: missing rows are created with
+    insert-or-ignore, a save locks its students' summary and month rows
+    (SELECT ... FOR UPDATE, in student order) before reading their bits,
+    and day counts are added with ON CONFLICT / ON DUPLICATE KEY increments
+    rather than read and written back.
+    """
+
+    _built = set()  # teacher ids whose summaries are known to exist
+
+    @staticmethod
+    def apply(teacher_id, values):
+        """
+        Fold marks into the rollups (no commit). values: dicts with
+        student_id, date and is_present, at most one per (student, date).
+        """
+        if not values:
+            return
+
+        student_ids = sorted({v['student_id'] for v in values})
+        class_of = dict(
+            db.session.query(User.id, StudentProfile.current_class)
+            .join(StudentProfile, StudentProfile.user_id == User.user_id)
+            .filter(User.id.in_(student_ids))
+            .all()
+        )
+
+        # make sure every row exists, then lock them: the student summary first, in id order,
+        # so two saves touching the same students queue up instead of overwriting each other
+        AttendanceSummaryService._insert_missing(AttendanceStudentSummary, ['teacher_id', 'student_id'], [
+            {"teacher_id": teacher_id, "student_id": sid, "class_name": class_of.get(sid),
+             "present": 0, "total": 0, "current_streak": 0, "longest_streak": 0}
+            for sid in student_ids
+        ])
+        summaries = {
+            r.student_id: r
+            for r in AttendanceStudentSummary.query.filter(
+                AttendanceStudentSummary.teacher_id == teacher_id,
+                AttendanceStudentSummary.student_id.in_(student_ids)
+            ).order_by(AttendanceStudentSummary.student_id).with_for_update().populate_existing()
+        }
+        AttendanceSummaryService._insert_missing(AttendanceMonth, ['teacher_id', 'student_id', 'month'], [
+            {"teacher_id": teacher_id, "student_id": sid, "class_name": class_of.get(sid),
+             "month": month, "marked_bits": 0, "present_bits": 0}
+            for sid, month in sorted({(v['student_id'], v['date'].replace(day=1)) for v in values})
+        ])
+        months = {
+            (m.student_id, m.month): m
+            for m in AttendanceMonth.query.filter(
+                AttendanceMonth.teacher_id == teacher_id,
+                AttendanceMonth.student_id.in_(student_ids)
+            ).order_by(AttendanceMonth.student_id, AttendanceMonth.month).with_for_update().populate_existing()
+        }
+
+        day_deltas = defaultdict(lambda: [0, 0])  # (class_name, date) -> [present, total]
+        for v in values:
+            sid, day, present = v['student_id'], v['date'], bool(v['is_present'])
+            row = months[(sid, day.replace(day=1))]
+            bit = 1 << (day.day - 1)
+            # the class at the time of this save; a mark recorded under an earlier class moves over
+            class_name = v.get('class_name') or class_of.get(sid)
+
+            if row.marked_bits & bit:
+                old = day_deltas[(row.class_name, day)]
+                old[0] -= int(bool(row.present_bits & bit))
+                old[1] -= 1
+            new = day_deltas[(class_name, day)]
+            new[0] += int(present)
+            new[1] += 1
+
+            row.class_name = class_name
+            row.marked_bits |= bit
+            row.present_bits = (row.present_bits | bit) if present else (row.present_bits & ~bit)
+
+        AttendanceSummaryService._apply_day_deltas(teacher_id, day_deltas)
+        AttendanceSummaryService._refresh_students(student_ids, months, summaries, class_of)
+
+    @staticmethod
+    def rebuild(teacher_id):
+        """Recompute every rollup of a teacher from AttendanceRecord."""
+        for model in (AttendanceMonth, AttendanceDaySummary, AttendanceStudentSummary):
+            model.query.filter_by(teacher_id=teacher_id).delete(synchronize_session=False)
+
+        rows = (
+            db.session.query(AttendanceRecord.student_id, AttendanceRecord.date, AttendanceRecord.is_present)
+            .filter(AttendanceRecord.teacher_id == teacher_id)
+            .all()
+        )
+        latest = {(sid, d): present for sid, d, present in rows}  # duplicates: last one wins
+        AttendanceSummaryService.apply(teacher_id, [
+            {"student_id": sid, "date": d, "is_present": present}
+            for (sid, d), present in latest.items()
+        ])
+        db.session.commit()
+        AttendanceSummaryService._built.add(teacher_id)
+
+    @staticmethod
+    def ensure_built(teacher_id):
+        """Backfill rollups for teachers whose records predate them (once per process)."""
+        if teacher_id in AttendanceSummaryService._built:
+            return
+        has_summary = db.session.query(AttendanceStudentSummary.id).filter_by(teacher_id=teacher_id).first()
+        if not has_summary and db.session.query(AttendanceRecord.id).filter_by(teacher_id=teacher_id).first():
+            AttendanceSummaryService.rebuild(teacher_id)
+        AttendanceSummaryService._built.add(teacher_id)
+
+    @staticmethod
+    def classes(teacher_id):
+        rows = (
+            db.session.query(AttendanceDaySummary.class_name)
+            .filter(AttendanceDaySummary.teacher_id == teacher_id, AttendanceDaySummary.class_name.isnot(None))
+            .distinct()
+            .order_by(AttendanceDaySummary.class_name)
+            .all()
+        )
+        return [c for (c,) in rows]
+
+    @staticmethod
+    def dates(teacher_id, class_name=None):
+        query = db.session.query(AttendanceDaySummary.date).filter(AttendanceDaySummary.teacher_id == teacher_id)
+        if class_name:
+            query = query.filter(AttendanceDaySummary.class_name == class_name)
+        return [d for (d,) in query.distinct().order_by(AttendanceDaySummary.date).all()]
+
+    @staticmethod
+    def class_summary(teacher_id):
+        """[{class_name, students, present, total, rate}] summed from the student summaries."""
+        rows = (
+            db.session.query(
+                AttendanceStudentSummary.class_name,
+                db.func.count(AttendanceStudentSummary.id),
+                db.func.sum(AttendanceStudentSummary.present),
+                db.func.sum(AttendanceStudentSummary.total)
+            )
+            .filter(AttendanceStudentSummary.teacher_id == teacher_id)
+            .group_by(AttendanceStudentSummary.class_name)
+            .order_by(AttendanceStudentSummary.class_name)
+            .all()
+        )
+        return [{
+            "class_name": class_name,
+            "students": students,
+            "present": present or 0,
+            "total": total or 0,
+            "rate": round((present or 0) * 100.0 / total, 1) if total else None
+        } for class_name, students, present, total in rows]
+
+    @staticmethod
+    def student_summary(student_id):
+        """One student's totals across all teachers (for parent and student views)."""
+        rows = AttendanceStudentSummary.query.filter_by(student_id=student_id).all()
+        present = sum(r.present for r in rows)
+        total = sum(r.total for r in rows)
+        return {
+            "present": present,
+            "total": total,
+            "rate": round(present * 100.0 / total, 1) if total else None,
+            "longest_streak": max((r.longest_streak for r in rows), default=0),
+            "current_streak": max((r.current_streak for r in rows), default=0),
+        }
+
+    @staticmethod
+    def matrix(teacher_id, start=None, end=None, class_name=None):
+        """
+        (dates, students, cells) for a date range from the monthly bitmaps.
+        dates: days with at least one mark; students: dicts sorted by name;
+        cells: {student_id: {date: 1 | 0}}.
+        """
+        query = AttendanceMonth.query.filter(AttendanceMonth.teacher_id == teacher_id)
+        if start:
+            query = query.filter(AttendanceMonth.month >= start.replace(day=1))
+        if end:
+            query = query.filter(AttendanceMonth.month <= end)
+        if class_name:
+            query = query.filter(AttendanceMonth.class_name == class_name)
+
+        cells = defaultdict(dict)
+        for m in query.all():
+            bits, day = m.marked_bits, 0
+            while bits:
+                if bits & 1:
+                    d = m.month + timedelta(days=day)
+                    if (start is None or d >= start) and (end is None or d <= end):
+                        cells[m.student_id][d] = 1 if m.present_bits >> day & 1 else 0
+                bits >>= 1
+                day += 1
+
+        dates = sorted({d for row in cells.values() for d in row})
+        names = (
+            db.session.query(User.id, User.first_name, User.middle_name, User.last_name, StudentProfile.current_class)
+            .join(StudentProfile, StudentProfile.user_id == User.user_id)
+            .filter(User.id.in_(list(cells.keys())))
+            .order_by(User.last_name, User.first_name)
+            .all()
+        ) if cells else []
+        students = [{
+            "id": s.id,
+            "full_name": " ".join(filter(None, [s.first_name, s.middle_name, s.last_name])),
+            "current_class": s.current_class
+        } for s in names]
+        return dates, students, cells
+
+    @staticmethod
+    def pivot(teacher_id, start=None, end=None, class_name=None):
+        """
+        Compact JSON matrix: the date axis once, then one run-length encoded
+        row per student, e.g. "12P1A3-" = 12 present, 1 absent, 3 unmarked.
+        """
+        dates, students, cells = AttendanceSummaryService.matrix(teacher_id, start, end, class_name)
+        rows = []
+        for s in students:
+            marks = cells.get(s["id"], {})
+            symbols = [
+                UNMARKED if d not in marks else (PRESENT if marks[d] else ABSENT)
+                for d in dates
+            ]
+            present, total = sum(marks.values()), len(marks)
+            rows.append({
+                "id": s["id"],
+                "full_name": s["full_name"],
+                "current_class": s["current_class"],
+                "present": present,
+                "total": total,
+                "rate": round(present * 100.0 / total, 1) if total else None,
+                "marks": AttendanceSummaryService.encode_row(symbols)
+            })
+        return {
+            "start": dates[0].isoformat() if dates else None,
+            "end": dates[-1].isoformat() if dates else None,
+            "dates": [d.isoformat() for d in dates],
+            "students": rows
+        }
+
+    @staticmethod
+    def encode_row(symbols):
+        out, prev, run = [], None, 0
+        for sym in symbols:
+            if sym == prev:
+                run += 1
+                continue
+            if prev is not None:
+                out.append(f"{run}{prev}")
+            prev, run = sym, 1
+        if prev is not None:
+            out.append(f"{run}{prev}")
+        return "".join(out)
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _apply_day_deltas(teacher_id, day_deltas):
+        """Add present/total deltas to the day rows as atomic increments."""
+        rows = [
+            {"teacher_id": teacher_id, "class_name": class_name, "date": day, "present": present, "total": total}
+            for (class_name, day), (present, total) in sorted(day_deltas.items(), key=lambda item: (item[0][1], item[0][0] or ''))
+            if present or total
+        ]
+        if not rows:
+            return
+        table = AttendanceDaySummary
+        dialect_insert = AttendanceSummaryService._dialect_insert()
+        if dialect_insert is None:
+            # other backends: increment in place, insert the day when there is nothing to increment
+            for row in rows:
+                changed = db.session.execute(
+                    update(table)
+                    .where(table.teacher_id == teacher_id, table.class_name == row['class_name'], table.date == row['date'])
+                    .values(present=table.present + row['present'], total=table.total + row['total'])
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                if not changed:
+                    db.session.execute(insert(table).values(row))
+            return
+
+        stmt = dialect_insert(table).values(rows)
+        if hasattr(stmt, 'on_duplicate_key_update'):
+            stmt = stmt.on_duplicate_key_update(
+                present=table.present + stmt.inserted.present, total=table.total + stmt.inserted.total
+            )
+        else:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['teacher_id', 'class_name', 'date'],
+                set_={'present': table.present + stmt.excluded.present, 'total': table.total + stmt.excluded.total}
+            )
+        db.session.execute(stmt)
+
+    @staticmethod
+    def _refresh_students(student_ids, months, summaries, class_of):
+        by_student = defaultdict(list)
+        for (sid, _), row in months.items():
+            by_student[sid].append(row)
+
+        for sid in student_ids:
+            row = summaries[sid]
+            row.class_name = class_of.get(sid)
+            for key, value in AttendanceSummaryService._stats(by_student[sid]).items():
+                setattr(row, key, value)
+
+    @staticmethod
+    def _dialect_insert():
+        """The dialect's insert() with upsert support, or None."""
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        elif dialect in ('mysql', 'mariadb'):
+            from sqlalchemy.dialects.mysql import insert as dialect_insert
+        else:
+            return None
+        return dialect_insert
+
+    @staticmethod
+    def _insert_missing(model, keys, rows):
+        """Insert the rows whose unique keys do not exist yet; existing rows are left untouched."""
+        if not rows:
+            return
+        dialect_insert = AttendanceSummaryService._dialect_insert()
+        if dialect_insert is None:
+            present = set(db.session.execute(
+                select(*[getattr(model, k) for k in keys])
+                .where(model.teacher_id == rows[0]['teacher_id'], model.student_id.in_({r['student_id'] for r in rows}))
+            ).all())
+            missing = [r for r in rows if tuple(r[k] for k in keys) not in present]
+            if missing:
+                db.session.execute(insert(model), missing)
+            return
+
+        stmt = dialect_insert(model).values(rows)
+        if hasattr(stmt, 'on_duplicate_key_update'):
+            stmt = stmt.on_duplicate_key_update({keys[0]: getattr(model, keys[0])})  # no-op on conflict
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+        db.session.execute(stmt)
+
+    @staticmethod
+    def _stats(month_rows):
+        present = total = run = longest = 0
+        last = None
+        for m in sorted(month_rows, key=lambda r: r.month):
+            for day in range(31):
+                if not m.marked_bits >> day & 1:
+                    continue
+                total += 1
+                last = date(m.month.year, m.month.month, day + 1)
+                if m.present_bits >> day & 1:
+                    present += 1
+                    run += 1
+                    longest = max(longest, run)
+                else:
+                    run = 0
+        return {
+            "present": present,
+            "total": total,
+            "current_streak": run,
+            "longest_streak": longest,
+            "last_date": last,
+        }
@@ -0,0 +1,241 @@
+import base64
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy import Boolean, Integer, String, Text, and_, case, func, or_, select, text
+
+from models import db
+from utils.helpers import escape_like
+
+# columns whose values never leave the server (password hashes, reset tokens, ...)
+SECRET_MARKERS = ('password', 'passwd', 'secret', 'token', 'hash', 'otp')
+REDACTED = '••••••'
+
+
+class DatabaseBrowserService:
+    """
+    Read side of the admin database browser: one table, one page at a time.
+
+    Pages are plain Core selects over the requested columns (the primary
+    key is always included), filtered and sorted in SQL and paged with a
+    keyset cursor on (sort column, primary key), so deep pages cost the
+    same as the first. Long text is cut to TEXT_PREVIEW characters; the
+    full row comes from record(). Row counts are estimates unless an
+    exact count is asked for. Secret columns (SECRET_MARKERS) are always
+    redacted and cannot be searched, filtered or sorted on.
+    """
+
+    MAX_PAGE = 200
+    TEXT_PREVIEW = 200
+
+    @staticmethod
+    def describe(model):
+        table = model.__table__
+        return [{
+            "name": c.name,
+            "type": c.type.__class__.__name__,
+            "pk": c.primary_key,
+            "secret": DatabaseBrowserService.is_secret(c.name),
+        } for c in table.columns]
+
+    @staticmethod
+    def is_secret(name):
+        name = name.lower()
+        return any(marker in name for marker in SECRET_MARKERS)
+
+    @staticmethod
+    def page(model, after=None, limit=50, columns=None, search=None, filters=None,
+             sort=None, direction='asc'):
+        """
+        {"columns", "rows", "next"} for one page. after is the cursor from
+        the previous page's "next"; filters is {column: value} (equality).
+        """
+        table = model.__table__
+        pk = list(table.primary_key.columns)
+        limit = min(max(int(limit or 50), 1), DatabaseBrowserService.MAX_PAGE)
+        direction = 'desc' if direction == 'desc' else 'asc'
+
+        sort_col = table.columns.get(sort) if sort else None
+        if sort_col is not None and (sort_col.primary_key or DatabaseBrowserService.is_secret(sort_col.name)):
+            sort_col = None
+        selected = [
+            c for c in table.columns
+            if not columns or c.name in columns or c.primary_key or (sort_col is not None and c.name == sort_col.name)
+        ]
+
+        stmt = select(*selected).where(*DatabaseBrowserService._conditions(table, search, filters))
+
+        # ordering keys: [(expression, direction)]; NULLs of the sort column always last
+        keys = []
+        if sort_col is not None:
+            keys.append((case((sort_col.is_(None), 1), else_=0), 'asc'))
+            keys.append((sort_col, direction))
+        keys.extend((c, direction) for c in pk)
+
+        if after:
+            stmt = stmt.where(DatabaseBrowserService._after(keys, sort_col, after))
+        stmt = stmt.order_by(*[k.desc() if d == 'desc' else k.asc() for k, d in keys]).limit(limit + 1)
+
+        rows = db.session.execute(stmt).mappings().all()
+        more = len(rows) > limit
+        rows = rows[:limit]
+
+        next_cursor = None
+        if more:
+            last = rows[-1]
+            values = [last[c.name] for c in pk]
+            if sort_col is not None:
+                values = [last[sort_col.name]] + values
+            next_cursor = DatabaseBrowserService._encode(values)
+
+        return {
+            "columns": [c.name for c in selected],
+            "rows": [DatabaseBrowserService._row(r, preview=True) for r in rows],
+            "next": next_cursor,
+        }
+
+    @staticmethod
+    def record(model, pk_value):
+        """One full row by primary key (first pk column), or None."""
+        table = model.__table__
+        pk = list(table.primary_key.columns)[0]
+        row = db.session.execute(
+            select(table).where(pk == DatabaseBrowserService._coerce(pk, pk_value))
+        ).mappings().first()
+        return DatabaseBrowserService._row(row) if row else None
+
+    @staticmethod
+    def count(model, search=None, filters=None):
+        table = model.__table__
+        return db.session.execute(
+            select(func.count()).select_from(table)
+            .where(*DatabaseBrowserService._conditions(table, search, filters))
+        ).scalar() or 0
+
+    @staticmethod
+    def estimate(model):
+        """(row count, exact). Uses planner statistics or the primary key range instead of COUNT(*)."""
+        table = model.__table__
+        dialect = db.session.get_bind().dialect.name
+        try:
+            if dialect == 'postgresql':
+                n = db.session.execute(
+                    text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:t)"), {"t": table.name}
+                ).scalar()
+                if n is not None and n >= 0:
+                    return int(n), False
+            elif dialect in ('mysql', 'mariadb'):
+                n = db.session.execute(
+                    text("SELECT table_rows FROM information_schema.tables "
+                         "WHERE table_schema = DATABASE() AND table_name = :t"), {"t": table.name}
+                ).scalar()
+                if n is not None:
+                    return int(n), False
+        except Exception:
+            db.session.rollback()
+            current_app.logger.debug("No planner estimate for %s", table.name, exc_info=True)
+
+        pk = list(table.primary_key.columns)
+        if len(pk) == 1 and isinstance(pk[0].type, Integer):
+            low, high = db.session.execute(select(func.min(pk[0]), func.max(pk[0]))).one()
+            return (high - low + 1 if high is not None else 0), False
+        return DatabaseBrowserService.count(model), True
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _conditions(table, search, filters):
+        conditions = []
+        for name, value in (filters or {}).items():
+            column = table.columns.get(name)
+            if column is None or DatabaseBrowserService.is_secret(column.name):
+                continue
+            if value in ('', None, 'null'):
+                conditions.append(column.is_(None))
+            else:
+                conditions.append(column == DatabaseBrowserService._coerce(column, value))
+
+        if search:
+            like = f"%{escape_like(search.lower())}%"
+            text_columns = [
+                c for c in table.columns
+                if isinstance(c.type, (String, Text)) and not DatabaseBrowserService.is_secret(c.name)
+            ]
+            if text_columns:
+                conditions.append(or_(*[func.lower(c).like(like, escape='\\') for c in text_columns]))
+        return conditions
+
+    @staticmethod
+    def _after(keys, sort_col, cursor):
+        """Rows strictly after the cursor in (keys) order, as an OR of prefix-equal comparisons."""
+        values = DatabaseBrowserService._decode(cursor)
+        if sort_col is not None:
+            sort_value, rest = values[0], values[1:]
+            pairs = [(keys[0], 1 if sort_value is None else 0)]
+            if sort_value is not None:
+                pairs.append((keys[1], DatabaseBrowserService._coerce(sort_col, sort_value)))
+            # all NULL sort values are equal, so the column itself is skipped past them
+            pk_keys = keys[2:]
+        else:
+            rest, pairs, pk_keys = values, [], keys
+        pairs.extend(
+            (key, DatabaseBrowserService._coerce(key[0], value)) for key, value in zip(pk_keys, rest)
+        )
+
+        clauses = []
+        for i, ((expr, direction), value) in enumerate(pairs):
+            prefix = [e == v for (e, _), v in pairs[:i]]
+            clauses.append(and_(*prefix, expr < value if direction == 'desc' else expr > value))
+        return or_(*clauses)
+
+    @staticmethod
+    def _coerce(column, value):
+        if value is None:
+            return None
+        try:
+            python_type = column.type.python_type
+        except (AttributeError, NotImplementedError):
+            return value
+        if isinstance(value, python_type):
+            return value
+        if python_type is datetime:
+            return datetime.fromisoformat(value)
+        if python_type is date:
+            return date.fromisoformat(value)
+        if python_type is time:
+            return time.fromisoformat(value)
+        if python_type is bool or isinstance(column.type, Boolean):
+            return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+        return python_type(value)
+
+    @staticmethod
+    def _row(row, preview=False):
+        result = {}
+        for key, value in row.items():
+            if value is not None and DatabaseBrowserService.is_secret(key):
+                value = REDACTED
+            elif isinstance(value, (datetime, date, time)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = float(value)
+            elif isinstance(value, (bytes, bytearray, memoryview)):
+                value = f"<{len(value)} bytes>"
+            elif preview and isinstance(value, str) and len(value) > DatabaseBrowserService.TEXT_PREVIEW:
+                value = value[:DatabaseBrowserService.TEXT_PREVIEW] + '…'
+            result[key] = value
+        return result
+
+    @staticmethod
+    def _encode(values):
+        # Decimals as strings: a float cursor can skip or repeat rows on Numeric sort columns
+        raw = json.dumps([
+            str(v) if isinstance(v, Decimal) else DatabaseBrowserService._row({"v": v})["v"] for v in values
+        ])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def _decode(cursor):
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
@@ -0,0 +1,239 @@
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_mailman import EmailMessage, EmailMultiAlternatives
+from sqlalchemy import event, func, update
+
+from models import db, EmailOutbox
+from utils.extensions import mail, socketio
+
+
+class _PooledConnection:
+    """One SMTP connection reused across messages and batches, closed after idling."""
+
+    def __init__(self):
+        self.connection = None
+        self.last_used = 0.0
+
+    def get(self):
+        if self.connection is None:
+            self.connection = mail.get_connection(fail_silently=False)
+            self.connection.open()
+        self.last_used = time.monotonic()
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def close_if_idle(self, idle_seconds):
+        if self.connection is not None and time.monotonic() - self.last_used > idle_seconds:
+            self.close()
+
+
+class EmailOutboxService:
+    """
+    Durable outgoing mail. Requests only add an EmailOutbox row to their own
+    transaction (the caller commits, so a rolled back request sends nothing); a worker
+    (a background task in the web process, or outbox_worker.py) claims due
+    rows in batches and sends them over one reused SMTP connection, at no
+    more than EMAIL_RATE_PER_MINUTE. Failures are retried with exponential
+    backoff until EMAIL_MAX_ATTEMPTS; 5xx answers fail immediately.
+
+    Any SMTP server works for local runs and tests, e.g.
+    `python -m aiosmtpd -n -l localhost:8025` with MAIL_SERVER=localhost,
+    MAIL_PORT=8025 and MAIL_USE_TLS off.
+    """
+
+    _wake = threading.Event()
+    _worker = None
+    _guard = threading.Lock()
+    _next_slot = 0.0  # monotonic time the next message may go out
+
+    @staticmethod
+    def enqueue(to_email, subject, body, html=None, category=None):
+        """
+        Queue one message in the caller's transaction (flushed, not committed)
+        and wake the worker once that transaction commits. Returns the row.
+        """
+        row = EmailOutbox(
+            to_email=to_email, subject=subject, body=body, html=html,
+            category=category, status='pending', next_attempt_at=datetime.utcnow()
+        )
+        db.session.add(row)
+        db.session.flush()
+        event.listen(db.session(), 'after_commit', EmailOutboxService._wake_after_commit, once=True)
+        return row
+
+    @staticmethod
+    def wake():
+        """Start the in-process worker if enabled, and let it look for work now."""
+        if current_app.config.get('EMAIL_OUTBOX_WORKER', True):
+            EmailOutboxService.start_worker(current_app._get_current_object())
+        EmailOutboxService._wake.set()
+
+    @staticmethod
+    def start_worker(app):
+        with EmailOutboxService._guard:
+            if EmailOutboxService._worker is not None:
+                return False
+            EmailOutboxService._worker = socketio.start_background_task(EmailOutboxService.run_forever, app)
+        return True
+
+    @staticmethod
+    def run_forever(app, once=False):
+        """Worker loop: drain due messages, then sleep until woken or the poll interval passes."""
+        pool = _PooledConnection()
+        with app.app_context():
+            poll = app.config.get('EMAIL_OUTBOX_POLL', 15)
+            idle = app.config.get('EMAIL_CONNECTION_IDLE', 30)
+            batch = app.config.get('EMAIL_OUTBOX_BATCH', 50)
+            while True:
+                EmailOutboxService._wake.clear()
+                try:
+                    claimed = EmailOutboxService.process_batch(pool)
+                except Exception:
+                    app.logger.exception("Email outbox batch failed")
+                    db.session.rollback()
+                    pool.close()
+                    claimed = 0
+                finally:
+                    db.session.remove()
+
+                if claimed >= batch:
+                    continue  # more may be due
+                if once:
+                    break
+                pool.close_if_idle(idle)
+                EmailOutboxService._wake.wait(poll)
+        pool.close()
+
+    @staticmethod
+    def process_batch(pool=None):
+        """Claim and send one batch of due messages. Returns how many were claimed."""
+        own_pool = pool is None
+        pool = pool or _PooledConnection()
+        rows = EmailOutboxService._claim()
+        try:
+            for row in rows:
+                EmailOutboxService._throttle()
+                row.attempts += 1
+                try:
+                    pool.get().send_messages([EmailOutboxService._message(row)])
+                except smtplib.SMTPRecipientsRefused as e:
+                    EmailOutboxService._failed(row, e, permanent=True)
+                except smtplib.SMTPResponseException as e:
+                    if e.smtp_code in (421, 451):
+                        pool.close()
+                    EmailOutboxService._failed(row, e, permanent=500 <= e.smtp_code < 600)
+                except (smtplib.SMTPException, OSError) as e:
+                    pool.close()  # reconnect for the next message
+                    EmailOutboxService._failed(row, e)
+                else:
+                    row.status = 'sent'
+                    row.sent_at = datetime.utcnow()
+                    row.last_error = None
+                row.claim_token = None
+                db.session.commit()  # per message, so a crash never re-sends delivered mail
+        finally:
+            if own_pool:
+                pool.close()
+        return len(rows)
+
+    @staticmethod
+    def retry_failed(category=None):
+        """Put failed messages back in the queue. Returns the number requeued."""
+        stmt = update(EmailOutbox).where(EmailOutbox.status == 'failed')
+        if category:
+            stmt = stmt.where(EmailOutbox.category == category)
+        count = db.session.execute(
+            stmt.values(status='pending', attempts=0, next_attempt_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount or 0
+        db.session.commit()
+        if count:
+            EmailOutboxService.wake()
+        return count
+
+    @staticmethod
+    def stats():
+        return dict(db.session.query(EmailOutbox.status, func.count(EmailOutbox.id)).group_by(EmailOutbox.status).all())
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _wake_after_commit(session):
+        EmailOutboxService.wake()
+
+    @staticmethod
+    def _claim():
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        batch = current_app.config.get('EMAIL_OUTBOX_BATCH', 50)
+
+        # messages left 'sending' by a worker that died go back in the queue
+        db.session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.status == 'sending', EmailOutbox.claimed_at < now - timedelta(minutes=10))
+            .values(status='pending', claim_token=None)
+            .execution_options(synchronize_session=False)
+        )
+
+        due = [i for (i,) in (
+            db.session.query(EmailOutbox.id)
+            .filter(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now)
+            .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+            .limit(batch)
+            .all()
+        )]
+        if not due:
+            db.session.commit()
+            return []
+
+        # only rows still pending, so two workers never send the same message
+        db.session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(due), EmailOutbox.status == 'pending')
+            .values(status='sending', claim_token=token, claimed_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return EmailOutbox.query.filter_by(claim_token=token).order_by(EmailOutbox.id).all()
+
+    @staticmethod
+    def _throttle():
+        interval = 60.0 / max(current_app.config.get('EMAIL_RATE_PER_MINUTE', 60), 1)
+        now = time.monotonic()
+        wait = EmailOutboxService._next_slot - now
+        if wait > 0:
+            time.sleep(wait)
+        EmailOutboxService._next_slot = max(now, EmailOutboxService._next_slot) + interval
+
+    @staticmethod
+    def _failed(row, error, permanent=False):
+        row.last_error = str(error)[:1000]
+        max_attempts = current_app.config.get('EMAIL_MAX_ATTEMPTS', 6)
+        if permanent or row.attempts >= max_attempts:
+            row.status = 'failed'
+            current_app.logger.warning("Email %s to %s failed: %s", row.id, row.to_email, row.last_error)
+            return
+        base = current_app.config.get('EMAIL_RETRY_BASE_SECONDS', 60)
+        row.status = 'pending'
+        row.next_attempt_at = datetime.utcnow() + timedelta(seconds=min(base * 2 ** (row.attempts - 1), 6 * 3600))
+
+    @staticmethod
+    def _message(row):
+        sender = current_app.config.get('MAIL_DEFAULT_SENDER')
+        if row.html:
+            msg = EmailMultiAlternatives(subject=row.subject, body=row.body, from_email=sender, to=[row.to_email])
+            msg.attach_alternative(row.html, 'text/html')
+            return msg
+        return EmailMessage(subject=row.subject, body=row.body, from_email=sender, to=[row.to_email])
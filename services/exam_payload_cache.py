@@ -0,0 +1,91 @@
+from sqlalchemy.orm import joinedload
+
+from models import db, Exam, ExamQuestion, ExamSet, ExamSetQuestion, ExamPayloadVersion
+from services.versioned_payload_cache import DATETIME_FORMAT, VersionedPayloadCache
+
+
+class ExamPayloadCache(VersionedPayloadCache):
+    """
+    Prebuilt, versioned take-exam payloads (exam header + questions + options),
+    keyed (exam_id, version, set_id) and also kept as files on disk so a
+    restarted worker does not rebuild them. Call invalidate(exam_id) after any
+    change to an exam, its sets or questions.
+    """
+
+    VERSION_MODEL = ExamPayloadVersion
+    OWNER_COLUMN = 'exam_id'
+    STAMP_COLUMN = 'published_at'
+    FOLDER_CONFIG = 'EXAM_PAYLOAD_FOLDER'
+    FOLDER_DEFAULT = 'exam_payloads'
+
+    # ---------------- PUBLIC ---------------- #
+
+    @staticmethod
+    def get(exam_id, set_id=None):
+        version = ExamPayloadCache.current_version(exam_id)
+        return ExamPayloadCache._cached(
+            (exam_id, version, set_id), lambda: ExamPayloadCache._build(exam_id, set_id, version)
+        )
+
+    @staticmethod
+    def publish(exam):
+        """Bump the version and prebuild the payload of every set (and the full pool)."""
+        version = ExamPayloadCache.invalidate(exam.id)
+        set_ids = [sid for (sid,) in db.session.query(ExamSet.id).filter_by(exam_id=exam.id).all()]
+        for set_id in [None] + set_ids:
+            ExamPayloadCache.get(exam.id, set_id)
+        return version
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _build(exam_id, set_id, version):
+        exam = Exam.query.get(exam_id)
+        if exam is None:
+            return None
+
+        if set_id:
+            questions = (
+                db.session.query(ExamQuestion)
+                .join(ExamSetQuestion, ExamSetQuestion.question_id == ExamQuestion.id)
+                .filter(ExamSetQuestion.set_id == set_id)
+                .options(joinedload(ExamQuestion.options))
+                .order_by(ExamSetQuestion.order)
+                .all()
+            )
+        else:
+            # fallback: whole exam pool if no set assigned
+            questions = (
+                ExamQuestion.query
+                .filter_by(exam_id=exam.id)
+                .options(joinedload(ExamQuestion.options))
+                .order_by(ExamQuestion.id)
+                .all()
+            )
+
+        return {
+            "id": exam.id,
+            "title": exam.title,
+            "version": version,
+            "set_id": set_id,
+            "duration_minutes": exam.duration_minutes,
+            "start_datetime": exam.start_datetime.strftime(DATETIME_FORMAT),
+            "end_datetime": exam.end_datetime.strftime(DATETIME_FORMAT),
+            "questions": [
+                {
+                    "id": q.id,
+                    "question_text": q.question_text,
+                    "options": [{"id": opt.id, "text": opt.text} for opt in q.options]
+                }
+                for q in questions
+            ]
+        }
+
+    @classmethod
+    def _file_name(cls, key):
+        exam_id, version, set_id = key
+        return f"exam_{exam_id}_v{version}_{set_id or 'pool'}.json"
+
+    @classmethod
+    def _file_pattern(cls, exam_id):
+        return f"exam_{exam_id}_v*.json"
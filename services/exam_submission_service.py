@@ -0,0 +1,218 @@
+import threading
+from datetime import datetime
+from hashlib import sha256
+
+from flask import current_app
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from models import (
+    db, ExamAttempt, ExamOption, ExamQuestion, ExamSetQuestion,
+    ExamSubmission, ExamSubmissionClaim, AttemptStateAnswer
+)
+from services.attempt_state_service import AttemptStateService
+from services.exam_payload_cache import ExamPayloadCache
+from utils.extensions import socketio
+
+
+class ExamSubmissionService:
+    """
+    Exam submit pipeline: claim (exam, student) once, grade against the
+    attempt's set with a cached answer key, write everything in one commit.
+    With EXAM_ASYNC_GRADING enabled the score is filled in by a background
+    task so the submit request itself only does the inserts.
+    """
+
+    _answer_keys = {}  # (exam_id, version, set_id) -> {question_id: (correct_option_id, marks)}
+    _guard = threading.Lock()
+
+    @staticmethod
+    def submit(exam_id, student_id, form_answers, idempotency_key):
+        """
+        Returns (submission_id, created). created is False when this exam was
+        already submitted (by this request's key or an earlier one). The
+        client's idempotency_key is scoped to (exam, student) before it is
+        stored, so a key reused by another student cannot collide.
+        """
+        existing = ExamSubmissionService.existing_claim(exam_id, student_id)
+        if existing:
+            return existing.submission_id, False
+
+        attempt = (
+            ExamAttempt.query
+            .filter_by(exam_id=exam_id, student_id=student_id, submitted_at=None)
+            .order_by(ExamAttempt.id.desc())
+            .first()
+        )
+        set_id = attempt.set_id if attempt else None
+
+        state = AttemptStateService.get('exam', exam_id, student_id)
+        answers = AttemptStateService.answers_map(state)
+        if state is None or AttemptStateService.accepts_submission(state):
+            # past the deadline (plus grace) only answers autosaved in time count
+            answers.update({qid: val for qid, val in form_answers.items() if val})
+
+        async_grading = current_app.config.get('EXAM_ASYNC_GRADING', False)
+        score = None if async_grading else ExamSubmissionService.grade(exam_id, set_id, answers)
+        now = datetime.utcnow()
+
+        try:
+            claim = ExamSubmissionClaim(
+                exam_id=exam_id, student_id=student_id,
+                idempotency_key=ExamSubmissionService._claim_key(exam_id, student_id, idempotency_key)
+            )
+            db.session.add(claim)
+            db.session.flush()  # unique constraint fires here for duplicates
+
+            submission = ExamSubmission(
+                student_id=student_id,
+                exam_id=exam_id,
+                set_id=set_id,
+                score=score,
+                submitted_at=now
+            )
+            db.session.add(submission)
+
+            if attempt is None:
+                attempt = ExamAttempt(student_id=student_id, exam_id=exam_id)
+                db.session.add(attempt)
+            attempt.score = score
+            attempt.submitted = True
+            attempt.submitted_at = now
+
+            if state is not None:
+                ExamSubmissionService._persist_answers(state, answers)
+                AttemptStateService.finish(state)
+            # with no attempt state the form answers exist only here; they go to the grading task as-is
+
+            db.session.flush()
+            claim.submission_id = submission.id
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            existing = ExamSubmissionService.existing_claim(exam_id, student_id)
+            return (existing.submission_id if existing else None), False
+
+        if async_grading:
+            app = current_app._get_current_object()
+            socketio.start_background_task(ExamSubmissionService._grade_later, app, submission.id, set_id, dict(answers))
+
+        return submission.id, True
+
+    @staticmethod
+    def existing_claim(exam_id, student_id):
+        return ExamSubmissionClaim.query.filter_by(exam_id=exam_id, student_id=student_id).first()
+
+    @staticmethod
+    def backfill_claims():
+        """
+        Claim rows for submissions made before claims existed, so submit()
+        only has to look at claims. Returns how many were added.
+        """
+        claimed = (
+            select(ExamSubmissionClaim.id)
+            .where(
+                ExamSubmissionClaim.exam_id == ExamSubmission.exam_id,
+                ExamSubmissionClaim.student_id == ExamSubmission.student_id,
+            )
+            .exists()
+        )
+        rows = db.session.execute(
+            select(ExamSubmission.exam_id, ExamSubmission.student_id, func.min(ExamSubmission.id))
+            .where(~claimed)
+            .group_by(ExamSubmission.exam_id, ExamSubmission.student_id)
+        ).all()
+        values = [{
+            "exam_id": exam_id,
+            "student_id": student_id,
+            "idempotency_key": f"legacy-{submission_id}",
+            "submission_id": submission_id,
+        } for exam_id, student_id, submission_id in rows]
+        for i in range(0, len(values), 500):
+            db.session.execute(insert(ExamSubmissionClaim), values[i:i + 500])
+        db.session.commit()
+        return len(values)
+
+    @staticmethod
+    def grade(exam_id, set_id, answers):
+        key = ExamSubmissionService.answer_key(exam_id, set_id)
+        score = 0
+        for qid, (correct_option_id, marks) in key.items():
+            submitted = answers.get(str(qid))
+            if not submitted or correct_option_id is None:
+                continue
+            try:
+                if int(submitted) == correct_option_id:
+                    score += marks
+            except (ValueError, TypeError):
+                continue
+        return score
+
+    @staticmethod
+    def answer_key(exam_id, set_id=None):
+        version = ExamPayloadCache.current_version(exam_id)
+        cache_key = (exam_id, version, set_id)
+        key = ExamSubmissionService._answer_keys.get(cache_key)
+        if key is not None:
+            return key
+
+        questions = db.session.query(ExamQuestion.id, ExamQuestion.marks)
+        if set_id:
+            questions = questions.join(ExamSetQuestion, ExamSetQuestion.question_id == ExamQuestion.id) \
+                                 .filter(ExamSetQuestion.set_id == set_id)
+        else:
+            questions = questions.filter(ExamQuestion.exam_id == exam_id)
+        key = {qid: (None, marks or 0) for qid, marks in questions.all()}
+
+        if key:
+            correct = (
+                db.session.query(ExamOption.question_id, ExamOption.id)
+                .filter(ExamOption.question_id.in_(list(key.keys())), ExamOption.is_correct.is_(True))
+                .order_by(ExamOption.id)
+                .all()
+            )
+            for qid, option_id in correct:
+                if key[qid][0] is None:  # first correct option wins, as before
+                    key[qid] = (option_id, key[qid][1])
+
+        with ExamSubmissionService._guard:
+            ExamSubmissionService._answer_keys[cache_key] = key
+        return key
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _claim_key(exam_id, student_id, client_key):
+        # hashed so any client key fits the 64-char column
+        return f"{exam_id}:{student_id}:{sha256((client_key or '').encode()).hexdigest()[:32]}"
+
+    @staticmethod
+    def _persist_answers(state, answers):
+        """Store the final answer sheet next to the autosaves (needed for queued grading)."""
+        existing = {a.question_id: a for a in AttemptStateAnswer.query.filter_by(state_id=state.id).all()}
+        for qid, value in answers.items():
+            try:
+                qid = int(qid)
+            except (TypeError, ValueError):
+                continue
+            row = existing.get(qid)
+            if row is None:
+                db.session.add(AttemptStateAnswer(state_id=state.id, question_id=qid, value=str(value)))
+            elif row.value != str(value):
+                row.value = str(value)
+
+    @staticmethod
+    def _grade_later(app, submission_id, set_id, answers):
+        with app.app_context():
+            submission = ExamSubmission.query.get(submission_id)
+            if submission is None:
+                return
+            score = ExamSubmissionService.grade(submission.exam_id, set_id, answers)
+
+            submission.score = score
+            ExamAttempt.query.filter_by(
+                exam_id=submission.exam_id,
+                student_id=submission.student_id,
+                submitted_at=submission.submitted_at
+            ).update({'score': score}, synchronize_session=False)
+            db.session.commit()
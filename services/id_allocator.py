@@ -0,0 +1,122 @@
+from datetime import datetime
+
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, User, IdCounter
+from utils.helpers import escape_like
+from utils.schema import ensure_indexes
+
+PREFIXES = {'student': 'STD', 'teacher': 'TCH', 'parent': 'PAR'}
+DOMAINS = {'student': 'st.knust.edu.gh', 'teacher': 'tch.knust.edu.gh', 'parent': 'par.knust.edu.gh'}
+
+# prefix LIKE lookups on usernames (PostgreSQL only uses a btree for LIKE 'abc%' with pattern ops)
+USERNAME_PREFIX_INDEX = db.Index(
+    'ix_user_username_prefix', User.username, postgresql_ops={'username': 'varchar_pattern_ops'}
+)
+
+
+class IdAllocator:
+    """
+    User IDs and usernames without probing.
+
+    IDs come from the id_counter table: one atomic UPDATE ... value = value
+    + n per allocation, in its own short transaction (like a database
+    sequence, numbers are never reused and a rolled-back registration
+    leaves a gap). Bulk imports reserve a whole block in one go. A prefix's
+    counter is seeded from the highest existing user ID the first time it
+    is used.
+
+    Usernames follow the first-initial/middle-initial/surname@domain scheme
+    with a numeric suffix; all names sharing the base are fetched with one
+    prefix LIKE query instead of one query per candidate.
+    """
+
+    @staticmethod
+    def user_ids(role, count=1):
+        """count fresh user IDs for role, e.g. ['STD0412', ...]."""
+        prefix = PREFIXES.get((role or '').lower(), 'GEN')
+        first = IdAllocator.reserve(prefix, count)
+        return [f"{prefix}{n:03d}" for n in range(first, first + count)]
+
+    @staticmethod
+    def user_id(role):
+        return IdAllocator.user_ids(role, 1)[0]
+
+    @staticmethod
+    def reserve(prefix, count=1):
+        """Atomically take count numbers for prefix. Returns the first of the block."""
+        for _ in range(3):
+            with db.engine.begin() as conn:
+                updated = conn.execute(
+                    update(IdCounter)
+                    .where(IdCounter.prefix == prefix)
+                    .values(value=IdCounter.value + count, updated_at=datetime.utcnow())
+                ).rowcount
+                if updated:
+                    # the row stays locked until this transaction commits, so this is our value
+                    last = conn.execute(select(IdCounter.value).where(IdCounter.prefix == prefix)).scalar()
+                    return last - count + 1
+
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(insert(IdCounter).values(
+                        prefix=prefix, value=IdAllocator._highest(conn, prefix), updated_at=datetime.utcnow()
+                    ))
+            except IntegrityError:
+                pass  # seeded concurrently; take the UPDATE path
+        raise RuntimeError(f"Could not allocate an ID for prefix {prefix}")
+
+    @staticmethod
+    def username_base(first_name, middle_name, last_name, role):
+        """(base, domain) for a person, e.g. ('jkmensah', 'st.knust.edu.gh')."""
+        first_initial = first_name[0].lower() if first_name else ''
+        middle_initial = middle_name[0].lower() if middle_name else ''
+        return f"{first_initial}{middle_initial}{(last_name or '').lower()}", DOMAINS.get(role, 'knust.edu.gh')
+
+    @staticmethod
+    def username(first_name, middle_name, last_name, role, reserved=()):
+        """The first free username for a person (one query)."""
+        base, domain = IdAllocator.username_base(first_name, middle_name, last_name, role)
+        taken = IdAllocator.taken_usernames([(base, domain)]) | set(reserved)
+        return IdAllocator.next_free(base, domain, taken)
+
+    @staticmethod
+    def taken_usernames(pairs, chunk=100):
+        """Existing usernames that could collide with any (base, domain) pair."""
+        pairs = list(dict.fromkeys(pairs))
+        taken = set()
+        for start in range(0, len(pairs), chunk):
+            patterns = [
+                User.username.like(f"{escape_like(base)}%@{escape_like(domain)}", escape='\\')
+                for base, domain in pairs[start:start + chunk]
+            ]
+            taken.update(name for (name,) in db.session.execute(select(User.username).where(or_(*patterns))))
+        return taken
+
+    @staticmethod
+    def next_free(base, domain, taken):
+        """base@domain, else base1@domain, base2@domain... Adds the result to taken."""
+        candidate, counter = f"{base}@{domain}", 1
+        while candidate in taken:
+            candidate = f"{base}{counter}@{domain}"
+            counter += 1
+        taken.add(candidate)
+        return candidate
+
+    @staticmethod
+    def ensure_indexes():
+        """Create the username prefix index (PostgreSQL; other databases use the unique index)."""
+        return ensure_indexes((USERNAME_PREFIX_INDEX,), dialects=('postgresql',))
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _highest(conn, prefix):
+        highest = 0
+        rows = conn.execute(select(User.user_id).where(User.user_id.like(f"{escape_like(prefix)}%", escape='\\')))
+        for (user_id,) in rows:
+            suffix = user_id[len(prefix):]
+            if suffix.isdigit():
+                highest = max(highest, int(suffix))
+        return highest
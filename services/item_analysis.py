@@ -0,0 +1,235 @@
+import json
+from datetime import datetime
+
+import numpy as np
+
+from models import (
+    db, Question, Option, QuizAttempt, StudentAnswer, StudentQuizSubmission,
+    ExamQuestion, ExamOption, ExamSetQuestion, ExamSubmission,
+    AttemptState, AttemptStateAnswer, AssessmentStatistics
+)
+
+NOT_PRESENTED = -1   # question was not in the student's exam set
+BLANK = 0            # presented but not answered
+
+OBJECTIVE_TYPES = ("mcq", "multiple_choice", "true_false")
+
+
+class ItemAnalysisService:
+    """
+    Item analysis for quizzes and exams: difficulty, upper/lower 27%
+    discrimination, distractor counts, score histogram, KR-20 and
+    Cronbach's alpha. Only objective (option based) questions are analysed.
+
+    Responses are held as a students x items matrix of option ids and all
+    statistics are computed column-wise with NumPy. Reads fold in only the
+    submissions newer than the stored watermark. A quiz retaken several
+    times contributes only its latest submitted attempt with answers.
+
+    get() only reads what was last computed; refresh() writes.
+    """
+
+    @staticmethod
+    def get(kind, assessment_id):
+        """The stored AssessmentStatistics (None if never computed). No writes."""
+        return AssessmentStatistics.query.filter_by(kind=kind, assessment_id=assessment_id).first()
+
+    @staticmethod
+    def refresh(kind, assessment_id, full=False):
+        stats = AssessmentStatistics.query.filter_by(kind=kind, assessment_id=assessment_id).first()
+        item_ids, key = ItemAnalysisService._items(kind, assessment_id)
+
+        if stats is None:
+            stats = AssessmentStatistics(kind=kind, assessment_id=assessment_id)
+            db.session.add(stats)
+            full = True
+        elif json.loads(stats.item_ids or '[]') != item_ids or json.loads(stats.answer_key or '[]') != key:
+            # questions or answer key changed since the last run
+            full = True
+
+        if full:
+            student_ids, matrix, watermark = [], np.empty((0, len(item_ids)), dtype=np.int32), 0
+        else:
+            student_ids = json.loads(stats.student_ids or '[]')
+            matrix = np.frombuffer(stats.responses or b'', dtype=np.int32).reshape(len(student_ids), len(item_ids)).copy()
+            watermark = stats.watermark or 0
+
+        new_ids, new_rows, new_watermark = ItemAnalysisService._responses(kind, assessment_id, item_ids, watermark)
+        if not full and new_watermark == watermark:
+            return stats  # nothing new since the last run
+
+        # a resubmitting student replaces their previous row
+        row_of = {sid: i for i, sid in enumerate(student_ids)}
+        appended = []
+        for sid, row in zip(new_ids, new_rows):
+            if sid in row_of:
+                matrix[row_of[sid]] = row
+            else:
+                row_of[sid] = len(student_ids)
+                student_ids.append(sid)
+                appended.append(row)
+        if appended:
+            matrix = np.vstack([matrix, np.asarray(appended, dtype=np.int32)])
+
+        stats.item_ids = json.dumps(item_ids)
+        stats.answer_key = json.dumps(key)
+        stats.student_ids = json.dumps(student_ids)
+        stats.responses = matrix.astype(np.int32).tobytes()
+        stats.watermark = new_watermark
+        stats.results = json.dumps(ItemAnalysisService.compute(matrix, np.asarray(key, dtype=np.int32), item_ids))
+        stats.computed_at = datetime.utcnow()
+        db.session.commit()
+        return stats
+
+    @staticmethod
+    def compute(responses, key, item_ids):
+        """Pure NumPy step over a students x items matrix of option ids."""
+        n, k = responses.shape
+        result = {
+            "respondents": int(n),
+            "items": [],
+            "histogram": {"edges": list(range(0, 101, 10)), "counts": [0] * 10},
+            "mean_percent": None,
+            "kr20": None,
+            "alpha": None,
+        }
+        if n == 0 or k == 0:
+            return result
+
+        presented = responses != NOT_PRESENTED
+        correct = presented & (responses == key[None, :]) & (key[None, :] > 0)
+        X = np.where(presented, correct.astype(float), np.nan)
+
+        n_presented = presented.sum(axis=1)
+        percent = np.divide(correct.sum(axis=1) * 100.0, n_presented,
+                            out=np.zeros(n, dtype=float), where=n_presented > 0)
+
+        counts, _ = np.histogram(percent, bins=10, range=(0, 100))
+        result["histogram"]["counts"] = counts.tolist()
+        result["mean_percent"] = round(float(percent.mean()), 2)
+
+        # upper / lower 27% by percent score
+        order = np.argsort(percent, kind="stable")
+        g = max(1, int(round(n * 0.27)))
+        lower, upper = order[:g], order[-g:]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            item_n = presented.sum(axis=0)
+            difficulty = np.nanmean(X, axis=0)
+            discrimination = np.nanmean(X[upper], axis=0) - np.nanmean(X[lower], axis=0)
+
+        for j, qid in enumerate(item_ids):
+            column = responses[presented[:, j], j]
+            options, option_counts = np.unique(column, return_counts=True)
+            distractors = {str(int(o)): int(c) for o, c in zip(options, option_counts) if o != BLANK}
+            result["items"].append({
+                "question_id": qid,
+                "n": int(item_n[j]),
+                "correct_option_id": int(key[j]) or None,
+                "difficulty": None if np.isnan(difficulty[j]) else round(float(difficulty[j]), 3),
+                "discrimination": None if np.isnan(discrimination[j]) else round(float(discrimination[j]), 3),
+                "distractors": distractors,
+                "blank": int((column == BLANK).sum()),
+            })
+
+        # reliability over the items every respondent saw
+        common = presented.all(axis=0)
+        kc = int(common.sum())
+        if kc >= 2 and n >= 2:
+            Xc = correct[:, common].astype(float)
+            totals = Xc.sum(axis=1)
+            p = Xc.mean(axis=0)
+            var_pop, var_sample = totals.var(), totals.var(ddof=1)
+            if var_pop > 0:
+                result["kr20"] = round(float(kc / (kc - 1) * (1 - (p * (1 - p)).sum() / var_pop)), 3)
+            if var_sample > 0:
+                result["alpha"] = round(float(kc / (kc - 1) * (1 - Xc.var(axis=0, ddof=1).sum() / var_sample)), 3)
+
+        return result
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _items(kind, assessment_id):
+        """Objective question ids and their first correct option id (0 if none)."""
+        if kind == 'quiz':
+            item_ids = [qid for (qid,) in db.session.query(Question.id)
+                        .filter(Question.quiz_id == assessment_id, Question.question_type.in_(OBJECTIVE_TYPES))
+                        .order_by(Question.id).all()]
+            correct = db.session.query(Option.question_id, Option.id) \
+                .filter(Option.question_id.in_(item_ids), Option.is_correct.is_(True)).order_by(Option.id).all() if item_ids else []
+        else:
+            item_ids = [qid for (qid,) in db.session.query(ExamQuestion.id)
+                        .filter(ExamQuestion.exam_id == assessment_id, ExamQuestion.question_type.in_(OBJECTIVE_TYPES))
+                        .order_by(ExamQuestion.id).all()]
+            correct = db.session.query(ExamOption.question_id, ExamOption.id) \
+                .filter(ExamOption.question_id.in_(item_ids), ExamOption.is_correct.is_(True)).order_by(ExamOption.id).all() if item_ids else []
+
+        first_correct = {}
+        for qid, oid in correct:
+            first_correct.setdefault(qid, oid)
+        return item_ids, [first_correct.get(qid, 0) for qid in item_ids]
+
+    @staticmethod
+    def _responses(kind, assessment_id, item_ids, watermark):
+        """(student_ids, rows, new_watermark) for submissions after the watermark."""
+        col = {qid: j for j, qid in enumerate(item_ids)}
+
+        if kind == 'quiz':
+            subs = db.session.query(StudentQuizSubmission.id, StudentQuizSubmission.student_id, db.literal(None)) \
+                .filter(StudentQuizSubmission.quiz_id == assessment_id, StudentQuizSubmission.id > watermark).all()
+        else:
+            subs = db.session.query(ExamSubmission.id, ExamSubmission.student_id, ExamSubmission.set_id) \
+                .filter(ExamSubmission.exam_id == assessment_id, ExamSubmission.id > watermark).all()
+        if not subs:
+            return [], [], watermark
+
+        new_watermark = max(s[0] for s in subs)
+        set_of = {sid: set_id for _, sid, set_id in subs}
+        student_ids = list(set_of)
+        row = {sid: i for i, sid in enumerate(student_ids)}
+        rows = np.full((len(student_ids), len(item_ids)), BLANK, dtype=np.int32)
+
+        if kind == 'quiz':
+            # one attempt per student (the latest submitted one with answers), so retakes
+            # cannot mix and a retake in progress does not count
+            latest = db.session.query(QuizAttempt.student_id, db.func.max(QuizAttempt.id).label('attempt_id')) \
+                .join(StudentAnswer, StudentAnswer.attempt_id == QuizAttempt.id) \
+                .filter(QuizAttempt.quiz_id == assessment_id, QuizAttempt.student_id.in_(student_ids),
+                        QuizAttempt.submitted_at.isnot(None)) \
+                .group_by(QuizAttempt.student_id).subquery()
+            answers = db.session.query(latest.c.student_id, StudentAnswer.question_id, StudentAnswer.selected_option_id) \
+                .join(latest, StudentAnswer.attempt_id == latest.c.attempt_id).all()
+        else:
+            set_ids = {s for s in set_of.values() if s}
+            if set_ids:
+                members = db.session.query(ExamSetQuestion.set_id, ExamSetQuestion.question_id) \
+                    .filter(ExamSetQuestion.set_id.in_(set_ids)).all()
+                in_set = {}
+                for set_id, qid in members:
+                    in_set.setdefault(set_id, set()).add(qid)
+                for sid, set_id in set_of.items():
+                    if set_id:
+                        mask = np.array([qid not in in_set.get(set_id, ()) for qid in item_ids], dtype=bool)
+                        rows[row[sid], mask] = NOT_PRESENTED
+
+            answers = db.session.query(AttemptState.student_id, AttemptStateAnswer.question_id, AttemptStateAnswer.value) \
+                .join(AttemptState, AttemptStateAnswer.state_id == AttemptState.id) \
+                .filter(AttemptState.kind == 'exam', AttemptState.assessment_id == assessment_id,
+                        AttemptState.student_id.in_(student_ids)).all()
+
+        r_idx, c_idx, vals = [], [], []
+        for sid, qid, value in answers:
+            if qid not in col or value in (None, ''):
+                continue
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                continue
+            r_idx.append(row[sid])
+            c_idx.append(col[qid])
+            vals.append(value)
+        if vals:
+            rows[np.asarray(r_idx), np.asarray(c_idx)] = np.asarray(vals, dtype=np.int32)
+
+        return student_ids, rows, new_watermark
@@ -0,0 +1,239 @@
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import exists, func, insert, literal, select, update
+
+from models import db, User, NotificationRecipient, NotificationUnreadCounter
+from utils.extensions import socketio
+
+
+class NotificationCounterService:
+    """
+    Per-user unread counters with a short in-process cache in front, so
+    rendering a page never runs a COUNT over NotificationRecipient.
+
+    Fan-out upserts the audience's counter rows (ON CONFLICT / ON DUPLICATE
+    KEY), so every user with recipients has a counter once backfill() has
+    run for older data; a missing row only ever means zero unread.
+    increment/adjust run inside the caller's transaction; publish is called
+    after commit and pushes the new counts to the users' Socket.IO rooms
+    (user_<public_id>) as 'notification_count' events.
+    """
+
+    CHUNK = 1000
+
+    _cache = {}          # user_id -> (expires_at, unread)
+    _global = None       # (expires_at, unread) for the admin badge
+    _guard = threading.Lock()
+
+    @staticmethod
+    def get(user_id):
+        cached = NotificationCounterService._cache.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        unread = db.session.query(NotificationUnreadCounter.unread).filter_by(user_id=user_id).scalar()
+        if unread is None or unread < 0:
+            unread = NotificationCounterService.recount(user_id)
+
+        with NotificationCounterService._guard:
+            NotificationCounterService._cache[user_id] = (time.monotonic() + NotificationCounterService._ttl(), unread)
+        return unread
+
+    @staticmethod
+    def global_unread():
+        """All unread recipients (admin badge), recounted at most once a minute."""
+        cached = NotificationCounterService._global
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        unread = NotificationRecipient.query.filter_by(is_read=False).count()
+        NotificationCounterService._global = (
+            time.monotonic() + current_app.config.get('NOTIFICATION_GLOBAL_COUNT_TTL', 60), unread
+        )
+        return unread
+
+    @staticmethod
+    def recount(user_id):
+        """
+        Rebuild one counter from NotificationRecipient, in its own transaction.
+        The COUNT is a subquery of the write itself, so there is no window
+        for a fan-out to slip between reading and writing.
+        """
+        unread = (
+            select(func.count(NotificationRecipient.id))
+            .where(NotificationRecipient.user_id == user_id, NotificationRecipient.is_read.is_(False))
+            .scalar_subquery()
+        )
+        with db.engine.begin() as conn:
+            changed = conn.execute(
+                update(NotificationUnreadCounter)
+                .where(NotificationUnreadCounter.user_id == user_id)
+                .values(unread=unread)
+            ).rowcount
+            if not changed:
+                NotificationCounterService._upsert(
+                    conn, select(literal(user_id).label('user_id'), unread.label('unread')), add=False
+                )
+            return conn.execute(
+                select(NotificationUnreadCounter.unread).where(NotificationUnreadCounter.user_id == user_id)
+            ).scalar() or 0
+
+    @staticmethod
+    def backfill():
+        """
+        Counter rows for users who have unread recipients but no counter
+        (data from before counters existed). Returns how many were created.
+        """
+        has_counter = exists().where(NotificationUnreadCounter.user_id == NotificationRecipient.user_id)
+        missing = (
+            select(NotificationRecipient.user_id.label('user_id'), func.count(NotificationRecipient.id).label('unread'))
+            .where(NotificationRecipient.is_read.is_(False), ~has_counter)
+            .group_by(NotificationRecipient.user_id)
+        )
+        created = NotificationCounterService._upsert(db.session, missing, add=False) or 0
+        db.session.commit()
+        return max(created, 0)
+
+    @staticmethod
+    def increment(audience, delta=1):
+        """
+        Add delta to the counters of an audience (a SELECT of user_id or a
+        list of user_id strings), creating the rows that do not exist yet.
+        """
+        if isinstance(audience, (list, tuple, set)):
+            user_ids = list(dict.fromkeys(uid for uid in audience if uid))
+            for i in range(0, len(user_ids), NotificationCounterService.CHUNK):
+                NotificationCounterService._upsert(db.session, [
+                    {"user_id": uid, "unread": delta}
+                    for uid in user_ids[i:i + NotificationCounterService.CHUNK]
+                ])
+        else:
+            audience = audience.subquery('audience')
+            NotificationCounterService._upsert(
+                db.session,
+                select(audience.c.user_id.label('user_id'), literal(delta).label('unread'))
+                .where(audience.c.user_id.isnot(None))  # SQLite needs a WHERE before ON CONFLICT
+                .distinct()
+            )
+
+    @staticmethod
+    def adjust(user_id, delta):
+        """Change one user's counter (mark read: -1, delete unread: -n)."""
+        if delta:
+            NotificationCounterService._add(NotificationUnreadCounter.user_id == user_id, delta)
+
+    @staticmethod
+    def refresh(audience):
+        """
+        After commit: reload the audience's counters into the cache.
+        Returns [(user_id, public_id, unread)], unread None when the user
+        has no counter row yet.
+        """
+        if isinstance(audience, (list, tuple, set)):
+            user_filter = User.user_id.in_([uid for uid in audience if uid])
+        else:
+            user_filter = User.user_id.in_(select(audience.subquery().c.user_id))
+
+        rows = (
+            db.session.query(User.user_id, User.public_id, NotificationUnreadCounter.unread)
+            .outerjoin(NotificationUnreadCounter, NotificationUnreadCounter.user_id == User.user_id)
+            .filter(user_filter)
+            .all()
+        )
+
+        expires = time.monotonic() + NotificationCounterService._ttl()
+        with NotificationCounterService._guard:
+            for user_id, _, unread in rows:
+                if unread is None:
+                    NotificationCounterService._cache.pop(user_id, None)
+                else:
+                    NotificationCounterService._cache[user_id] = (expires, unread)
+            NotificationCounterService._global = None
+        return rows
+
+    @staticmethod
+    def publish(audience):
+        """After commit: refresh the cache and push the counts to connected clients."""
+        rows = NotificationCounterService.refresh(audience)
+        for _, public_id, unread in rows:
+            if public_id and unread is not None:
+                socketio.emit('notification_count', {'unread': max(unread, 0)}, room=f"user_{public_id}")
+        return len(rows)
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _ttl():
+        return current_app.config.get('NOTIFICATION_COUNT_TTL', 10)
+
+    @staticmethod
+    def _upsert(conn, source, add=True):
+        """
+        INSERT counters from a list of {user_id, unread} dicts or a SELECT of
+        (user_id, unread) labelled columns. Existing rows get unread added
+        (add=True) or are left as they are. Returns the INSERT's rowcount.
+        """
+        table = NotificationUnreadCounter
+        dialect = db.engine.dialect.name
+
+        if dialect in ('postgresql', 'sqlite', 'mysql', 'mariadb'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            elif dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.mysql import insert as dialect_insert
+            stmt = dialect_insert(table)
+            stmt = stmt.values(source) if isinstance(source, list) else stmt.from_select(['user_id', 'unread'], source)
+
+            if dialect in ('mysql', 'mariadb'):
+                if add:
+                    stmt = stmt.on_duplicate_key_update(unread=table.unread + stmt.inserted.unread, updated_at=datetime.utcnow())
+                else:
+                    stmt = stmt.on_duplicate_key_update(unread=table.unread)  # keep the existing value
+            elif add:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['user_id'],
+                    set_={'unread': table.unread + stmt.excluded.unread, 'updated_at': datetime.utcnow()}
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=['user_id'])
+            return conn.execute(stmt).rowcount
+
+        # other backends: bump the rows that exist, then insert the missing ones
+        if isinstance(source, list):
+            rows = {r['user_id']: r['unread'] for r in source}
+            present = {uid for (uid,) in conn.execute(select(table.user_id).where(table.user_id.in_(list(rows))))}
+            if add:
+                for uid in present:
+                    conn.execute(
+                        update(table).where(table.user_id == uid).values(unread=table.unread + rows[uid])
+                        .execution_options(synchronize_session=False)
+                    )
+            missing = [{"user_id": uid, "unread": n} for uid, n in rows.items() if uid not in present]
+            return conn.execute(insert(table), missing).rowcount if missing else 0
+
+        source = source.subquery('source')
+        if add:
+            conn.execute(
+                update(table)
+                .where(table.user_id.in_(select(source.c.user_id)))
+                .values(unread=table.unread + select(source.c.unread).where(source.c.user_id == table.user_id).scalar_subquery())
+                .execution_options(synchronize_session=False)
+            )
+        return conn.execute(insert(table).from_select(
+            ['user_id', 'unread'],
+            select(source.c.user_id, source.c.unread).where(~exists().where(table.user_id == source.c.user_id))
+        )).rowcount
+
+    @staticmethod
+    def _add(condition, delta):
+        db.session.execute(
+            update(NotificationUnreadCounter)
+            .where(condition)
+            .values(unread=NotificationUnreadCounter.unread + delta)
+            .execution_options(synchronize_session=False)
+        )
@@ -0,0 +1,98 @@
+import time
+
+from flask import current_app
+from sqlalchemy import false, insert, literal, select, union
+
+from models import db, NotificationRecipient, User, StudentProfile, ParentProfile, ParentChildLink
+from services.notification_counter_service import NotificationCounterService
+
+
+class NotificationFanout:
+    """
+    Attaches one Notification to its whole audience without loading users.
+
+    An audience is either a SELECT of User.user_id values, inserted with a
+    single INSERT ... SELECT, or a plain list of user_id strings, inserted
+    with chunked executemany. Parents reached through several children are
+    only notified once. Unread counters are bumped in the same transaction;
+    callers commit and then call NotificationCounterService.publish.
+    """
+
+    CHUNK = 1000
+
+    @staticmethod
+    def send(notification, audience):
+        """Flush the notification and create its recipients. Returns the recipient count."""
+        started = time.perf_counter()
+        if notification.id is None:
+            db.session.add(notification)
+            db.session.flush()  # get notification.id
+
+        if isinstance(audience, (list, tuple, set)):
+            count = NotificationFanout._insert_many(notification.id, audience)
+        else:
+            count = NotificationFanout._insert_select(notification.id, audience)
+        NotificationCounterService.increment(audience)
+
+        current_app.logger.info(
+            "Notification %s (%s) fanned out to %s recipient(s) in %.1f ms",
+            notification.id, notification.type, count, (time.perf_counter() - started) * 1000
+        )
+        return count
+
+    # ---------------- AUDIENCES ---------------- #
+
+    @staticmethod
+    def students_in_class(class_name):
+        """Students whose profile puts them in class_name."""
+        return (
+            select(User.user_id.label('user_id'))
+            .join(StudentProfile, StudentProfile.user_id == User.user_id)
+            .where(StudentProfile.current_class == class_name)
+        )
+
+    @staticmethod
+    def students_with_class_id(class_id):
+        """Student users linked to a SchoolClass row."""
+        return select(User.user_id.label('user_id')).where(User.class_id == class_id, User.role == 'student')
+
+    @staticmethod
+    def parents_of(students):
+        """Parents linked to any student user_id in the given audience."""
+        student_ids = select(students.subquery().c.user_id)
+        return (
+            select(ParentProfile.user_id.label('user_id'))
+            .join(ParentChildLink, ParentChildLink.parent_id == ParentProfile.id)
+            .join(StudentProfile, StudentProfile.id == ParentChildLink.student_id)
+            .where(StudentProfile.user_id.in_(student_ids))
+        )
+
+    @staticmethod
+    def with_parents(students):
+        """Students plus their parents; UNION drops parents shared by siblings."""
+        return union(students, NotificationFanout.parents_of(students))
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _insert_select(notification_id, audience):
+        audience = audience.subquery('audience')
+        rows = (
+            select(literal(notification_id), audience.c.user_id, false())
+            .where(audience.c.user_id.isnot(None))
+            .distinct()
+        )
+        result = db.session.execute(
+            insert(NotificationRecipient).from_select(['notification_id', 'user_id', 'is_read'], rows)
+        )
+        return result.rowcount if result.rowcount is not None and result.rowcount >= 0 else 0
+
+    @staticmethod
+    def _insert_many(notification_id, user_ids):
+        unique_ids = list(dict.fromkeys(uid for uid in user_ids if uid))
+        for i in range(0, len(unique_ids), NotificationFanout.CHUNK):
+            db.session.execute(insert(NotificationRecipient), [
+                {"notification_id": notification_id, "user_id": uid, "is_read": False}
+                for uid in unique_ids[i:i + NotificationFanout.CHUNK]
+            ])
+        return len(unique_ids)
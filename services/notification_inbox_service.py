@@ -0,0 +1,157 @@
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import and_, case, delete, func, select, update
+from sqlalchemy.orm import joinedload
+
+from models import db, Notification, NotificationRecipient
+from services.notification_counter_service import NotificationCounterService
+from utils.schema import ensure_indexes
+
+# inbox lookups: a user's recipients by read state, and notifications by title
+INBOX_INDEXES = (
+    db.Index('ix_notification_recipient_user_read',
+             NotificationRecipient.user_id, NotificationRecipient.is_read, NotificationRecipient.notification_id),
+    db.Index('ix_notification_title_id', Notification.title, Notification.id),
+)
+
+
+class NotificationInboxService:
+    """
+    A user's notifications, grouped and paged in the database.
+
+    Groups are one GROUP BY over the user's recipients (count, unread,
+    latest notification). Pages are keyset based: the cursor is the newest
+    notification id already shown, so page N costs the same as page 1.
+    Marking a group read and deleting a group are single statements, with
+    the unread counter adjusted in the same transaction.
+    """
+
+    @staticmethod
+    def groups(user_id, before=None, limit=None):
+        """
+        ([{title, total, unread, latest}], next_cursor). latest is the newest
+        Notification of the group; next_cursor is None on the last page.
+        """
+        limit = limit or NotificationInboxService._page_size()
+        latest_id = func.max(Notification.id)
+        query = (
+            db.session.query(
+                Notification.title,
+                func.count(NotificationRecipient.id),
+                func.sum(case((NotificationRecipient.is_read.is_(False), 1), else_=0)),
+                latest_id
+            )
+            .join(Notification, Notification.id == NotificationRecipient.notification_id)
+            .filter(NotificationRecipient.user_id == user_id)
+            .group_by(Notification.title)
+        )
+        if before:
+            query = query.having(latest_id < before)
+        rows = query.order_by(latest_id.desc()).limit(limit + 1).all()
+
+        more = len(rows) > limit
+        rows = rows[:limit]
+        latest = {
+            n.id: n for n in Notification.query.filter(Notification.id.in_([r[3] for r in rows]))
+        } if rows else {}
+
+        groups = [{
+            "title": title,
+            "total": total,
+            "unread": unread or 0,
+            "latest": latest.get(newest)
+        } for title, total, unread, newest in rows]
+        return groups, (rows[-1][3] if more else None)
+
+    @staticmethod
+    def items(user_id, title=None, before=None, limit=None):
+        """(recipients with their notification loaded, next_cursor), newest first."""
+        limit = limit or NotificationInboxService._page_size()
+        query = (
+            NotificationRecipient.query
+            .join(Notification, Notification.id == NotificationRecipient.notification_id)
+            .options(joinedload(NotificationRecipient.notification))
+            .filter(NotificationRecipient.user_id == user_id)
+        )
+        if title is not None:
+            query = query.filter(Notification.title == title)
+        if before:
+            query = query.filter(Notification.id < before)
+        rows = query.order_by(Notification.id.desc()).limit(limit + 1).all()
+
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return rows, (rows[-1].notification_id if more else None)
+
+    @staticmethod
+    def mark_group_read(user_id, title=None, now=None):
+        """
+        Mark every unread notification of a group (or all of them when title
+        is None) read. Returns the number changed.
+        """
+        stmt = update(NotificationRecipient).where(
+            NotificationRecipient.user_id == user_id,
+            NotificationRecipient.is_read.is_(False)
+        )
+        if title is not None:
+            stmt = stmt.where(NotificationRecipient.notification_id.in_(NotificationInboxService._titled(title)))
+        changed = db.session.execute(
+            stmt.values(is_read=True, read_at=now or datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount or 0
+        NotificationCounterService.adjust(user_id, -changed)
+        return changed
+
+    @staticmethod
+    def delete_group(user_id, title):
+        """Delete a user's recipients of a group. Returns (deleted, unread_deleted)."""
+        in_group = and_(
+            NotificationRecipient.user_id == user_id,
+            NotificationRecipient.notification_id.in_(NotificationInboxService._titled(title))
+        )
+        unread = db.session.query(func.count(NotificationRecipient.id)).filter(
+            in_group, NotificationRecipient.is_read.is_(False)
+        ).scalar() or 0
+        deleted = db.session.execute(
+            delete(NotificationRecipient).where(in_group).execution_options(synchronize_session=False)
+        ).rowcount or 0
+        NotificationCounterService.adjust(user_id, -unread)
+        return deleted, unread
+
+    @staticmethod
+    def delete_recipients(notification_id):
+        """
+        Delete every recipient of a notification (before the notification
+        itself), taking their unread ones off the counters. Returns the
+        affected user ids, for NotificationCounterService.publish after commit.
+        """
+        unread = (
+            db.session.query(NotificationRecipient.user_id, func.count(NotificationRecipient.id))
+            .filter(NotificationRecipient.notification_id == notification_id, NotificationRecipient.is_read.is_(False))
+            .group_by(NotificationRecipient.user_id)
+            .all()
+        )
+        db.session.execute(
+            delete(NotificationRecipient)
+            .where(NotificationRecipient.notification_id == notification_id)
+            .execution_options(synchronize_session=False)
+        )
+        for user_id, n in unread:
+            NotificationCounterService.adjust(user_id, -n)
+        return [user_id for user_id, _ in unread]
+
+    @staticmethod
+    def ensure_indexes():
+        """Create the inbox indexes on databases created before they existed."""
+        return ensure_indexes(INBOX_INDEXES)
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _page_size():
+        return current_app.config.get('NOTIFICATION_PAGE_SIZE', 30)
+
+    @staticmethod
+    def _titled(title):
+        return select(Notification.id).where(Notification.title == title)
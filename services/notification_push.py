@@ -0,0 +1,43 @@
+from services.notification_counter_service import NotificationCounterService
+from utils.extensions import socketio
+
+
+class NotificationPush:
+    """
+    Realtime delivery of new notifications over the existing Socket.IO
+    user rooms (user_<public_id>, joined on connect).
+
+    Called after commit. Every recipient gets the same compact
+    'notification' event, so rooms are addressed in batches with a single
+    emit each instead of one emit per user; clients bump their own unread
+    badge on receipt.
+    """
+
+    ROOM_BATCH = 500
+    PREVIEW_CHARS = 120
+
+    @staticmethod
+    def publish(notification, audience):
+        """Push a committed notification to its audience. Returns the number of rooms addressed."""
+        rows = NotificationCounterService.refresh(audience)
+        rooms = [f"user_{public_id}" for _, public_id, _ in rows if public_id]
+        if not rooms:
+            return 0
+
+        payload = NotificationPush.payload(notification)
+        for i in range(0, len(rooms), NotificationPush.ROOM_BATCH):
+            socketio.emit('notification', payload, to=rooms[i:i + NotificationPush.ROOM_BATCH])
+        return len(rooms)
+
+    @staticmethod
+    def payload(notification):
+        message = notification.message or ''
+        if len(message) > NotificationPush.PREVIEW_CHARS:
+            message = message[:NotificationPush.PREVIEW_CHARS] + '...'
+        return {
+            'id': notification.id,
+            'type': notification.type,
+            'title': notification.title,
+            'preview': message,
+            'created_at': notification.created_at.isoformat() if notification.created_at else None,
+        }
@@ -0,0 +1,232 @@
+import gzip
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, exists, func, insert, select
+
+from models import (
+    db, Notification, NotificationRecipient,
+    NotificationRetentionPolicy, NotificationArchive, NotificationRecipientArchive
+)
+
+SINKS = ('table', 'jsonl')
+
+
+class NotificationRetentionService:
+    """
+    Moves read notifications out of the hot tables.
+
+    Work is done in small batches keyed on NotificationRecipient.id, each in
+    its own short transaction: copy a batch of read recipients older than
+    the policy's cutoff to the archive sink, delete them, then archive and
+    delete any of their notifications left without recipients. Unread
+    notifications are never touched, so unread counters stay valid.
+
+    Sinks: 'table' (notification_archive / notification_recipient_archive)
+    or 'jsonl' (gzip JSONL files per month in NOTIFICATION_ARCHIVE_FOLDER).
+    """
+
+    @staticmethod
+    def policy():
+        """The retention policy row, created with defaults on first use."""
+        policy = NotificationRetentionPolicy.query.first()
+        if not policy:
+            policy = NotificationRetentionPolicy(enabled=True, read_after_days=90, sink='table', batch_size=1000)
+            db.session.add(policy)
+            db.session.commit()
+        return policy
+
+    @staticmethod
+    def update_policy(enabled, read_after_days, sink, batch_size):
+        policy = NotificationRetentionService.policy()
+        policy.enabled = bool(enabled)
+        policy.read_after_days = max(int(read_after_days), 1)
+        policy.sink = sink if sink in SINKS else 'table'
+        policy.batch_size = min(max(int(batch_size), 100), 10000)
+        db.session.commit()
+        return policy
+
+    @staticmethod
+    def cutoff(policy=None, now=None, days=None):
+        policy = policy or NotificationRetentionService.policy()
+        return (now or datetime.utcnow()) - timedelta(days=days or policy.read_after_days)
+
+    @staticmethod
+    def eligible(cutoff):
+        """Number of read recipients older than cutoff."""
+        return (
+            db.session.query(func.count(NotificationRecipient.id))
+            .join(Notification, Notification.id == NotificationRecipient.notification_id)
+            .filter(NotificationRecipient.is_read.is_(True), Notification.created_at < cutoff)
+            .scalar() or 0
+        )
+
+    @staticmethod
+    def stats():
+        counts = {
+            "notifications": db.session.query(func.count(Notification.id)).scalar() or 0,
+            "recipients": db.session.query(func.count(NotificationRecipient.id)).scalar() or 0,
+            "archived_notifications": db.session.query(func.count(NotificationArchive.id)).scalar() or 0,
+            "archived_recipients": db.session.query(func.count(NotificationRecipientArchive.id)).scalar() or 0,
+        }
+        counts["eligible"] = NotificationRetentionService.eligible(NotificationRetentionService.cutoff())
+        return counts
+
+    @staticmethod
+    def run(max_batches=None, dry_run=False, sink=None, force=False, days=None, batch_size=None):
+        """
+        Archive batches until nothing is left (or max_batches is reached).
+        sink, days and batch_size override the policy for this run only.
+        Returns {"batches", "recipients", "notifications", "eligible"}.
+        """
+        policy = NotificationRetentionService.policy()
+        result = {"batches": 0, "recipients": 0, "notifications": 0, "eligible": 0}
+        cutoff = NotificationRetentionService.cutoff(policy, days=days)
+        if dry_run:
+            result["eligible"] = NotificationRetentionService.eligible(cutoff)
+            return result
+        if not policy.enabled and not force:
+            return result
+
+        sink = sink if sink in SINKS else policy.sink
+        batch_size = batch_size or policy.batch_size
+        pause = current_app.config.get('NOTIFICATION_RETENTION_PAUSE', 0.1)
+        while max_batches is None or result["batches"] < max_batches:
+            recipients, notifications = NotificationRetentionService.compact_batch(cutoff, batch_size, sink)
+            if not recipients and not notifications:
+                break
+            result["batches"] += 1
+            result["recipients"] += recipients
+            result["notifications"] += notifications
+            if pause:
+                time.sleep(pause)  # let other writers in between batches
+
+        policy.last_run_at = datetime.utcnow()
+        policy.last_archived = result["recipients"]
+        db.session.commit()
+
+        current_app.logger.info(
+            "Notification retention: archived %s recipient(s) and %s notification(s) in %s batch(es) to %s",
+            result["recipients"], result["notifications"], result["batches"], sink
+        )
+        return result
+
+    @staticmethod
+    def compact_batch(cutoff, batch_size, sink='table'):
+        """Archive and delete one batch in one transaction. Returns (recipients, notifications)."""
+        rows = (
+            db.session.query(
+                NotificationRecipient.id, NotificationRecipient.notification_id,
+                NotificationRecipient.user_id, NotificationRecipient.read_at
+            )
+            .join(Notification, Notification.id == NotificationRecipient.notification_id)
+            .filter(NotificationRecipient.is_read.is_(True), Notification.created_at < cutoff)
+            .order_by(NotificationRecipient.id)
+            .limit(batch_size)
+            .all()
+        )
+
+        recipients = [
+            {"id": r.id, "notification_id": r.notification_id, "user_id": r.user_id, "read_at": r.read_at}
+            for r in rows
+        ]
+        candidate_ids = {r["notification_id"] for r in recipients}
+        if not recipients:
+            # nothing left to move: sweep old notifications whose recipients were all deleted
+            candidate_ids = {nid for (nid,) in (
+                db.session.query(Notification.id)
+                .filter(Notification.created_at < cutoff, ~NotificationRetentionService._has_recipients())
+                .order_by(Notification.id)
+                .limit(batch_size)
+                .all()
+            )}
+            if not candidate_ids:
+                return 0, 0
+
+        try:
+            if recipients:
+                NotificationRetentionService._write(sink, 'recipient', recipients)
+                db.session.execute(
+                    delete(NotificationRecipient)
+                    .where(NotificationRecipient.id.in_([r["id"] for r in recipients]))
+                    .execution_options(synchronize_session=False)
+                )
+
+            orphans = (
+                Notification.query
+                .filter(Notification.id.in_(candidate_ids), ~NotificationRetentionService._has_recipients())
+                .all()
+            )
+            if orphans:
+                NotificationRetentionService._write(
+                    sink, 'notification', [NotificationRetentionService._row(n) for n in orphans]
+                )
+                db.session.execute(
+                    delete(Notification)
+                    .where(Notification.id.in_([n.id for n in orphans]))
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return len(recipients), len(orphans)
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _has_recipients():
+        return exists().where(NotificationRecipient.notification_id == Notification.id)
+
+    @staticmethod
+    def _row(notification):
+        return {c.name: getattr(notification, c.key, None) for c in Notification.__table__.columns}
+
+    @staticmethod
+    def _write(sink, kind, rows):
+        if sink == 'jsonl':
+            NotificationRetentionService._write_jsonl(kind, rows)
+            return
+
+        if kind == 'recipient':
+            db.session.execute(insert(NotificationRecipientArchive), rows)
+            return
+
+        already = {nid for (nid,) in db.session.execute(
+            select(NotificationArchive.id).where(NotificationArchive.id.in_([r["id"] for r in rows]))
+        )}
+        archived_at = datetime.utcnow()
+        fresh = [{
+            "id": r["id"],
+            "type": r.get("type"),
+            "title": r.get("title"),
+            "created_at": r.get("created_at"),
+            "payload": json.dumps(r, default=NotificationRetentionService._json_default),
+            "archived_at": archived_at,
+        } for r in rows if r["id"] not in already]
+        if fresh:
+            db.session.execute(insert(NotificationArchive), fresh)
+
+    @staticmethod
+    def _write_jsonl(kind, rows):
+        """Append to this month's gzip file before the rows are deleted."""
+        folder = current_app.config.get(
+            'NOTIFICATION_ARCHIVE_FOLDER', os.path.join(current_app.instance_path, 'notification_archive')
+        )
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"notifications-{datetime.utcnow():%Y-%m}.jsonl.gz")
+
+        with gzip.open(path, 'at', encoding='utf-8') as fh:
+            for row in rows:
+                fh.write(json.dumps({"kind": kind, **row}, default=NotificationRetentionService._json_default))
+                fh.write('\n')
+
+    @staticmethod
+    def _json_default(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return str(value)
@@ -0,0 +1,136 @@
+import os
+import uuid
+from datetime import datetime
+
+import numpy as np
+from flask import current_app
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from models import db, ApplicationDocument
+from services.application_progress_service import ApplicationProgressService, PHOTO
+
+ANALYSIS_SIZE = (96, 96)     # background check runs on a copy no larger than this
+PASSPORT_SIZE = (413, 531)   # 35 x 45 mm at 300 dpi
+THUMB_SIZE = (120, 154)
+
+# green in Pillow's 0-255 HSV: hue 0.23-0.42, saturation and value at least 0.3
+GREEN_HUE = (int(0.23 * 255), int(0.42 * 255))
+GREEN_MIN_SV = int(0.3 * 255)
+
+
+class PassportPhotoService:
+    """
+    Applicant passport photos.
+
+    The background check decodes only what it needs: draft() lets the JPEG
+    decoder scale down by up to 8x while decoding, thumbnail() brings the
+    image to at most ANALYSIS_SIZE, and the green test is a NumPy mask over
+    the HSV array. Only the border (top band and both sides down to
+    shoulder height) is measured, so the face and clothes in the middle do
+    not count against the photo. Every region must be mostly green.
+
+    Accepted photos are stored once as a standard passport-size JPEG plus
+    a thumbnail, and recorded as the application's 'photo' document (which
+    also sets the application's PHOTO progress bit).
+    """
+
+    @staticmethod
+    def check_background(image_file):
+        """{region: green ratio} for an image file/stream; raises ValueError when unreadable."""
+        try:
+            img = Image.open(image_file)
+            img.draft('RGB', (ANALYSIS_SIZE[0] * 2, ANALYSIS_SIZE[1] * 2))
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail(ANALYSIS_SIZE, Image.Resampling.BILINEAR)
+            hsv = np.asarray(img.convert('RGB').convert('HSV'))
+        except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+            raise ValueError("The file is not a readable image.")
+
+        height, width = hsv.shape[:2]
+        if height < 8 or width < 8:
+            raise ValueError("The image is too small.")
+
+        h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+        green = (h >= GREEN_HUE[0]) & (h <= GREEN_HUE[1]) & (s >= GREEN_MIN_SV) & (v >= GREEN_MIN_SV)
+
+        band_y, band_x = max(height // 8, 1), max(width // 8, 1)
+        shoulders = int(height * 0.6)
+        regions = {
+            "top": green[:band_y, :],
+            "left": green[band_y:shoulders, :band_x],
+            "right": green[band_y:shoulders, -band_x:],
+        }
+        return {name: float(mask.mean()) for name, mask in regions.items()}
+
+    @staticmethod
+    def validate(image_file):
+        """Raise ValueError with a message for the applicant unless the background is green."""
+        ratios = PassportPhotoService.check_background(image_file)
+        minimum = current_app.config.get('PASSPORT_GREEN_RATIO', 0.6)
+        failing = [name for name, ratio in ratios.items() if ratio < minimum]
+        if failing:
+            raise ValueError(
+                "Passport photo must have a green background "
+                f"(not enough green at the {' and '.join(failing)} of the photo)."
+            )
+        return ratios
+
+    @staticmethod
+    def current(application):
+        """The application's photo document, or None."""
+        if not application:
+            return None
+        return (
+            ApplicationDocument.query
+            .filter_by(application_id=application.id, document_type='photo')
+            .order_by(ApplicationDocument.id.desc())
+            .first()
+        )
+
+    @staticmethod
+    def save(upload, application, upload_dir, url_prefix):
+        """
+        Validate an uploaded FileStorage and store it for application.
+        Files go to upload_dir; the document's file_path is url_prefix + name.
+        Returns the ApplicationDocument.
+        """
+        PassportPhotoService.validate(upload.stream)
+        upload.stream.seek(0)
+
+        name = f"passport_{uuid.uuid4().hex[:12]}"
+        with Image.open(upload.stream) as img:
+            img.draft('RGB', (PASSPORT_SIZE[0] * 2, PASSPORT_SIZE[1] * 2))
+            img = ImageOps.exif_transpose(img).convert('RGB')
+            passport = ImageOps.fit(img, PASSPORT_SIZE, Image.Resampling.LANCZOS, centering=(0.5, 0.35))
+        passport.save(os.path.join(upload_dir, f"{name}.jpg"), 'JPEG', quality=90, optimize=True)
+        passport.thumbnail(THUMB_SIZE, Image.Resampling.LANCZOS)
+        passport.save(os.path.join(upload_dir, f"{name}_thumb.jpg"), 'JPEG', quality=85, optimize=True)
+
+        document = PassportPhotoService.current(application)
+        previous = document.file_path if document else None
+        if not document:
+            document = ApplicationDocument(application_id=application.id, document_type='photo')
+            db.session.add(document)
+        document.file_path = f"{url_prefix}{name}.jpg"
+        document.uploaded_at = datetime.utcnow()
+        ApplicationProgressService.mark(application, PHOTO)
+        db.session.commit()
+
+        if previous and previous != document.file_path:
+            PassportPhotoService._remove(upload_dir, os.path.basename(previous))
+        return document
+
+    @staticmethod
+    def thumbnail_name(file_path):
+        """'.../passport_x.jpg' -> 'passport_x_thumb.jpg'."""
+        base, ext = os.path.splitext(os.path.basename(file_path))
+        return f"{base}_thumb{ext}"
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _remove(upload_dir, filename):
+        for name in (filename, PassportPhotoService.thumbnail_name(filename)):
+            path = os.path.join(upload_dir, name)
+            if os.path.isfile(path):
+                os.remove(path)
@@ -0,0 +1,288 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select, update
+
+from models import db, User, StudentProfile, StudentQuizSubmission, Question, PromotionRun
+from services.attendance_service import AttendanceService
+from utils.extensions import socketio
+from utils.promotion import decide_promotion
+
+ACTIVE = ('applying', 'rolling_back')
+APPLIED = ('applied', 'failed')  # runs that may have changed students
+
+
+class PromotionService:
+    """
+    End-of-year promotion in three steps: preview, apply, (rollback).
+
+    preview() scores every student with two aggregate queries (latest quiz
+    submission per student, question count per quiz), runs the promotion
+    rule and writes the resulting plan to a gzip JSONL file for review.
+    apply() runs as a background task and works through the reviewed plan
+    in chunks, one transaction each: before a chunk is updated its current
+    values are appended to the run's snapshot, so a run can be rolled back
+    (even after a partial failure). Students whose class changed since the
+    preview are skipped rather than overwritten.
+
+    Only the most recent applied run can be rolled back, and students whose
+    class is no longer the one the run gave them are left alone. Runs are
+    in-process background tasks: one still active after
+    PROMOTION_STALE_MINUTES is taken as interrupted and marked failed, and
+    an admin can mark one failed by hand (the task stops at its next chunk).
+    """
+
+    CHUNK = 500
+
+    @staticmethod
+    def scores():
+        """{user_id: final score} for every student with a quiz submission."""
+        latest = select(
+            StudentQuizSubmission.user_id,
+            StudentQuizSubmission.score,
+            StudentQuizSubmission.quiz_id,
+            func.row_number().over(
+                partition_by=StudentQuizSubmission.user_id,
+                order_by=(StudentQuizSubmission.submitted_at.desc(), StudentQuizSubmission.id.desc()),
+            ).label('rn'),
+        ).subquery()
+        questions = (
+            select(Question.quiz_id, func.count(Question.id).label('n'))
+            .group_by(Question.quiz_id)
+            .subquery()
+        )
+        rows = db.session.execute(
+            select(latest.c.user_id, latest.c.score, questions.c.n)
+            .join(questions, questions.c.quiz_id == latest.c.quiz_id)
+            .where(latest.c.rn == 1)
+        )
+        return {r.user_id: (r.score or 0) / r.n * 100 for r in rows if r.n}
+
+    @staticmethod
+    def preview(created_by=None):
+        """Build and store a plan for every student. Returns the new PromotionRun."""
+        scores = PromotionService.scores()
+        run = PromotionRun(status='preview', created_by=created_by)
+        db.session.add(run)
+        db.session.flush()
+        run.plan_path = os.path.join(PromotionService._folder(), f"promotion-{run.id}-plan.jsonl.gz")
+
+        by_status, moves, total = {}, {}, 0
+        students = db.session.execute(
+            select(
+                StudentProfile.id, StudentProfile.user_id, StudentProfile.current_class,
+                StudentProfile.last_class_completed, User.first_name, User.last_name,
+            )
+            .join(User, User.user_id == StudentProfile.user_id)
+            .order_by(StudentProfile.id)
+            .execution_options(yield_per=2000, stream_results=True)
+        )
+        with gzip.open(run.plan_path, 'wt', encoding='utf-8') as fh:
+            for s in students:
+                score = round(scores.get(s.user_id, 0), 2)
+                status, next_class = decide_promotion(s.current_class, score)
+                fh.write(json.dumps({
+                    "id": s.id,
+                    "user_id": s.user_id,
+                    "name": " ".join(filter(None, [s.first_name, s.last_name])),
+                    "score": score,
+                    "status": status,
+                    "from": s.current_class,
+                    "to": next_class or s.current_class,
+                    "last_class_completed": s.current_class if status == "Promoted" else s.last_class_completed,
+                }) + '\n')
+                total += 1
+                by_status[status] = by_status.get(status, 0) + 1
+                if next_class and next_class != s.current_class:
+                    move = f"{s.current_class} → {next_class}"
+                    moves[move] = moves.get(move, 0) + 1
+
+        run.total = total
+        run.summary = json.dumps({"by_status": by_status, "moves": moves})
+        db.session.commit()
+        return run
+
+    @staticmethod
+    def plan(run, status=None, offset=0, limit=200):
+        """(rows, matching) from a run's plan, optionally only one status."""
+        rows, matching = [], 0
+        for row in PromotionService._read(run.plan_path):
+            if status and row["status"] != status:
+                continue
+            if offset <= matching < offset + limit:
+                rows.append(row)
+            matching += 1
+        return rows, matching
+
+    @staticmethod
+    def summary(run):
+        return json.loads(run.summary) if run.summary else {"by_status": {}, "moves": {}}
+
+    @staticmethod
+    def start(run, action):
+        """Start apply/rollback in the background. Returns an error message, or None when started."""
+        PromotionService.expire_stale()
+        if PromotionRun.query.filter(PromotionRun.status.in_(ACTIVE)).count():
+            return "Another promotion run is in progress."
+        if action == 'apply' and run.status != 'preview':
+            return "Only a preview can be applied."
+        if action == 'rollback' and run.status not in APPLIED:
+            return "Only an applied or failed run can be rolled back."
+        if action == 'rollback' and not PromotionService.is_latest_applied(run):
+            return "Only the most recent applied run can be rolled back; roll back the later runs first."
+        if action == 'rollback' and not (run.snapshot_path and os.path.exists(run.snapshot_path)):
+            return "This run has no snapshot to roll back from."
+
+        run.status = 'applying' if action == 'apply' else 'rolling_back'
+        run.started_at, run.finished_at, run.processed, run.error = datetime.utcnow(), None, 0, None
+        db.session.commit()
+        task = PromotionService._apply if action == 'apply' else PromotionService._rollback
+        socketio.start_background_task(PromotionService._run, current_app._get_current_object(), run.id, task)
+        return None
+
+    @staticmethod
+    def is_latest_applied(run):
+        latest = db.session.query(func.max(PromotionRun.id)).filter(PromotionRun.status.in_(APPLIED)).scalar()
+        return latest == run.id
+
+    @staticmethod
+    def mark_failed(run, reason="Marked failed by an administrator."):
+        """Give up on an active run; its task stops before the next chunk. Returns False if it was not active."""
+        if run.status not in ACTIVE:
+            return False
+        run.status, run.error, run.finished_at = 'failed', reason, datetime.utcnow()
+        db.session.commit()
+        return True
+
+    @staticmethod
+    def expire_stale():
+        """Mark failed the active runs started longer than PROMOTION_STALE_MINUTES ago."""
+        minutes = current_app.config.get('PROMOTION_STALE_MINUTES', 30)
+        cutoff = datetime.utcnow() - timedelta(minutes=minutes)
+        for run in PromotionRun.query.filter(PromotionRun.status.in_(ACTIVE), PromotionRun.started_at < cutoff):
+            PromotionService.mark_failed(run, f"Interrupted: still {run.status.replace('_', ' ')} after {minutes} minutes.")
+
+    @staticmethod
+    def progress(run):
+        return {
+            "id": run.id,
+            "status": run.status,
+            "total": run.total,
+            "processed": run.processed,
+            "skipped": run.skipped,
+            "error": run.error,
+        }
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _run(app, run_id, task):
+        with app.app_context():
+            run = db.session.get(PromotionRun, run_id)
+            try:
+                task(run)
+            except Exception as e:
+                app.logger.exception("Promotion run %s failed", run_id)
+                db.session.rollback()
+                run = db.session.get(PromotionRun, run_id)
+                run.status, run.error, run.finished_at = 'failed', str(e)[:1000], datetime.utcnow()
+                db.session.commit()
+            finally:
+                AttendanceService.invalidate_roster()
+                db.session.remove()
+
+    @staticmethod
+    def _apply(run):
+        run.snapshot_path = run.plan_path.replace('-plan.', '-snapshot.')
+        run.skipped = 0
+        db.session.commit()
+
+        for chunk in PromotionService._chunks(PromotionService._read(run.plan_path)):
+            if run.status != 'applying':
+                return  # marked failed meanwhile
+            current = {r.id: r for r in db.session.execute(
+                select(
+                    StudentProfile.id, StudentProfile.current_class,
+                    StudentProfile.last_class_completed, StudentProfile.academic_performance,
+                ).where(StudentProfile.id.in_([p["id"] for p in chunk]))
+            )}
+            fresh = [p for p in chunk if p["id"] in current and current[p["id"]].current_class == p["from"]]
+
+            # snapshot first, so whatever gets committed can be restored
+            PromotionService._append(run.snapshot_path, [{
+                "id": p["id"],
+                "current_class": current[p["id"]].current_class,
+                "last_class_completed": current[p["id"]].last_class_completed,
+                "academic_performance": current[p["id"]].academic_performance,
+            } for p in fresh])
+            if fresh:
+                db.session.execute(update(StudentProfile), [{
+                    "id": p["id"],
+                    "current_class": p["to"],
+                    "last_class_completed": p["last_class_completed"],
+                    "academic_performance": p["status"],
+                } for p in fresh])
+            run.processed += len(chunk)
+            run.skipped += len(chunk) - len(fresh)
+            db.session.commit()
+
+        run.status, run.finished_at = 'applied', datetime.utcnow()
+        db.session.commit()
+
+    @staticmethod
+    def _rollback(run):
+        # the class each student was given; anyone moved since then keeps their current values
+        given = {p["id"]: p["to"] for p in PromotionService._read(run.plan_path)}
+        run.skipped = 0
+        db.session.commit()
+
+        for chunk in PromotionService._chunks(PromotionService._read(run.snapshot_path)):
+            if run.status != 'rolling_back':
+                return  # marked failed meanwhile
+            current = dict(db.session.execute(
+                select(StudentProfile.id, StudentProfile.current_class)
+                .where(StudentProfile.id.in_([s["id"] for s in chunk]))
+            ).all())
+            unchanged = [s for s in chunk if s["id"] in current and current[s["id"]] == given.get(s["id"])]
+            if unchanged:
+                db.session.execute(update(StudentProfile), unchanged)
+            run.processed += len(chunk)
+            run.skipped += len(chunk) - len(unchanged)
+            db.session.commit()
+        run.status, run.finished_at = 'rolled_back', datetime.utcnow()
+        db.session.commit()
+
+    @staticmethod
+    def _folder():
+        folder = current_app.config.get('PROMOTION_FOLDER', os.path.join(os.getcwd(), 'backups', 'promotions'))
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    @staticmethod
+    def _read(path):
+        if not path or not os.path.exists(path):
+            return
+        with gzip.open(path, 'rt', encoding='utf-8') as fh:
+            for line in fh:
+                yield json.loads(line)
+
+    @staticmethod
+    def _append(path, rows):
+        if not rows:
+            return
+        with gzip.open(path, 'at', encoding='utf-8') as fh:
+            fh.writelines(json.dumps(r) + '\n' for r in rows)
+
+    @staticmethod
+    def _chunks(rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= PromotionService.CHUNK:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
@@ -0,0 +1,96 @@
+import json
+
+from sqlalchemy.orm import joinedload
+
+from models import db, Quiz, Question, QuizAttempt, StudentAnswer, QuizPayloadVersion
+from services.versioned_payload_cache import DATETIME_FORMAT, VersionedPayloadCache
+
+
+class QuizPayloadCache(VersionedPayloadCache):
+    """
+    Prebuilt, versioned take-quiz payloads (quiz header + questions + options),
+    built from one eager-loaded query and kept in process memory only, keyed
+    (quiz_id, version). Call invalidate(quiz_id) after any change to a quiz
+    or its questions.
+    """
+
+    VERSION_MODEL = QuizPayloadVersion
+    OWNER_COLUMN = 'quiz_id'
+    STAMP_COLUMN = 'updated_at'
+
+    # ---------------- PUBLIC ---------------- #
+
+    @staticmethod
+    def get(quiz_id):
+        version = QuizPayloadCache.current_version(quiz_id)
+        return QuizPayloadCache._cached((quiz_id, version), lambda: QuizPayloadCache._build(quiz_id, version))
+
+    @staticmethod
+    def saved_answers(quiz_id, student_id):
+        """
+        {question_id (str): option id / parsed answer text} of the student's
+        open (latest unsubmitted) attempt, from one column-only query.
+        Answers of submitted attempts are never restored.
+        """
+        open_attempt = (
+            db.session.query(QuizAttempt.id)
+            .filter(
+                QuizAttempt.student_id == student_id,
+                QuizAttempt.quiz_id == quiz_id,
+                QuizAttempt.submitted_at.is_(None),
+            )
+            .order_by(QuizAttempt.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        rows = (
+            db.session.query(StudentAnswer.question_id, StudentAnswer.selected_option_id, StudentAnswer.answer_text)
+            .filter(StudentAnswer.attempt_id == open_attempt)
+            .all()
+        )
+
+        result = {}
+        for question_id, selected_option_id, answer_text in rows:
+            if selected_option_id is not None:
+                result[str(question_id)] = selected_option_id
+            elif answer_text:
+                try:
+                    result[str(question_id)] = json.loads(answer_text)
+                except ValueError:
+                    result[str(question_id)] = answer_text
+            else:
+                result[str(question_id)] = ""
+        return result
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _build(quiz_id, version):
+        quiz = (
+            Quiz.query
+            .options(joinedload(Quiz.questions).joinedload(Question.options))
+            .filter(Quiz.id == quiz_id)
+            .first()
+        )
+        if quiz is None:
+            return None
+
+        return {
+            "id": quiz.id,
+            "title": quiz.title,
+            "version": version,
+            "duration_minutes": quiz.duration_minutes,
+            "attempts_allowed": quiz.attempts_allowed,
+            "start_datetime": quiz.start_datetime.strftime(DATETIME_FORMAT),
+            "end_datetime": quiz.end_datetime.strftime(DATETIME_FORMAT),
+            "questions": [
+                {
+                    "id": q.id,
+                    "question_text": q.text,
+                    "question_type": q.question_type,
+                    "options": [{"id": opt.id, "text": opt.text} for opt in q.options]
+                              if q.question_type in ("mcq", "multiple_choice") else []
+                }
+                for q in sorted(quiz.questions, key=lambda q: q.id)
+            ]
+        }
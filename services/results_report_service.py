@@ -0,0 +1,124 @@
+import csv
+import io
+
+from flask import current_app
+from sqlalchemy import and_, func, literal, select, union_all
+
+from models import (
+    db, User, Course, CourseAssessmentScheme, TeacherCourseAssignment,
+    Quiz, QuizAttempt, Exam, ExamSubmission, Assignment, AssignmentSubmission
+)
+from utils.helpers import escape_like
+
+RESULT_TYPES = ('Quiz', 'Exam', 'Assignment')
+
+CSV_COLUMNS = ['type', 'course', 'student', 'raw_score', 'weight_percent', 'weighted_score', 'submitted_at']
+
+
+class ResultsReportService:
+    """
+    Quiz, exam and assignment results for a teacher's courses as one
+    UNION ALL query. Weights come from the teacher's CourseAssessmentScheme
+    through an outer join, so weighted scores are computed in SQL, and
+    filtering, sorting and paging all happen in the database.
+    """
+
+    SORTS = ('submitted_at', 'student', 'course', 'type', 'raw_score', 'weighted_score')
+
+    @staticmethod
+    def course_ids(teacher_id):
+        return [cid for (cid,) in db.session.query(TeacherCourseAssignment.course_id)
+                .filter(TeacherCourseAssignment.teacher_id == teacher_id).distinct().all()]
+
+    @staticmethod
+    def page(teacher_id, page=1, per_page=None, **filters):
+        """(rows, total) for one page. filters: result_type, course_id, search, sort, direction."""
+        per_page = per_page or current_app.config.get('RESULTS_PAGE_SIZE', 50)
+        page = max(page or 1, 1)
+
+        stmt = ResultsReportService._select(teacher_id, **filters)
+        total = db.session.execute(select(func.count()).select_from(stmt.order_by(None).subquery())).scalar() or 0
+        rows = db.session.execute(stmt.limit(per_page).offset((page - 1) * per_page)).mappings().all()
+        return [dict(r) for r in rows], total
+
+    @staticmethod
+    def iter_csv(teacher_id, **filters):
+        """CSV export, yielded a chunk of rows at a time from a streamed cursor."""
+        stmt = ResultsReportService._select(teacher_id, **filters)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        writer.writerow(CSV_COLUMNS)
+        result = db.session.execute(stmt.execution_options(yield_per=500)).mappings()
+        for i, row in enumerate(result, 1):
+            writer.writerow([
+                row['type'], row['course'], row['student'],
+                ResultsReportService._fmt(row['raw_score']),
+                ResultsReportService._fmt(row['weight_percent']),
+                ResultsReportService._fmt(row['weighted_score']),
+                row['submitted_at'].strftime('%Y-%m-%d %H:%M') if row['submitted_at'] else ''
+            ])
+            if i % 500 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        yield buffer.getvalue()
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _select(teacher_id, result_type=None, course_id=None, search=None, sort='submitted_at', direction='desc'):
+        course_ids = ResultsReportService.course_ids(teacher_id)
+        if course_id:
+            course_ids = [cid for cid in course_ids if cid == course_id]
+
+        student = (func.coalesce(User.first_name, '') + ' ' + func.coalesce(User.last_name, ''))
+
+        def branch(label, sub_model, parent_model, fk, weight_col, *conditions):
+            raw = func.coalesce(sub_model.score, 0)
+            return (
+                select(
+                    literal(label).label('type'),
+                    Course.id.label('course_id'),
+                    Course.name.label('course'),
+                    User.id.label('student_id'),
+                    student.label('student'),
+                    raw.label('raw_score'),
+                    weight_col.label('weight_percent'),
+                    (raw * weight_col / 100.0).label('weighted_score'),
+                    sub_model.submitted_at.label('submitted_at')
+                )
+                .select_from(sub_model)
+                .join(parent_model, parent_model.id == fk)
+                .join(Course, Course.id == parent_model.course_id)
+                .join(User, User.id == sub_model.student_id)
+                .outerjoin(CourseAssessmentScheme, and_(
+                    CourseAssessmentScheme.course_id == Course.id,
+                    CourseAssessmentScheme.teacher_id == teacher_id
+                ))
+                .where(Course.id.in_(course_ids), *conditions)
+            )
+
+        branches = {
+            # open (autosaved, unsubmitted) quiz attempts are not results
+            'Quiz': lambda: branch('Quiz', QuizAttempt, Quiz, QuizAttempt.quiz_id, CourseAssessmentScheme.quiz_weight,
+                                   QuizAttempt.submitted_at.isnot(None)),
+            'Exam': lambda: branch('Exam', ExamSubmission, Exam, ExamSubmission.exam_id, CourseAssessmentScheme.exam_weight),
+            'Assignment': lambda: branch('Assignment', AssignmentSubmission, Assignment,
+                                         AssignmentSubmission.assignment_id, CourseAssessmentScheme.assignment_weight),
+        }
+        parts = [branches[result_type]()] if result_type in branches else [b() for b in branches.values()]
+        results = union_all(*parts).subquery('results')
+
+        stmt = select(results)
+        if search:
+            stmt = stmt.where(func.lower(results.c.student).like(f"%{escape_like(search.lower())}%", escape='\\'))
+
+        sort = sort if sort in ResultsReportService.SORTS else 'submitted_at'
+        column = results.c[sort]
+        order = column.asc() if direction == 'asc' else column.desc()
+        return stmt.order_by(order, results.c.student.asc())
+
+    @staticmethod
+    def _fmt(value):
+        return '' if value is None else f"{float(value):.2f}"
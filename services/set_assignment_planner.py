@@ -0,0 +1,144 @@
+from hashlib import sha256
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from models import (
+    db, User, StudentProfile, StudentCourseRegistration,
+    ExamAttempt, ExamSet, ExamSetAssignment
+)
+
+
+class SetAssignmentPlanner:
+    """
+    Assigns exam sets to the whole roster once, at publish time.
+
+    Students are walked in seating order (row by row, row_width seats per row;
+    row_width=0 means one long row). Each seat gets the set that clashes with
+    the fewest already-seated neighbours (left and in front), never exceeding
+    an even share per set. Ties break on a hash of the exam seed, so the plan
+    is deterministic and the preview always matches the real assignment.
+    """
+
+    @staticmethod
+    def plan(exam, seating_order=None, row_width=0):
+        """
+        seating_order: list of User.id in seat order. Defaults to the roster
+        sorted by index number. Returns the number of students assigned.
+        """
+        set_ids = [sid for (sid,) in db.session.query(ExamSet.id).filter_by(exam_id=exam.id).order_by(ExamSet.id).all()]
+        if not set_ids or exam.assignment_mode == 'choice':
+            return 0
+
+        roster = SetAssignmentPlanner.roster(exam)
+        if seating_order:
+            on_roster, seated = set(roster), set(seating_order)
+            roster = [sid for sid in seating_order if sid in on_roster] + \
+                     [sid for sid in roster if sid not in seated]
+
+        # students who already started keep the set they are writing
+        fixed = dict(
+            db.session.query(ExamAttempt.student_id, ExamAttempt.set_id)
+            .filter(ExamAttempt.exam_id == exam.id, ExamAttempt.set_id.isnot(None))
+            .all()
+        )
+
+        seats = SetAssignmentPlanner.assign_seats(roster, set_ids, row_width, exam.assignment_seed, fixed)
+
+        ExamSetAssignment.query.filter_by(exam_id=exam.id).delete(synchronize_session=False)
+        if seats:
+            db.session.execute(insert(ExamSetAssignment), [
+                {"exam_id": exam.id, "student_id": sid, "set_id": set_id, "seat_index": idx}
+                for idx, (sid, set_id) in enumerate(seats)
+            ])
+        db.session.commit()
+        return len(seats)
+
+    @staticmethod
+    def assign_seats(roster, set_ids, row_width=0, seed=None, fixed=None):
+        """Pure planning step: [(student_id, set_id)] in seat order."""
+        fixed = fixed or {}
+        k = len(set_ids)
+        cap = -(-len(roster) // k)  # even share, rounded up
+        counts = {s: 0 for s in set_ids}
+        for sid in roster:
+            if fixed.get(sid) in counts:
+                counts[fixed[sid]] += 1
+
+        def tiebreak(student_id, set_id):
+            return sha256(f"{seed or ''}:{student_id}:{set_id}".encode()).hexdigest()
+
+        seats = []
+        for idx, student_id in enumerate(roster):
+            neighbours = []
+            if idx > 0 and (not row_width or idx % row_width):
+                neighbours.append(seats[idx - 1][1])
+            if row_width and idx >= row_width:
+                neighbours.append(seats[idx - row_width][1])
+
+            if student_id in fixed and fixed[student_id] in counts:
+                seats.append((student_id, fixed[student_id]))
+                continue
+
+            candidates = [s for s in set_ids if counts[s] < cap] or set_ids
+            best = min(candidates, key=lambda s: (neighbours.count(s), counts[s], tiebreak(student_id, s)))
+            counts[best] += 1
+            seats.append((student_id, best))
+        return seats
+
+    @staticmethod
+    def roster(exam):
+        """User.id of every student in the exam's class or registered for its course, by index number."""
+        by_class = (
+            db.session.query(User.id, User.user_id)
+            .join(StudentProfile, StudentProfile.user_id == User.user_id)
+            .filter(StudentProfile.current_class == exam.assigned_class)
+        )
+        by_course = (
+            db.session.query(User.id, User.user_id)
+            .join(StudentCourseRegistration, StudentCourseRegistration.student_id == User.id)
+            .filter(StudentCourseRegistration.course_id == exam.course_id)
+        )
+        rows = by_class.union(by_course).all()
+        return [uid for uid, _ in sorted(rows, key=lambda r: (r[1] or '', r[0]))]
+
+    @staticmethod
+    def set_for(exam, student_user, assign=False):
+        """
+        The student's planned ExamSet (single indexed lookup). Late joiners get
+        a set picked from a hash of the exam seed and their ID, so the GET
+        preview and the assignment recorded when assign is True (the POSTs
+        that start an exam) always agree; previews never write.
+        """
+        exam_set = (
+            ExamSet.query
+            .join(ExamSetAssignment, ExamSetAssignment.set_id == ExamSet.id)
+            .filter(ExamSetAssignment.exam_id == exam.id, ExamSetAssignment.student_id == student_user.id)
+            .first()
+        )
+        if exam_set or exam.assignment_mode == 'choice':
+            return exam_set
+        chosen = SetAssignmentPlanner._late_choice(exam, student_user)
+        if chosen is None or not assign:
+            return chosen
+
+        db.session.add(ExamSetAssignment(exam_id=exam.id, student_id=student_user.id, set_id=chosen.id))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # a parallel request assigned this student first
+            db.session.rollback()
+            return SetAssignmentPlanner.set_for(exam, student_user)
+        return chosen
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _late_choice(exam, student_user):
+        # seed only, not current loads: the choice must not move between preview and start
+        sets = ExamSet.query.filter_by(exam_id=exam.id).order_by(ExamSet.id).all()
+        if not sets:
+            return None
+
+        seed = (exam.assignment_seed or '') + (student_user.user_id or str(student_user.id))
+        return min(sets, key=lambda s: sha256(f"{seed}:{s.id}".encode()).hexdigest())
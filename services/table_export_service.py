@@ -0,0 +1,147 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy import select
+
+from models import db
+from utils.extensions import socketio
+
+# format -> (mimetype, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+class TableExportService:
+    """
+    Full-table exports at constant memory.
+
+    Rows are read with a Core select in primary key order and
+    yield_per/stream_results (a server-side cursor on PostgreSQL and
+    MySQL), and encoded one partition at a time, so nothing ever holds the
+    whole table. stream() feeds an HTTP response directly; snapshot() writes
+    the same bytes to EXPORT_FOLDER in the background so the finished file
+    can be downloaded with Range requests and resumed.
+    """
+
+    CHUNK = 2000
+
+    @staticmethod
+    def columns(model, names=None):
+        """Table columns to export, in table order (all when names is empty)."""
+        table = model.__table__
+        if not names:
+            return list(table.columns)
+        unknown = set(names) - {c.name for c in table.columns}
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(sorted(unknown))}")
+        return [c for c in table.columns if c.name in names]
+
+    @staticmethod
+    def stream(model, fmt='csv', names=None, chunk=None):
+        """Generator of encoded byte chunks: a header (CSV) then one chunk per partition."""
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format: {fmt}")
+        columns = TableExportService.columns(model, names)
+        keys = [c.name for c in columns]
+        chunk = chunk or current_app.config.get('EXPORT_CHUNK_ROWS', TableExportService.CHUNK)
+
+        if fmt == 'csv':
+            yield TableExportService._csv([keys])
+
+        pk = list(model.__table__.primary_key.columns)
+        stmt = select(*columns).order_by(*pk).execution_options(yield_per=chunk, stream_results=True)
+        result = db.session.execute(stmt)
+        try:
+            for partition in result.partitions():
+                rows = [[TableExportService._value(v) for v in row] for row in partition]
+                if fmt == 'csv':
+                    yield TableExportService._csv(rows)
+                else:
+                    yield ''.join(
+                        json.dumps(dict(zip(keys, row)), ensure_ascii=False) + '\n' for row in rows
+                    ).encode('utf-8')
+        finally:
+            result.close()
+
+    @staticmethod
+    def filename(slug, fmt):
+        return f"{slug}-{datetime.utcnow():%Y%m%d%H%M%S}.{FORMATS[fmt][1]}"
+
+    @staticmethod
+    def folder():
+        folder = current_app.config.get('EXPORT_FOLDER', os.path.join(os.getcwd(), 'backups', 'exports'))
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    @staticmethod
+    def write(model, fmt, path, names=None):
+        """Write a full export to path (via path + '.part', renamed when complete). Returns bytes written."""
+        part = path + '.part'
+        written = 0
+        with open(part, 'wb') as fh:
+            for data in TableExportService.stream(model, fmt, names):
+                written += fh.write(data)
+        os.replace(part, path)
+        return written
+
+    @staticmethod
+    def snapshot(model, slug, fmt='csv', names=None):
+        """Start a background export to EXPORT_FOLDER. Returns the file name it will have."""
+        TableExportService.columns(model, names)  # reject bad columns before starting
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format: {fmt}")
+        name = TableExportService.filename(slug, fmt)
+        path = os.path.join(TableExportService.folder(), name)
+        open(path + '.part', 'wb').close()  # so status() reports 'building' straight away
+        socketio.start_background_task(
+            TableExportService._run_snapshot, current_app._get_current_object(), model, fmt, path, names
+        )
+        return name
+
+    @staticmethod
+    def status(name):
+        """'ready', 'building' or None for an export file name."""
+        path = os.path.join(TableExportService.folder(), name)
+        if os.path.isfile(path):
+            return 'ready'
+        if os.path.isfile(path + '.part'):
+            return 'building'
+        return None
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _run_snapshot(app, model, fmt, path, names):
+        with app.app_context():
+            try:
+                size = TableExportService.write(model, fmt, path, names)
+                app.logger.info("Exported %s to %s (%s bytes)", model.__tablename__, path, size)
+            except Exception:
+                app.logger.exception("Export of %s failed", model.__tablename__)
+                if os.path.exists(path + '.part'):
+                    os.remove(path + '.part')
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def _csv(rows):
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        return buf.getvalue().encode('utf-8')
+
+    @staticmethod
+    def _value(value):
+        if isinstance(value, (datetime, date, time)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return None
+        return value
@@ -0,0 +1,336 @@
+import base64
+import csv
+import io
+import multiprocessing
+import os
+import re
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import Boolean, Date, DateTime, Integer, insert, select
+from werkzeug.security import generate_password_hash
+
+from models import db, User, StudentProfile, TeacherProfile, ParentProfile
+from services.id_allocator import IdAllocator
+from services.table_export_service import TableExportService
+
+PROFILES = {'student': StudentProfile, 'teacher': TeacherProfile, 'parent': ParentProfile}
+REQUIRED = ('first_name', 'last_name', 'role')
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class UserImportService:
+    """
+    Bulk user registration from a CSV or XLSX sheet.
+
+    The whole file is validated before anything is written: required
+    fields, roles, dates and lengths per column, duplicates inside the file,
+    and emails/usernames already taken (looked up with one IN query per
+    chunk rather than one query per row). Importing then reserves a block of
+    user IDs per role (IdAllocator), hashes passwords (across a spawned
+    process pool outside eventlet) and inserts User and profile rows with
+    multi-row INSERTs in one transaction.
+
+    Generated passwords are never written to disk: the credentials CSV is
+    returned once, base64 encoded, for the import response to offer as a
+    download.
+
+    Columns: first_name, last_name, role (required); middle_name, email,
+    username, password (generated when blank); plus any column of the
+    role's profile table (e.g. current_class, dob, gender for students).
+    """
+
+    CHUNK = 500
+
+    @staticmethod
+    def read(file_storage):
+        """Rows of an uploaded .csv or .xlsx as dicts with normalised header names."""
+        name = (file_storage.filename or '').lower()
+        if name.endswith('.xlsx'):
+            try:
+                from openpyxl import load_workbook
+            except ImportError:
+                raise ValueError("Reading .xlsx needs the openpyxl package; upload a CSV instead.")
+            sheet = load_workbook(file_storage.stream, read_only=True, data_only=True).active
+            values = sheet.iter_rows(values_only=True)
+            header = [UserImportService._key(h) for h in next(values, [])]
+            rows = [dict(zip(header, row)) for row in values]
+        elif name.endswith('.csv'):
+            reader = csv.DictReader(io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig'))
+            reader.fieldnames = [UserImportService._key(h) for h in reader.fieldnames or []]
+            rows = list(reader)
+        else:
+            raise ValueError("Upload a .csv or .xlsx file.")
+
+        # drop fully blank lines (common at the end of spreadsheets)
+        return [r for r in rows if any(v not in (None, '') for v in r.values())]
+
+    @staticmethod
+    def validate(rows):
+        """
+        (records, errors). records are ready-to-insert dicts for the valid
+        rows, with usernames assigned; errors are {"line", "field", "message"}.
+        """
+        errors = []
+        records = []
+        seen_emails, seen_usernames = {}, {}
+
+        for line, raw in enumerate(rows, start=2):  # line 1 is the header
+            record, row_errors = UserImportService._parse(raw)
+            for field, message in row_errors:
+                errors.append({"line": line, "field": field, "message": message})
+            if row_errors:
+                continue
+
+            email = (record["user"]["email"] or '').lower()
+            if email and email in seen_emails:
+                errors.append({"line": line, "field": "email", "message": f"Duplicate of line {seen_emails[email]}"})
+                continue
+            username = record["user"]["username"]
+            if username and username in seen_usernames:
+                errors.append({"line": line, "field": "username", "message": f"Duplicate of line {seen_usernames[username]}"})
+                continue
+            if email:
+                seen_emails[email] = line
+            if username:
+                seen_usernames[username] = line
+            record["line"] = line
+            records.append(record)
+
+        # emails and usernames already in the database, one IN query per chunk
+        taken_emails = UserImportService._existing(
+            User.email, [r["user"]["email"] for r in records if r["user"]["email"]], lower=True
+        )
+        taken_usernames = UserImportService._existing(
+            User.username, [r["user"]["username"] for r in records if r["user"]["username"]]
+        )
+        valid = []
+        for record in records:
+            email, username = record["user"]["email"], record["user"]["username"]
+            if email and email.lower() in taken_emails:
+                errors.append({"line": record["line"], "field": "email", "message": "Email already in use"})
+            elif username and username in taken_usernames:
+                errors.append({"line": record["line"], "field": "username", "message": "Username already exists"})
+            else:
+                valid.append(record)
+
+        UserImportService._assign_usernames(valid, reserved=set(seen_usernames))
+        errors.sort(key=lambda e: e["line"])
+        return valid, errors
+
+    @staticmethod
+    def run(file_storage, dry_run=True, skip_invalid=False):
+        """
+        Validate, then (unless dry_run, or there are errors and not
+        skip_invalid) create the users. Returns a summary dict with the
+        "report" file name in EXPORT_FOLDER when there are errors, and the
+        "credentials" CSV (base64) once users were created.
+        """
+        rows = UserImportService.read(file_storage)
+        records, errors = UserImportService.validate(rows)
+        result = {
+            "total": len(rows), "valid": len(records), "errors": errors, "created": 0,
+            "by_role": {}, "report": None, "credentials": None, "preview": records[:20],
+        }
+        if errors:
+            result["report"] = UserImportService._write_csv(
+                'errors', ['line', 'field', 'message'], [[e["line"], e["field"], e["message"]] for e in errors]
+            )
+        if dry_run or not records or (errors and not skip_invalid):
+            return result
+
+        UserImportService._assign_ids(records)
+        for record in records:
+            if not record["password"]:
+                record["password"], record["generated"] = secrets.token_urlsafe(8), True
+        hashes = UserImportService._hash_all([r["password"] for r in records])
+        for record, password_hash in zip(records, hashes):
+            record["user"]["password_hash"] = password_hash
+
+        try:
+            for start in range(0, len(records), UserImportService.CHUNK):
+                chunk = records[start:start + UserImportService.CHUNK]
+                db.session.execute(insert(User), [r["user"] for r in chunk])
+                for role, Profile in PROFILES.items():
+                    profiles = [r["profile"] for r in chunk if r["user"]["role"] == role]
+                    if profiles:
+                        db.session.execute(insert(Profile), profiles)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        for record in records:
+            role = record["user"]["role"]
+            result["by_role"][role] = result["by_role"].get(role, 0) + 1
+        result["created"] = len(records)
+        result["credentials"] = base64.b64encode(UserImportService._csv(
+            ['line', 'user_id', 'username', 'role', 'temporary_password'],
+            [[r["line"], r["user"]["user_id"], r["user"]["username"], r["user"]["role"],
+              r["password"] if r.get("generated") else ''] for r in records]
+        ).encode('utf-8')).decode('ascii')
+        current_app.logger.info("Bulk import created %s user(s): %s", len(records), result["by_role"])
+        return result
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _key(header):
+        return re.sub(r'[^a-z0-9]+', '_', str(header or '').strip().lower()).strip('_')
+
+    @staticmethod
+    def _parse(raw):
+        """One sheet row -> ({"user", "profile", "password"}, [(field, message)])."""
+        errors = []
+        values = {k: (v.strip() if isinstance(v, str) else v) for k, v in raw.items() if k}
+
+        for field in REQUIRED:
+            if values.get(field) in (None, ''):
+                errors.append((field, "Required"))
+        role = str(values.get('role') or '').lower()
+        if role and role not in PROFILES:
+            errors.append(('role', f"Unknown role '{role}' (student, teacher or parent)"))
+        email = values.get('email') or None
+        if email and not EMAIL_RE.match(str(email)):
+            errors.append(('email', "Not a valid email address"))
+        if errors:
+            return None, errors
+
+        user = {
+            "first_name": str(values['first_name']),
+            "middle_name": str(values.get('middle_name') or ''),
+            "last_name": str(values['last_name']),
+            "email": str(email) if email else None,
+            "username": str(values['username']) if values.get('username') else None,
+            "role": role,
+            "profile_picture": "default_avatar.png",
+        }
+        for field in ('first_name', 'middle_name', 'last_name', 'email', 'username'):
+            message = UserImportService._too_long(User.__table__.columns.get(field), user[field])
+            if message:
+                errors.append((field, message))
+
+        Profile = PROFILES[role]
+        profile = {}
+        for column in Profile.__table__.columns:
+            if column.primary_key or column.name == 'user_id' or column.name not in values:
+                continue
+            try:
+                value = UserImportService._coerce(column, values[column.name])
+            except ValueError as e:
+                errors.append((column.name, str(e)))
+                continue
+            message = UserImportService._too_long(column, value)
+            if message:
+                errors.append((column.name, message))
+            profile[column.name] = value
+        if 'email' in Profile.__table__.columns and 'email' not in profile:
+            profile['email'] = user['email'] or ''
+
+        password = str(values.get('password') or '') or None
+        return {"user": user, "profile": profile, "password": password}, errors
+
+    @staticmethod
+    def _coerce(column, value):
+        if value in (None, ''):
+            return None if column.nullable or column.default is not None else ''
+        if isinstance(column.type, (Date, DateTime)):
+            if isinstance(value, datetime):
+                return value if isinstance(column.type, DateTime) else value.date()
+            if isinstance(value, date):
+                return value
+            try:
+                parsed = datetime.strptime(str(value)[:10], '%Y-%m-%d')
+            except ValueError:
+                raise ValueError(f"Expected a date as YYYY-MM-DD, got '{value}'")
+            return parsed if isinstance(column.type, DateTime) else parsed.date()
+        if isinstance(column.type, Boolean):
+            return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+        if isinstance(column.type, Integer):
+            try:
+                return int(float(value))
+            except (TypeError, ValueError):
+                raise ValueError(f"Expected a whole number, got '{value}'")
+        return str(value)
+
+    @staticmethod
+    def _too_long(column, value):
+        length = getattr(getattr(column, 'type', None), 'length', None)
+        if length and isinstance(value, str) and len(value) > length:
+            return f"Longer than {length} characters"
+        return None
+
+    @staticmethod
+    def _existing(column, values, lower=False):
+        """The subset of values already present in column, looked up in chunks."""
+        found = set()
+        values = list({v.lower() if lower else v for v in values})
+        expr = db.func.lower(column) if lower else column
+        for start in range(0, len(values), UserImportService.CHUNK):
+            chunk = values[start:start + UserImportService.CHUNK]
+            found.update(v.lower() if lower else v for (v,) in db.session.execute(select(column).where(expr.in_(chunk))))
+        return found
+
+    @staticmethod
+    def _assign_usernames(records, reserved):
+        """Same scheme as generate_unique_username, with one lookup per chunk of name bases."""
+        pending = [r for r in records if not r["user"]["username"]]
+        bases = [
+            IdAllocator.username_base(r["user"]["first_name"], r["user"]["middle_name"], r["user"]["last_name"], r["user"]["role"])
+            for r in pending
+        ]
+        taken = IdAllocator.taken_usernames(bases) | set(reserved)
+        for r, (base, domain) in zip(pending, bases):
+            r["user"]["username"] = IdAllocator.next_free(base, domain, taken)
+
+    @staticmethod
+    def _assign_ids(records):
+        """One reserved block of IDs per role."""
+        for role in PROFILES:
+            group = [r for r in records if r["user"]["role"] == role]
+            if not group:
+                continue
+            for r, user_id in zip(group, IdAllocator.user_ids(role, len(group))):
+                r["user"]["user_id"] = r["profile"]["user_id"] = user_id
+
+    @staticmethod
+    def _hash_all(passwords):
+        # forking an eventlet-patched worker is unsafe: hash in-process there unless workers are configured
+        default = 1 if UserImportService._green() else os.cpu_count()
+        workers = current_app.config.get('USER_IMPORT_HASH_WORKERS') or default or 1
+        if workers <= 1 or len(passwords) < 50:
+            return [generate_password_hash(p) for p in passwords]
+        try:
+            # spawned, not forked: children start clean instead of inheriting sockets and hub state
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                chunksize = max(len(passwords) // (workers * 4), 1)
+                return list(pool.map(generate_password_hash, passwords, chunksize=chunksize))
+        except (OSError, BrokenProcessPool):
+            current_app.logger.warning("Process pool unavailable; hashing passwords in-process", exc_info=True)
+            return [generate_password_hash(p) for p in passwords]
+
+    @staticmethod
+    def _green():
+        try:
+            from eventlet import patcher
+        except ImportError:
+            return False
+        return patcher.is_monkey_patched('thread')
+
+    @staticmethod
+    def _csv(header, rows):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(header)
+        writer.writerows(rows)
+        return buf.getvalue()
+
+    @staticmethod
+    def _write_csv(kind, header, rows):
+        name = f"user-import-{datetime.utcnow():%Y%m%d%H%M%S}-{secrets.token_hex(4)}-{kind}.csv"
+        with open(os.path.join(TableExportService.folder(), name), 'w', newline='', encoding='utf-8') as fh:
+            fh.write(UserImportService._csv(header, rows))
+        return name
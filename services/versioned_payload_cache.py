@@ -0,0 +1,180 @@
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+
+from models import db
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class VersionedPayloadCache:
+    """
+    Base for prebuilt, versioned payloads (QuizPayloadCache, ExamPayloadCache).
+
+    Keys start with (owner_id, version); the version lives in VERSION_MODEL
+    and is bumped by invalidate(), so every worker moves to the new payload
+    within VERSION_TTL seconds. Lookup order: process memory -> serialized
+    file on disk (when FOLDER_CONFIG is set) -> build. Builds are coalesced
+    per key, so a burst of simultaneous starts costs one build. Payloads are
+    shared between requests and must not be mutated.
+
+    Each subclass gets its own memory, version and lock tables.
+    """
+
+    # seconds a worker trusts its copy of a version before re-reading it
+    VERSION_TTL = 5
+
+    VERSION_MODEL = None  # one row per owner: <OWNER_COLUMN>, version
+    OWNER_COLUMN = None
+    STAMP_COLUMN = None   # set to utcnow() on every bump
+    FOLDER_CONFIG = None  # config key of the disk copy folder; None keeps payloads in memory only
+    FOLDER_DEFAULT = None  # folder under the instance path when the config key is unset
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._memory = {}      # key -> payload
+        cls._versions = {}    # owner_id -> (version, fetched_at)
+        cls._locks = {}       # key -> Lock
+        cls._guard = threading.Lock()
+
+    # ---------------- PUBLIC ---------------- #
+
+    @classmethod
+    def invalidate(cls, owner_id):
+        """Call after any change to what the payloads are built from. Returns the new version."""
+        row = cls.VERSION_MODEL.query.get(owner_id)
+        if row:
+            row.version += 1
+            setattr(row, cls.STAMP_COLUMN, datetime.utcnow())
+        else:
+            row = cls.VERSION_MODEL(**{cls.OWNER_COLUMN: owner_id, "version": 1})
+            db.session.add(row)
+        db.session.commit()
+
+        with cls._guard:
+            cls._versions[owner_id] = (row.version, time.monotonic())
+            for key in [k for k in cls._memory if k[0] == owner_id]:
+                cls._memory.pop(key, None)
+                cls._locks.pop(key, None)
+        return row.version
+
+    @classmethod
+    def discard(cls, owner_id):
+        """
+        Call after the owner is deleted: drops its version row, memory entries
+        and disk copies, so an owner that reuses the id starts from scratch.
+        """
+        cls.VERSION_MODEL.query.filter(
+            getattr(cls.VERSION_MODEL, cls.OWNER_COLUMN) == owner_id
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+        with cls._guard:
+            cls._versions.pop(owner_id, None)
+            for key in [k for k in cls._memory if k[0] == owner_id]:
+                cls._memory.pop(key, None)
+                cls._locks.pop(key, None)
+
+        if cls.FOLDER_CONFIG:
+            for path in glob.glob(os.path.join(cls._folder(), cls._file_pattern(owner_id))):
+                try:
+                    os.remove(path)
+                except OSError:
+                    current_app.logger.exception("Could not remove payload %s", path)
+
+    @classmethod
+    def current_version(cls, owner_id):
+        cached = cls._versions.get(owner_id)
+        if cached and time.monotonic() - cached[1] < cls.VERSION_TTL:
+            return cached[0]
+
+        version = (
+            db.session.query(cls.VERSION_MODEL.version)
+            .filter(getattr(cls.VERSION_MODEL, cls.OWNER_COLUMN) == owner_id)
+            .scalar()
+        ) or 0
+        cls._versions[owner_id] = (version, time.monotonic())
+        return version
+
+    @staticmethod
+    def window(payload):
+        """(start, end) datetimes of the quiz or exam described by a payload."""
+        return (
+            datetime.strptime(payload["start_datetime"], DATETIME_FORMAT),
+            datetime.strptime(payload["end_datetime"], DATETIME_FORMAT),
+        )
+
+    # ---------------- HELPERS ---------------- #
+
+    @classmethod
+    def _cached(cls, key, build):
+        """The payload for key, calling build() at most once per key and process."""
+        payload = cls._memory.get(key)
+        if payload is not None:
+            return payload
+
+        with cls._lock_for(key):
+            # another request may have finished the build while we waited
+            payload = cls._memory.get(key)
+            if payload is None:
+                payload = cls._load_file(key)
+            if payload is None:
+                payload = build()
+                cls._write_file(key, payload)
+            if payload is not None:
+                cls._memory[key] = payload
+        return payload
+
+    @classmethod
+    def _lock_for(cls, key):
+        with cls._guard:
+            lock = cls._locks.get(key)
+            if lock is None:
+                lock = cls._locks[key] = threading.Lock()
+            return lock
+
+    @classmethod
+    def _file_name(cls, key):
+        raise NotImplementedError
+
+    @classmethod
+    def _file_pattern(cls, owner_id):
+        """Glob matching every disk copy of an owner's payloads."""
+        raise NotImplementedError
+
+    @classmethod
+    def _folder(cls):
+        return current_app.config.get(cls.FOLDER_CONFIG) or os.path.join(current_app.instance_path, cls.FOLDER_DEFAULT)
+
+    @classmethod
+    def _path(cls, key):
+        return os.path.join(cls._folder(), cls._file_name(key))
+
+    @classmethod
+    def _load_file(cls, key):
+        if not cls.FOLDER_CONFIG:
+            return None
+        try:
+            with open(cls._path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def _write_file(cls, key, payload):
+        if payload is None or not cls.FOLDER_CONFIG:
+            return
+        path = cls._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, separators=(',', ':'))
+            os.replace(tmp_path, path)  # atomic: readers never see a half-written file
+        except OSError:
+            current_app.logger.exception("Could not write payload %s", path)
@@ -0,0 +1,258 @@
+import csv
+import io
+import secrets
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, insert, select, update
+
+from models import db, AdmissionVoucher, VoucherBatch
+from utils.schema import add_column, ensure_indexes
+
+# (pin, serial) authentication lookups, oldest-first picks by created_at, and batch exports
+VOUCHER_INDEXES = (
+    db.Index('ix_admission_voucher_pin_serial', AdmissionVoucher.pin, AdmissionVoucher.serial),
+    db.Index('ix_admission_voucher_created_at', AdmissionVoucher.created_at),
+    db.Index('ix_admission_voucher_batch_id', AdmissionVoucher.batch_id, AdmissionVoucher.id),
+)
+
+PIN_DIGITS = 10
+SERIAL_LENGTH = 10
+SERIAL_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'  # no 0/O or 1/I to misread
+MAX_BATCH = 100000
+PDF_PART = 4800  # vouchers per PDF file (200 pages of 24)
+
+
+class VoucherService:
+    """
+    Admission voucher lookup and bulk minting.
+
+    PINs and serials come from the secrets CSPRNG (one randbelow per code).
+    A batch is made unique in memory first, then checked against existing
+    vouchers with chunked IN queries; only the few that collide are redrawn
+    and rechecked. All rows go in with multi-row INSERTs in one
+    transaction, so a batch is minted completely or not at all.
+
+    Vouchers of a batch carry its id in batch_id, which is how exports find
+    them (CSV streamed, PDF in parts of PDF_PART); single vouchers sold
+    through purchase_voucher have none.
+    """
+
+    CHUNK = 5000
+
+    @staticmethod
+    def find(pin, serial):
+        """The voucher for a (pin, serial) pair, via the composite index."""
+        return AdmissionVoucher.query.filter_by(pin=(pin or '').strip(), serial=(serial or '').strip()).first()
+
+    @staticmethod
+    def codes(count):
+        """count (pin, serial) pairs unused by any existing voucher."""
+        pins = VoucherService._fresh(AdmissionVoucher.pin, VoucherService._pin, count)
+        serials = VoucherService._fresh(AdmissionVoucher.serial, VoucherService._serial, count)
+        return list(zip(pins, serials))
+
+    @staticmethod
+    def mint(count, amount, valid_days=None, created_by=None):
+        """Create a batch of count vouchers. Returns the VoucherBatch."""
+        count = min(max(int(count), 1), current_app.config.get('VOUCHER_MAX_BATCH', MAX_BATCH))
+        minted_at = datetime.utcnow()
+        valid_until = minted_at + timedelta(days=valid_days) if valid_days else None
+
+        batch = VoucherBatch(
+            minted_at=minted_at, count=count, amount=amount, valid_until=valid_until, created_by=created_by
+        )
+        db.session.add(batch)
+        db.session.flush()
+        rows = [{
+            "batch_id": batch.id,
+            "pin": pin,
+            "serial": serial,
+            "amount": amount,
+            "is_used": False,
+            "created_at": minted_at,
+            "valid_until": valid_until,
+        } for pin, serial in VoucherService.codes(count)]
+        try:
+            for start in range(0, len(rows), VoucherService.CHUNK):
+                db.session.execute(insert(AdmissionVoucher), rows[start:start + VoucherService.CHUNK])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        current_app.logger.info("Minted %s voucher(s) in batch %s", count, batch.id)
+        return batch
+
+    @staticmethod
+    def stats():
+        """{'total', 'used', 'unused'} from one GROUP BY."""
+        counts = dict(
+            db.session.query(AdmissionVoucher.is_used, func.count(AdmissionVoucher.id))
+            .group_by(AdmissionVoucher.is_used)
+            .all()
+        )
+        used = counts.get(True, 0)
+        total = sum(counts.values())
+        return {"total": total, "used": used, "unused": total - used}
+
+    @staticmethod
+    def csv_stream(batch):
+        """The batch as CSV, generated one partition at a time."""
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(['PIN', 'Serial', 'Amount', 'Valid Until', 'Used'])
+        yield buf.getvalue()
+        for partition in VoucherService._rows(batch).partitions():
+            buf.seek(0)
+            buf.truncate()
+            writer.writerows([
+                v.pin, v.serial, f"{v.amount:.2f}",
+                v.valid_until.strftime('%Y-%m-%d') if v.valid_until else '',
+                'Yes' if v.is_used else 'No',
+            ] for v in partition)
+            yield buf.getvalue()
+
+    @staticmethod
+    def pdf_parts(batch):
+        return max((batch.count + PDF_PART - 1) // PDF_PART, 1)
+
+    @staticmethod
+    def pdf(batch, part=1):
+        """One part of the batch as printable voucher cards (24 per A4 page). Returns a BytesIO."""
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import mm
+        from reportlab.pdfgen import canvas
+
+        cols, rows_per_page = 3, 8
+        page_w, page_h = A4
+        margin = 10 * mm
+        card_w = (page_w - 2 * margin) / cols
+        card_h = (page_h - 2 * margin) / rows_per_page
+
+        vouchers = db.session.execute(
+            select(AdmissionVoucher.pin, AdmissionVoucher.serial, AdmissionVoucher.amount, AdmissionVoucher.valid_until)
+            .where(AdmissionVoucher.batch_id == batch.id)
+            .order_by(AdmissionVoucher.id)
+            .offset((part - 1) * PDF_PART)
+            .limit(PDF_PART)
+            .execution_options(yield_per=1000)
+        )
+
+        out = io.BytesIO()
+        pdf = canvas.Canvas(out, pagesize=A4, pageCompression=1)
+        pdf.setTitle(f"Admission vouchers - batch {batch.id} part {part}")
+        slot = 0
+        for v in vouchers:
+            if slot == cols * rows_per_page:
+                pdf.showPage()
+                slot = 0
+            x = margin + (slot % cols) * card_w
+            y = page_h - margin - (slot // cols + 1) * card_h
+            pdf.setDash(2, 2)
+            pdf.rect(x, y, card_w, card_h)
+            pdf.setDash()
+            pdf.setFont('Helvetica-Bold', 9)
+            pdf.drawString(x + 4 * mm, y + card_h - 7 * mm, "ADMISSION VOUCHER")
+            pdf.setFont('Helvetica', 8)
+            pdf.drawString(x + 4 * mm, y + card_h - 13 * mm, f"PIN:    {v.pin}")
+            pdf.drawString(x + 4 * mm, y + card_h - 18 * mm, f"Serial: {v.serial}")
+            pdf.drawString(x + 4 * mm, y + card_h - 23 * mm, f"GHS {v.amount:.2f}")
+            if v.valid_until:
+                pdf.drawString(x + 4 * mm, y + card_h - 28 * mm, f"Valid until {v.valid_until:%d %b %Y}")
+            slot += 1
+        pdf.save()
+        out.seek(0)
+        return out
+
+    @staticmethod
+    def ensure_indexes():
+        """Create the voucher indexes on databases created before they existed."""
+        return ensure_indexes(VOUCHER_INDEXES)
+
+    @staticmethod
+    def ensure_column():
+        """Add AdmissionVoucher.batch_id on older databases and fill it. True if added."""
+        if not add_column(AdmissionVoucher.__tablename__, 'batch_id', 'INTEGER REFERENCES voucher_batch(id)'):
+            return False
+        VoucherService.backfill_batches()
+        return True
+
+    @staticmethod
+    def backfill_batches():
+        """
+        Link vouchers minted before batch_id existed to their batch. Batches
+        used to be matched on created_at == minted_at; where truncated
+        timestamps make batches share one, each batch takes its count of the
+        lowest unassigned ids, in batch order (a batch's rows were inserted
+        right after it). Returns the number of vouchers linked.
+        """
+        linked = 0
+        for batch in VoucherBatch.query.order_by(VoucherBatch.id).all():
+            ids = db.session.scalars(
+                select(AdmissionVoucher.id)
+                .where(AdmissionVoucher.batch_id.is_(None), AdmissionVoucher.created_at == batch.minted_at)
+                .order_by(AdmissionVoucher.id)
+                .limit(batch.count)
+            ).all()
+            for start in range(0, len(ids), VoucherService.CHUNK):
+                db.session.execute(
+                    update(AdmissionVoucher)
+                    .where(AdmissionVoucher.id.in_(ids[start:start + VoucherService.CHUNK]))
+                    .values(batch_id=batch.id)
+                )
+            linked += len(ids)
+        db.session.commit()
+        return linked
+
+    # ---------------- HELPERS ---------------- #
+
+    @staticmethod
+    def _pin():
+        return f"{secrets.randbelow(10 ** PIN_DIGITS):0{PIN_DIGITS}d}"
+
+    @staticmethod
+    def _serial():
+        n = secrets.randbelow(len(SERIAL_ALPHABET) ** SERIAL_LENGTH)
+        chars = []
+        for _ in range(SERIAL_LENGTH):
+            n, i = divmod(n, len(SERIAL_ALPHABET))
+            chars.append(SERIAL_ALPHABET[i])
+        return ''.join(chars)
+
+    @staticmethod
+    def _fresh(column, draw, count):
+        """count distinct values from draw() that are not already in column."""
+        values = set()
+        pending = set()
+        while len(values) < count:
+            value = draw()
+            if value not in values:
+                values.add(value)
+                pending.add(value)
+        # recheck only what is new each round; collisions are rare, so this ends quickly
+        while pending:
+            taken = set()
+            pending = list(pending)
+            for start in range(0, len(pending), VoucherService.CHUNK):
+                chunk = pending[start:start + VoucherService.CHUNK]
+                taken.update(v for (v,) in db.session.execute(select(column).where(column.in_(chunk))))
+            values -= taken
+            pending = set()
+            while len(values) < count:
+                value = draw()
+                if value not in values:
+                    values.add(value)
+                    pending.add(value)
+        return list(values)
+
+    @staticmethod
+    def _rows(batch):
+        return db.session.execute(
+            select(
+                AdmissionVoucher.pin, AdmissionVoucher.serial, AdmissionVoucher.amount,
+                AdmissionVoucher.valid_until, AdmissionVoucher.is_used,
+            )
+            .where(AdmissionVoucher.batch_id == batch.id)
+            .order_by(AdmissionVoucher.id)
+            .execution_options(yield_per=VoucherService.CHUNK, stream_results=True)
+        )
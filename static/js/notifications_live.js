@@ -0,0 +1,110 @@
+// static/js/notifications_live.js
+// Live notification badges and lists over Socket.IO.
+//
+// Server events (sent to the user_<public_id> room joined on connect):
+//   'notification'        -> a new notification {id, type, title, preview, created_at}
+//   'notification_count'  -> the user's unread count after a read/delete {unread}
+//
+// Badges: any element with .js-unread-count.
+// Lists:  #live-notification-list (inside an optional .js-live-container
+//         that starts hidden when empty) with data-mode="flat" (one row per
+//         notification) or data-mode="grouped" (one row per title), plus
+//         data-item-url / data-group-url containing __ID__ / __TITLE__.
+// Optional: data-count-url on this script tag to resync after a reconnect.
+(function () {
+  if (typeof io !== 'function') return;
+
+  const script = document.currentScript;
+  const countUrl = script && script.dataset.countUrl;
+  const socket = io();
+
+  function setBadges(count) {
+    document.querySelectorAll('.js-unread-count').forEach(badge => {
+      badge.textContent = count;
+      badge.style.display = count > 0 ? '' : 'none';
+    });
+  }
+
+  function bumpBadges() {
+    const badge = document.querySelector('.js-unread-count');
+    setBadges((parseInt(badge && badge.textContent, 10) || 0) + 1);
+  }
+
+  function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text == null ? '' : String(text);
+    return div.innerHTML;
+  }
+
+  function formatDate(iso) {
+    if (!iso) return '';
+    const d = new Date(iso.endsWith('Z') ? iso : iso + 'Z');
+    return d.toLocaleString(undefined, { day: '2-digit', month: 'short', year: 'numeric', hour: '2-digit', minute: '2-digit' });
+  }
+
+  function addToList(n) {
+    const list = document.getElementById('live-notification-list');
+    if (!list) return;
+    document.querySelectorAll('.js-notifications-empty').forEach(el => el.remove());
+    const container = list.closest('.js-live-container');
+    if (container) container.classList.remove('d-none');
+
+    if (list.dataset.mode === 'grouped') {
+      const existing = Array.from(list.querySelectorAll('[data-group-title]'))
+        .find(el => el.dataset.groupTitle === n.title);
+      if (existing) {
+        const badge = existing.querySelector('.js-group-unread');
+        if (badge) {
+          const count = (parseInt(badge.dataset.count, 10) || 0) + 1;
+          badge.dataset.count = count;
+          badge.className = 'badge bg-warning text-dark px-3 py-2 rounded-pill shadow-sm js-group-unread';
+          badge.textContent = count + ' new';
+        }
+        const meta = existing.querySelector('.js-group-meta');
+        if (meta) meta.textContent = formatDate(n.created_at) + ' · ' + n.preview;
+        list.prepend(existing);
+        return;
+      }
+      const url = (list.dataset.groupUrl || '#').replace('__TITLE__', encodeURIComponent(n.title));
+      const item = document.createElement('div');
+      item.className = 'list-group-item py-3 px-4 d-flex justify-content-between align-items-center group-hover';
+      item.dataset.groupTitle = n.title;
+      item.innerHTML =
+        '<a href="' + url + '" class="text-decoration-none text-dark flex-grow-1">' +
+          '<div class="fw-semibold mb-1">' + escapeHtml(n.title) + '</div>' +
+          '<div class="small text-muted js-group-meta">' + escapeHtml(formatDate(n.created_at) + ' · ' + n.preview) + '</div>' +
+        '</a>' +
+        '<div class="text-end ms-3"><span class="badge bg-warning text-dark px-3 py-2 rounded-pill shadow-sm js-group-unread" data-count="1">1 new</span></div>';
+      list.prepend(item);
+      return;
+    }
+
+    const url = (list.dataset.itemUrl || '#').replace('__ID__', n.id);
+    const item = document.createElement('li');
+    item.className = 'list-group-item d-flex justify-content-between align-items-start list-group-item-warning';
+    item.innerHTML =
+      '<div class="me-3">' +
+        '<div class="fw-bold">' + escapeHtml(n.title) + '</div>' +
+        '<div class="small text-muted">' + escapeHtml(formatDate(n.created_at) + ' · ' + n.preview) + '</div>' +
+      '</div>' +
+      '<div class="btn-group btn-group-sm"><a href="' + url + '" class="btn btn-outline-primary">View</a></div>';
+    list.prepend(item);
+  }
+
+  socket.on('notification', n => {
+    bumpBadges();
+    addToList(n);
+  });
+
+  socket.on('notification_count', data => setBadges(Math.max(data.unread, 0)));
+
+  if (countUrl) {
+    // catch up on anything missed while disconnected
+    socket.on('connect', () => {
+      fetch(countUrl)
+        .then(res => res.ok ? res.json() : null)
+        .then(data => { if (data) setBadges(data.unread_count); })
+        .catch(() => {});
+    });
+  }
+})();
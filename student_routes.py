@@ -21,6 +21,8 @@ import qrcode
 from PIL import Image, ImageDraw
 import textwrap
 from utils.extensions import db
+from services.notification_counter_service import NotificationCounterService
+from services.notification_inbox_service import NotificationInboxService
 from utils.result_builder import ResultBuilder
 from utils.results_manager import ResultManager
 from utils.result_templates import get_template_path
@@ -56,18 +58,15 @@ def dashboard():
 def inject_notification_count():
     unread_count = 0
     if current_user.is_authenticated:
-        from models import NotificationRecipient
+        from services.notification_counter_service import NotificationCounterService
 
         if hasattr(current_user, "user_id"):  
-            # Regular User (student, teacher, parent)
-            unread_count = NotificationRecipient.query.filter_by(
-                user_id=current_user.user_id,
-                is_read=False
-            ).count()
+            # Regular User (student, teacher, parent): cached counter row
+            unread_count = NotificationCounterService.get(current_user.user_id)
 
         elif hasattr(current_user, "admin_id"):  
             # Admin → get all unread notifications
-            unread_count = NotificationRecipient.query.filter_by(is_read=False).count()
+            unread_count = NotificationCounterService.global_unread()
 
     return dict(unread_count=unread_count)
 
@@ -861,28 +860,14 @@ def student_notifications():
     """
     Show grouped notifications by title/category.
     """
-    recipients = (
-        NotificationRecipient.query
-        .join(Notification, Notification.id == NotificationRecipient.notification_id)
-        .filter(NotificationRecipient.user_id == current_user.user_id)
-        .order_by(Notification.created_at.desc())
-        .all()
-    )
-
-    grouped = defaultdict(list)
-    for r in recipients:
-        grouped[r.notification.title].append(r)
-
-    # sort groups by most recent notification
-    grouped_notifications = sorted(
-        grouped.items(),
-        key=lambda g: g[1][0].notification.created_at,
-        reverse=True
+    grouped_notifications, next_before = NotificationInboxService.groups(
+        current_user.user_id, before=request.args.get('before', type=int)
     )
 
     return render_template(
         'student/notifications.html',
-        grouped_notifications=grouped_notifications
+        grouped_notifications=grouped_notifications,
+        next_before=next_before
     )
 
 @student_bp.route('/notifications/group/<string:title>')
@@ -891,23 +876,17 @@ def view_notification_group(title):
     """
     Show all notifications under a single title group.
     """
-    recipients = (
-        NotificationRecipient.query
-        .join(Notification, Notification.id == NotificationRecipient.notification_id)
-        .filter(NotificationRecipient.user_id == current_user.user_id,
-                Notification.title == title)
-        .order_by(Notification.created_at.desc())
-        .all()
-    )
+    # mark all as read (one UPDATE)
+    if NotificationInboxService.mark_group_read(current_user.user_id, title):
+        db.session.commit()
+        NotificationCounterService.publish([current_user.user_id])
 
-    # mark all as read
-    for r in recipients:
-        if not r.is_read:
-            r.is_read = True
-            r.read_at = datetime.utcnow()
-    db.session.commit()
+    recipients, next_before = NotificationInboxService.items(
+        current_user.user_id, title=title, before=request.args.get('before', type=int)
+    )
 
-    return render_template('student/notification_detail.html', title=title, recipients=recipients)
+    return render_template('student/notification_detail.html', title=title,
+                           recipients=recipients, next_before=next_before)
 
 
 @student_bp.route('/notifications/mark_read/<int:recipient_id>', methods=['POST'])
@@ -920,10 +899,22 @@ def mark_notification_read(recipient_id):
     if not recipient.is_read:
         recipient.is_read = True
         recipient.read_at = datetime.utcnow()
+        NotificationCounterService.adjust(current_user.user_id, -1)
         db.session.commit()
+        NotificationCounterService.publish([current_user.user_id])
 
     return jsonify({"success": True, "id": recipient_id})
 
+@student_bp.route('/notifications/mark_all_read', methods=['POST'])
+@login_required
+def mark_all_notifications_read():
+    changed = NotificationInboxService.mark_group_read(current_user.user_id)
+    if changed:
+        db.session.commit()
+        NotificationCounterService.publish([current_user.user_id])
+
+    return jsonify({"success": True, "updated": changed})
+
 @student_bp.route('/notifications/delete/<int:recipient_id>', methods=['POST'])
 @login_required
 def delete_notification(recipient_id):
@@ -934,8 +925,13 @@ def delete_notification(recipient_id):
         id=recipient_id, user_id=current_user.user_id
     ).first_or_404()
 
+    was_unread = not recipient.is_read
     db.session.delete(recipient)
+    if was_unread:
+        NotificationCounterService.adjust(current_user.user_id, -1)
     db.session.commit()
+    if was_unread:
+        NotificationCounterService.publish([current_user.user_id])
 
     return jsonify({"success": True, "id": recipient_id})
 
@@ -945,25 +941,17 @@ def delete_notification_group(title):
     """
     Delete all notifications under a given title for the current user.
     """
-    recipients = (
-        NotificationRecipient.query
-        .join(Notification, Notification.id == NotificationRecipient.notification_id)
-        .filter(
-            NotificationRecipient.user_id == current_user.user_id,
-            Notification.title == title
-        )
-        .all()
-    )
+    deleted, unread = NotificationInboxService.delete_group(current_user.user_id, title)
 
-    if not recipients:
+    if not deleted:
+        db.session.rollback()
         return jsonify({'success': False, 'message': 'No notifications found'}), 404
 
-    # Delete each recipient entry
-    for r in recipients:
-        db.session.delete(r)
     db.session.commit()
+    if unread:
+        NotificationCounterService.publish([current_user.user_id])
 
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'deleted': deleted})
 
 
 def format_time(t):
@@ -2,7 +2,7 @@
 Teacher Blueprint
 All database queries happen inside route handlers, not at import time.
 """
-from flask import Blueprint, render_template, abort, flash, redirect, url_for, request, jsonify, current_app
+from flask import Blueprint, render_template, abort, flash, redirect, url_for, request, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user, login_user
 from models import (
     CourseAssessmentScheme, Meeting, QuizAttempt, TeacherProfile, Course,
@@ -19,7 +19,11 @@ from sqlalchemy.orm import joinedload
 from collections import defaultdict
 from utils.extensions import db
 from utils.notifications import create_assignment_notification
-import os, uuid, requests
+from services.item_analysis import ItemAnalysisService
+from services.attendance_service import AttendanceService
+from services.attendance_summary_service import AttendanceSummaryService
+from services.results_report_service import ResultsReportService, RESULT_TYPES
+import os, uuid, requests, json
 
 teacher_bp = Blueprint("teacher", __name__, url_prefix="/teacher")
 
@@ -393,60 +397,26 @@ def attendance():
     except ValueError:
         selected_date = today
 
-    # 3️⃣ Students in that class
-    students = []
-    if selected_class:
-        students = (
-            User.query
-                .join(StudentProfile, StudentProfile.user_id == User.user_id)
-                .filter(StudentProfile.current_class == selected_class)
-                .order_by(User.last_name)
-                .all()
-        )
+    # 3️⃣ Students in that class (cached roster)
+    students = AttendanceService.roster(selected_class) if selected_class else []
 
-    # 4️⃣ Already‐recorded student IDs on that date
-    existing_records = {
-        r.student_id
-        for r in AttendanceRecord.query.filter(
-            and_(
-                AttendanceRecord.teacher_id == teacher.id,
-                AttendanceRecord.date == selected_date
-            )
-        )
-    }
+    # 4️⃣ Already‐recorded marks on that date: student_id -> is_present
+    existing_records = AttendanceService.recorded(teacher.id, selected_date)
 
-    # 5️⃣ AcademicCalendar: fetch all break entries
-    #    assume AcademicCalendar has `date` (Date) and `break_type` (str)
-    cal_entries = AcademicCalendar.query.with_entities(
-        AcademicCalendar.date, AcademicCalendar.break_type
-    ).all()
-    # build dict: "YYYY-MM-DD" -> break_type
-    disabled_dates = {
-        entry.date.isoformat(): entry.break_type
-        for entry in cal_entries
-    }
+    # 5️⃣ AcademicCalendar break days (cached): "YYYY-MM-DD" -> break_type
+    disabled_dates = AttendanceService.disabled_dates()
 
-    # 6️⃣ Handle form POST
+    # 6️⃣ Handle form POST: one upsert for the whole sheet
     if request.method == 'POST' and request.form.get('action') == 'submit_attendance':
-        inserted = duplicates = 0
-        for student in students:
-            if student.id in existing_records:
-                duplicates += 1
-                continue
-            present = bool(request.form.get(f'attend_{student.id}'))
-            db.session.add(AttendanceRecord(
-                student_id=student.id,
-                teacher_id=teacher.id,
-                date=selected_date,
-                is_present=present
-            ))
-            inserted += 1
-        db.session.commit()
+        inserted, updated = AttendanceService.save(teacher.id, [
+            (student['id'], selected_date, bool(request.form.get(f"attend_{student['id']}")))
+            for student in students
+        ])
 
         if inserted:
             flash(f"{inserted} new record(s) saved.", "success")
-        if duplicates:
-            flash(f"{duplicates} student(s) already marked and skipped.", "warning")
+        if updated:
+            flash(f"{updated} existing record(s) updated.", "info")
 
         return redirect(url_for('teacher.attendance',
                                 classSelect=selected_class,
@@ -462,6 +432,64 @@ def attendance():
         disabled_dates=disabled_dates
     )
 
+@teacher_bp.route('/attendance/sync', methods=['POST'])
+@login_required
+def sync_attendance():
+    """
+    Bulk attendance from offline devices, several days per request:
+    {"days": [{"date": "YYYY-MM-DD", "class": "JHS 1", "attendance": {"<student id>": true}}]}
+    """
+    if current_user.role != 'teacher':
+        abort(403)
+
+    teacher = TeacherProfile.query.filter_by(user_id=current_user.user_id).first_or_404()
+    classes = {a.course.assigned_class for a in teacher.assignments}
+
+    data = request.get_json(silent=True) or {}
+    days = data.get('days')
+    if not isinstance(days, list) or not days:
+        return jsonify({'ok': False, 'error': 'days must be a non-empty list'}), 400
+    max_days = current_app.config.get('ATTENDANCE_SYNC_MAX_DAYS', 31)
+    if len(days) > max_days:
+        return jsonify({'ok': False, 'error': f'at most {max_days} days per request'}), 400
+
+    today = datetime.utcnow().date()
+    breaks = AttendanceService.disabled_dates()
+    marks, rejected = [], []
+
+    for index, day in enumerate(days):
+        day = day if isinstance(day, dict) else {}
+        class_name = day.get('class')
+        day_date = AttendanceService.parse_date(day.get('date'))
+        day_marks = day.get('attendance')
+
+        if day_date is None or day_date > today:
+            rejected.append({'day': index, 'error': 'invalid date'})
+            continue
+        if day_date.isoformat() in breaks:
+            rejected.append({'day': index, 'error': f"{breaks[day_date.isoformat()]} on {day_date.isoformat()}"})
+            continue
+        if class_name not in classes:
+            rejected.append({'day': index, 'error': 'class not assigned to you'})
+            continue
+        if not isinstance(day_marks, dict):
+            rejected.append({'day': index, 'error': 'attendance must be an object'})
+            continue
+
+        on_roster = {student['id'] for student in AttendanceService.roster(class_name)}
+        for student_id, present in day_marks.items():
+            try:
+                student_id = int(student_id)
+            except (TypeError, ValueError):
+                student_id = None
+            if student_id not in on_roster:
+                rejected.append({'day': index, 'student_id': student_id, 'error': 'student not in class'})
+                continue
+            marks.append((student_id, day_date, bool(present)))
+
+    inserted, updated = AttendanceService.save(teacher.id, marks)
+    return jsonify({'ok': True, 'inserted': inserted, 'updated': updated, 'rejected': rejected})
+
 @teacher_bp.route('/view-attendance')
 @login_required
 def view_attendance():
@@ -478,41 +506,24 @@ def view_attendance():
         except ValueError:
             selected_date = None
 
-    # 1. Get all distinct dates for the selected class
-    date_query = db.session.query(AttendanceRecord.date).filter(AttendanceRecord.teacher_id == teacher.id)
-    if selected_class:
-        date_query = date_query.join(User, User.id == AttendanceRecord.student_id) \
-                               .join(StudentProfile, StudentProfile.user_id == User.user_id) \
-                               .filter(StudentProfile.current_class == selected_class)
-    date_list = [d[0] for d in date_query.distinct().order_by(AttendanceRecord.date).all()]
-
-    # 2. Get students for the selected class
-    student_query = db.session.query(User.id, User.first_name, User.middle_name, User.last_name, StudentProfile.current_class) \
-        .join(StudentProfile, StudentProfile.user_id == User.user_id) \
-        .join(AttendanceRecord, AttendanceRecord.student_id == User.id) \
-        .filter(AttendanceRecord.teacher_id == teacher.id)
-    if selected_class:
-        student_query = student_query.filter(StudentProfile.current_class == selected_class)
-    students = student_query.distinct().order_by(User.last_name, User.first_name).all()
+    page = request.args.get('page', 1, type=int)
+    AttendanceSummaryService.ensure_built(teacher.id)
 
-    # 3. Get attendance records filtered by date and/or class
-    attendance_query = db.session.query(AttendanceRecord.student_id, AttendanceRecord.date, AttendanceRecord.is_present) \
-        .filter(AttendanceRecord.teacher_id == teacher.id)
-    if selected_class:
-        attendance_query = attendance_query.join(User, User.id == AttendanceRecord.student_id) \
-                                           .join(StudentProfile, StudentProfile.user_id == User.user_id) \
-                                           .filter(StudentProfile.current_class == selected_class)
-    if selected_date:
-        attendance_query = attendance_query.filter(AttendanceRecord.date == selected_date)
-    attendance_records = attendance_query.all()
+    # 1. Class filter and date list come from the day rollups
+    class_list = AttendanceSummaryService.classes(teacher.id)
+    date_list = AttendanceSummaryService.dates(teacher.id, selected_class or None)
 
-    # 4. Attendance map for Excel-style table
+    # 2. Excel-style matrix from the monthly bitmaps
+    _, student_list, cells = AttendanceSummaryService.matrix(
+        teacher.id, start=selected_date, end=selected_date, class_name=selected_class or None
+    )
     attendance_map = defaultdict(lambda: 0)
-    for student_id, date, is_present in attendance_records:
-        attendance_map[(student_id, date)] = 1 if is_present else 0
+    for student_id, marks in cells.items():
+        for day, value in marks.items():
+            attendance_map[(student_id, day)] = value
 
-    # 5. Records list for standard table
-    records_query = db.session.query(AttendanceRecord.date, StudentProfile.current_class, 
+    # 3. Records list for standard table, one page at a time
+    records_query = db.session.query(AttendanceRecord.date, StudentProfile.current_class,
                                      User.first_name, User.middle_name, User.last_name, AttendanceRecord.is_present) \
         .join(User, User.id == AttendanceRecord.student_id) \
         .join(StudentProfile, StudentProfile.user_id == User.user_id) \
@@ -521,28 +532,15 @@ def view_attendance():
         records_query = records_query.filter(StudentProfile.current_class == selected_class)
     if selected_date:
         records_query = records_query.filter(AttendanceRecord.date == selected_date)
-    records_query = records_query.order_by(AttendanceRecord.date)
+    pagination = records_query.order_by(AttendanceRecord.date, User.last_name).paginate(
+        page=page, per_page=current_app.config.get('ATTENDANCE_PAGE_SIZE', 100), error_out=False
+    )
     formatted_records = [{
         'date': r.date,
         'current_class': r.current_class,
         'full_name': " ".join(filter(None, [r.first_name, r.middle_name, r.last_name])),
         'is_present': r.is_present
-    } for r in records_query.all()]
-
-    # 6. Class list for filter
-    class_options = db.session.query(StudentProfile.current_class) \
-        .join(User, User.user_id == StudentProfile.user_id) \
-        .join(AttendanceRecord, AttendanceRecord.student_id == User.id) \
-        .filter(AttendanceRecord.teacher_id == teacher.id) \
-        .distinct().order_by(StudentProfile.current_class).all()
-    class_list = [c[0] for c in class_options]
-
-    # 7. Student list for Excel view
-    student_list = [{
-        'id': s.id,
-        'full_name': " ".join(filter(None, [s.first_name, s.middle_name, s.last_name])),
-        'current_class': s.current_class
-    } for s in students]
+    } for r in pagination.items]
 
     return render_template(
         'teacher/view_attendance.html',
@@ -552,9 +550,31 @@ def view_attendance():
         classes=class_list,
         selected_class=selected_class,
         selected_date=selected_date,
-        records=formatted_records
+        records=formatted_records,
+        pagination=pagination,
+        class_summary=AttendanceSummaryService.class_summary(teacher.id)
     )
 
+
+@teacher_bp.route('/attendance/pivot')
+@login_required
+def attendance_pivot():
+    """Compact attendance matrix for a date range: ?classSelect=&start=YYYY-MM-DD&end=YYYY-MM-DD"""
+    if current_user.role != 'teacher':
+        abort(403)
+
+    teacher = TeacherProfile.query.filter_by(user_id=current_user.user_id).first_or_404()
+    AttendanceSummaryService.ensure_built(teacher.id)
+
+    start = AttendanceService.parse_date(request.args.get('start'))
+    end = AttendanceService.parse_date(request.args.get('end'))
+    if start and end and start > end:
+        return jsonify({'error': 'start must not be after end'}), 400
+
+    return jsonify(AttendanceSummaryService.pivot(
+        teacher.id, start=start, end=end, class_name=request.args.get('classSelect') or None
+    ))
+
 @teacher_bp.route('/calendar')
 @login_required
 def calendar():
@@ -685,6 +705,35 @@ def reports():
     
     return render_template('teacher/reports.html', classes=classes, years=years)
 
+# Item analysis (difficulty, discrimination, distractors, reliability) as JSON for dashboards.
+# GET returns the last computed statistics; POST folds in new submissions first.
+@teacher_bp.route('/analytics/<string:kind>/<int:assessment_id>', methods=['GET', 'POST'])
+@login_required
+def item_analysis(kind, assessment_id):
+    if current_user.role not in ('teacher', 'admin'):
+        abort(403)
+    if kind not in ('quiz', 'exam'):
+        abort(404)
+
+    assessment = (Quiz if kind == 'quiz' else Exam).query.get_or_404(assessment_id)
+
+    # Ensure teacher is registered for the assessment's course
+    if current_user.role == 'teacher':
+        profile = TeacherProfile.query.filter_by(user_id=current_user.user_id).first()
+        if not profile or assessment.course_id not in {a.course_id for a in profile.assignments}:
+            abort(403)
+
+    if request.method == 'POST':
+        stats = ItemAnalysisService.refresh(kind, assessment_id, full=request.args.get('full') == '1')
+    else:
+        stats = ItemAnalysisService.get(kind, assessment_id)
+    return jsonify({
+        "kind": kind,
+        "assessment_id": assessment_id,
+        "computed_at": stats.computed_at.isoformat() if stats and stats.computed_at else None,
+        **json.loads(stats.results if stats and stats.results else '{}')
+    })
+
 @teacher_bp.route('/results/combined')
 @login_required
 def view_results_combined():
@@ -697,110 +746,55 @@ def view_results_combined():
         )
 
     # Assigned courses
-    assignments = TeacherCourseAssignment.query.filter_by(teacher_id=teacher_profile.id).all()
-    course_ids = [a.course_id for a in assignments]
+    course_ids = ResultsReportService.course_ids(teacher_profile.id)
     if not course_ids:
         return render_template(
             'teacher/view_results_combined.html',
             results=[], courses=[], message="No courses assigned yet."
         )
 
-    courses = Course.query.filter(Course.id.in_(course_ids)).all()
-    course_names = [c.name for c in courses]
-
-    combined = []
-
-    for course in courses:
-        # Get scheme for this course (teacher-specific)
-        scheme = CourseAssessmentScheme.query.filter_by(course_id=course.id, teacher_id=teacher_profile.id).first()
-
-        # --- Quizzes (QuizAttempt model) ---
-        quiz_attempts = (
-            db.session.query(QuizAttempt, Quiz, User)
-            .join(Quiz, Quiz.id == QuizAttempt.quiz_id)
-            .join(User, User.id == QuizAttempt.student_id)
-            .filter(Quiz.course_name == course.name)
-            .all()
-        )
-        for attempt, quiz, user in quiz_attempts:
-            raw_score = float(getattr(attempt, "score", 0) or 0)
-            weighted_score = (raw_score * scheme.quiz_weight / 100) if scheme else None
-            combined.append({
-                "type": "Quiz",
-                "course": course.name,
-                "student": f"{user.first_name} {user.last_name}",
-                "score": raw_score,                           # legacy/raw field
-                "date": getattr(attempt, "submitted_at", None) or getattr(attempt, "created_at", None),
-                "raw_score": raw_score,
-                "weight_percent": scheme.quiz_weight if scheme else None,
-                "weighted_score": weighted_score
-            })
-
-        # --- Exams (ExamSubmission model) ---
-        exam_subs = (
-            db.session.query(ExamSubmission, Exam, User)
-            .join(Exam, Exam.id == ExamSubmission.exam_id)
-            .join(User, User.id == ExamSubmission.student_id)
-            .filter(Exam.course_id == course.id)
-            .all()
-        )
-        for sub, exam, user in exam_subs:
-            raw_score = float(getattr(sub, "score", 0) or 0)
-            weighted_score = (raw_score * scheme.exam_weight / 100) if scheme else None
-            combined.append({
-                "type": "Exam",
-                "course": course.name,
-                "student": f"{user.first_name} {user.last_name}",
-                "score": raw_score,
-                "date": getattr(sub, "submitted_at", None) or getattr(sub, "created_at", None),
-                "raw_score": raw_score,
-                "weight_percent": scheme.exam_weight if scheme else None,
-                "weighted_score": weighted_score
-            })
-
-        # --- Assignments (AssignmentSubmission model) ---
-        assignment_subs = (
-            db.session.query(AssignmentSubmission, Assignment, User)
-            .join(Assignment, Assignment.id == AssignmentSubmission.assignment_id)
-            .join(User, User.id == AssignmentSubmission.student_id)
-            .filter(Assignment.course_id == course.id)
-            .all()
-        )
-        for sub, assignment, user in assignment_subs:
-            raw_score = float(getattr(sub, "score", 0) or 0)
-            weighted_score = (raw_score * scheme.assignment_weight / 100) if scheme else None
-            combined.append({
-                "type": "Assignment",
-                "course": course.name,
-                "student": f"{user.first_name} {user.last_name}",
-                "score": raw_score,
-                "date": getattr(sub, "submitted_at", None) or getattr(sub, "created_at", None),
-                "raw_score": raw_score,
-                "weight_percent": scheme.assignment_weight if scheme else None,
-                "weighted_score": weighted_score
-            })
-
-    # Format datetime for display and sort by datetime (newest first)
-    for r in combined:
-        if r["date"]:
-            # ensure it's a datetime before strftime — handle strings if needed
-            try:
-                r["date"] = r["date"].strftime("%Y-%m-%d %H:%M")
-            except Exception:
-                # keep as-is if not datetime
-                r["date"] = str(r["date"])
-        else:
-            r["date"] = ""
+    courses = Course.query.filter(Course.id.in_(course_ids)).order_by(Course.name).all()
+    filters = _results_filters()
+    page = request.args.get('page', 1, type=int)
+    per_page = current_app.config.get('RESULTS_PAGE_SIZE', 50)
 
-    combined.sort(key=lambda r: r.get("date") or "", reverse=True)
+    results, total = ResultsReportService.page(teacher_profile.id, page=page, per_page=per_page, **filters)
 
     return render_template(
         'teacher/view_results_combined.html',
-        results=combined,
-        courses=course_names,
+        results=results,
+        courses=courses,
+        filters=filters,
+        page=page,
+        per_page=per_page,
+        total=total,
+        pages=max(1, -(-total // per_page)),
         message=None
     )
 
+@teacher_bp.route('/results/combined.csv')
+@login_required
+def export_results_combined():
+    """Stream the filtered results as CSV."""
+    teacher_profile = TeacherProfile.query.filter_by(user_id=current_user.user_id).first_or_404()
+    filename = f"results_{datetime.utcnow().strftime('%Y%m%d_%H%M')}.csv"
+    return Response(
+        stream_with_context(ResultsReportService.iter_csv(teacher_profile.id, **_results_filters())),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+def _results_filters():
+    """Filters for the results report from the query string."""
+    result_type = request.args.get('type', '')
+    return {
+        'result_type': result_type if result_type in RESULT_TYPES else None,
+        'course_id': request.args.get('course_id', type=int),
+        'search': request.args.get('search', '').strip() or None,
+        'sort': request.args.get('sort', 'submitted_at'),
+        'direction': 'asc' if request.args.get('direction') == 'asc' else 'desc',
+    }
+
 @teacher_bp.route("/course/<int:course_id>/grading", methods=["GET", "POST"])
 @login_required
 def course_grading(course_id):
@@ -2,7 +2,8 @@
 import csv
 import os
 from datetime import datetime
-from models import StudentProfile, User  # adjust import if models are elsewhere
+from sqlalchemy import select
+from models import db, StudentProfile, User  # adjust import if models are elsewhere
 
 def generate_quiz_csv_backup(quiz_data, questions_data, backup_dir='backups'):
     os.makedirs(backup_dir, exist_ok=True)
@@ -40,20 +41,29 @@ def backup_students_to_csv(backup_dir='backups'):
     filename = f'student_backup_{timestamp}.csv'
     path = os.path.join(backup_dir, filename)
 
-    students = StudentProfile.query.all()
+    # one joined, streamed query instead of loading every profile and its user
+    rows = db.session.execute(
+        select(
+            StudentProfile.user_id, User.first_name, User.middle_name, User.last_name, User.email,
+            StudentProfile.current_class, StudentProfile.gender, StudentProfile.date_of_birth,
+        )
+        .join(User, User.user_id == StudentProfile.user_id)
+        .order_by(StudentProfile.user_id)
+        .execution_options(yield_per=2000, stream_results=True)
+    )
 
     with open(path, mode='w', newline='', encoding='utf-8') as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(['User ID', 'Full Name', 'Email', 'Current Class', 'Gender', 'Date of Birth'])
 
-        for s in students:
-            writer.writerow([
-                s.user_id,
-                s.user.full_name,
-                s.user.email,
-                s.current_class,
-                s.gender,
-                s.date_of_birth.strftime('%Y-%m-%d') if s.date_of_birth else '',
-            ])
+        for partition in rows.partitions():
+            writer.writerows([
+                r.user_id,
+                " ".join(filter(None, [r.first_name, r.middle_name, r.last_name])),
+                r.email,
+                r.current_class,
+                r.gender,
+                r.date_of_birth.strftime('%Y-%m-%d') if r.date_of_birth else '',
+            ] for r in partition)
 
     return filename
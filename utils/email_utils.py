@@ -1,18 +1,16 @@
-from flask import current_app, url_for
-from flask_mailman import EmailMessage
+from flask import url_for
 
+from services.email_outbox_service import EmailOutboxService
 
-def send_email(to_email, subject, body):
+
+def send_email(to_email, subject, body, category=None):
     """
-    Send an email using Flask-Mailman.
+    Queue an email in the outbox as part of the current transaction; it is
+    only sent once the caller commits. The outbox worker delivers it (with
+    retries) over a reused SMTP connection. Returns True once queued.
     """
-    msg = EmailMessage(
-        subject=subject,
-        body=body,
-        from_email=current_app.config['MAIL_DEFAULT_SENDER'],
-        to=[to_email]
-    )
-    msg.send()  # ✅ send directly
+    EmailOutboxService.enqueue(to_email, subject, body, category=category)
+    return True
 
 
 def send_password_reset_email(user, token):
@@ -28,7 +26,7 @@ def send_password_reset_email(user, token):
 
     If you did not request this, please ignore this email.
     """
-    send_email(user.email, subject, body)
+    send_email(user.email, subject, body, category='password_reset')
 
 
 def send_temporary_password_email(user, temp_password):
@@ -43,4 +41,4 @@ def send_temporary_password_email(user, temp_password):
 
     Please log in and change your password immediately.
     """
-    send_email(user.email, subject, body)
+    send_email(user.email, subject, body, category='temporary_password')
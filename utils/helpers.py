@@ -14,3 +14,8 @@ def get_class_choices():
         ('SHS 3', 'SHS 3'),
     ]
 
+
+def escape_like(value):
+    """Escape LIKE wildcards (and the escape char) so value matches literally; pair with escape='\\'."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
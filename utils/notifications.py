@@ -1,8 +1,10 @@
 # utils/notifications.py
 from datetime import datetime
 import json
-from models import SchoolClass, db, Notification, NotificationRecipient, User, StudentProfile
+from models import SchoolClass, db, Notification
 from flask_login import current_user
+from services.notification_fanout import NotificationFanout
+from services.notification_push import NotificationPush
 
 def create_assignment_notification(assignment):
     """
@@ -27,22 +29,12 @@ def create_assignment_notification(assignment):
         sender_id=getattr(current_user, 'user_id', None) or getattr(current_user, 'admin_id', None)
     )
 
-    db.session.add(notice)
-    db.session.flush()  # get notice.id
-
-    # Find all students in the assigned class (use student.user_id)
-    students = User.query.join(StudentProfile).filter(
-        StudentProfile.current_class == assignment.assigned_class
-    ).all()
-
-    recipients = [
-        NotificationRecipient(notification_id=notice.id, user_id=s.user_id)
-        for s in students if s.user_id
-    ]
-    if recipients:
-        db.session.add_all(recipients)
+    # All students in the assigned class, selected and inserted in one statement
+    audience = NotificationFanout.students_in_class(assignment.assigned_class)
+    NotificationFanout.send(notice, audience)
 
     db.session.commit()
+    NotificationPush.publish(notice, audience)
     return notice
 
 def create_fee_notification(fee_group, sender=None):
@@ -98,8 +90,6 @@ def create_fee_notification(fee_group, sender=None):
         related_id=fee_group.id,
         created_at=datetime.utcnow()
     )
-    db.session.add(notification)
-    db.session.flush()  # Get notification.id
 
     # Map class_level string to SchoolClass
     school_class = SchoolClass.query.filter_by(name=fee_group.class_level).first()
@@ -107,28 +97,14 @@ def create_fee_notification(fee_group, sender=None):
         db.session.rollback()
         raise ValueError(f"No class found matching '{fee_group.class_level}'")
 
-    # Get all students in the class
-    students = User.query.filter_by(class_id=school_class.id, role='student').all()
-
-    # Create recipients for students and optionally parents
-    for student in students:
-        # Notify student
-        db.session.add(NotificationRecipient(
-            notification_id=notification.id,
-            user_id=student.user_id,
-            is_read=False
-        ))
-
-        # Notify parents if you have a relationship student.parents
-        if hasattr(student, 'parents'):
-            for parent in student.parents:
-                db.session.add(NotificationRecipient(
-                    notification_id=notification.id,
-                    user_id=parent.user_id,
-                    is_read=False
-                ))
+    # Students in the class plus their parents (each parent once)
+    students = NotificationFanout.students_with_class_id(school_class.id)
+    audience = NotificationFanout.with_parents(students)
+    NotificationFanout.send(notification, audience)
 
     db.session.commit()
+    NotificationPush.publish(notification, audience)
+    return notification
 
 def create_missed_call_notification(caller_name, target_user_id, conversation_id):
     """
@@ -144,12 +120,9 @@ def create_missed_call_notification(caller_name, target_user_id, conversation_id
         sender_id=getattr(current_user, 'user_id', None) or getattr(current_user, 'admin_id', None)
     )
 
-    db.session.add(notice)
-    db.session.flush()  # get notice.id
-
     # Send to the target user
-    recipient = NotificationRecipient(notification_id=notice.id, user_id=target_user_id)
-    db.session.add(recipient)
+    NotificationFanout.send(notice, [target_user_id])
 
     db.session.commit()
+    NotificationPush.publish(notice, [target_user_id])
     return notice
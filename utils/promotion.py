@@ -5,9 +5,8 @@ CLASS_PROGRESSIONS = [
     "JHS 1", "JHS 2", "JHS 3"
 ]
 
-def promote_student(student, final_score):
-    current_class = student.current_class
-
+def decide_promotion(current_class, final_score):
+    """(status, next_class) for a student in current_class with final_score."""
     if final_score >= 50:
         status = "Promoted"
         if current_class == "Primary 6":
@@ -27,6 +26,11 @@ def promote_student(student, final_score):
     else:
         status = "Repeat"
         next_class = current_class
+    return status, next_class
+
+def promote_student(student, final_score):
+    current_class = student.current_class
+    status, next_class = decide_promotion(current_class, final_score)
 
     student.last_class_completed = current_class if status == "Promoted" else student.last_class_completed
     student.current_class = next_class if next_class else student.current_class
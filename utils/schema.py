@@ -0,0 +1,33 @@
+"""
+Additive schema changes for databases created before a model gained an
+index or a column (db.create_all() only creates missing tables).
+"""
+from sqlalchemy import inspect, text
+
+from utils.extensions import db
+
+
+def ensure_indexes(indexes, dialects=None):
+    """Create whichever of indexes the database lacks. Returns the created index names."""
+    if dialects and db.engine.dialect.name not in dialects:
+        return []
+    inspector = inspect(db.engine)
+    existing = {}
+    created = []
+    for index in indexes:
+        table = index.table.name
+        if table not in existing:
+            existing[table] = {ix['name'] for ix in inspector.get_indexes(table)}
+        if index.name not in existing[table]:
+            index.create(db.engine, checkfirst=True)
+            created.append(index.name)
+    return created
+
+
+def add_column(table, name, ddl):
+    """ALTER TABLE table ADD COLUMN name ddl, unless it exists. True if added."""
+    if name in {c['name'] for c in inspect(db.engine).get_columns(table)}:
+        return False
+    with db.engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+    return True
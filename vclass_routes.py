@@ -15,6 +15,8 @@ from reportlab.lib import colors
 from reportlab.platypus import Table, TableStyle
 from utils.email_utils import send_password_reset_email
 from utils.extensions import db
+from services.attempt_state_service import AttemptStateService
+from services.quiz_payload_cache import QuizPayloadCache
 
 
 vclass_bp = Blueprint('vclass', __name__, url_prefix='/vclass')
@@ -353,9 +355,10 @@ def quiz_instructions(quiz_id):
     if current_user.role != 'student':
         abort(403)
 
-    attempts_made = QuizAttempt.query.filter_by(
-        quiz_id=quiz.id,
-        student_id=current_user.id
+    attempts_made = QuizAttempt.query.filter(
+        QuizAttempt.quiz_id == quiz.id,
+        QuizAttempt.student_id == current_user.id,
+        QuizAttempt.submitted_at.isnot(None)
     ).count()
 
     can_attempt = attempts_made < quiz.attempts_allowed
@@ -377,70 +380,38 @@ def take_quiz(quiz_id):
     if current_user.role != 'student':
         abort(403)
 
-    quiz = Quiz.query.options(
-        joinedload(Quiz.questions).joinedload(Question.options)
-    ).get_or_404(quiz_id)
+    quiz_data = QuizPayloadCache.get(quiz_id)
+    if quiz_data is None:
+        abort(404)
 
     now = datetime.utcnow()
-    if now < quiz.start_datetime:
+    start_datetime, end_datetime = QuizPayloadCache.window(quiz_data)
+    if now < start_datetime:
         flash("This quiz is not yet available.", "warning")
         return redirect(url_for('vclass.virtual_class'))
-    if now > quiz.end_datetime:
+    if now > end_datetime:
         flash("This quiz is past its due date and can no longer be taken.", "danger")
         return redirect(url_for('vclass.virtual_class'))
 
-    start_time = session.get(f'quiz_{quiz.id}_start_time')
+    state = AttemptStateService.get('quiz', quiz_id, current_user.id)
+    start_time = state.started_at.isoformat() if state and not state.finished_at else None
 
-    attempts_made = QuizAttempt.query.filter_by(
-        quiz_id=quiz.id, student_id=current_user.id
+    attempts_made = QuizAttempt.query.filter(
+        QuizAttempt.quiz_id == quiz_id,
+        QuizAttempt.student_id == current_user.id,
+        QuizAttempt.submitted_at.isnot(None)
     ).count()
-    if attempts_made >= quiz.attempts_allowed:
+    if attempts_made >= quiz_data["attempts_allowed"]:
         flash("You have reached the maximum number of attempts for this quiz.", "danger")
-        return redirect(url_for('vclass.quiz_instructions', quiz_id=quiz.id))
-
-    quiz_data = {
-        "id": quiz.id,
-        "title": quiz.title,
-        "duration_minutes": quiz.duration_minutes,
-        "questions": [
-            {
-                "id": q.id,
-                "question_text": q.text,
-                "question_type": q.question_type,
-                "options": [{"id": opt.id, "text": opt.text} for opt in q.options]
-                          if q.question_type in ("mcq", "multiple_choice") else []
-            }
-            for q in Question.query.filter_by(quiz_id=quiz.id).all()  # force only current quiz
-        ]
-    }
-
-    saved_qs = (
-        StudentAnswer.query
-        .join(QuizAttempt, StudentAnswer.attempt_id == QuizAttempt.id)
-        .filter(
-            QuizAttempt.student_id == current_user.id,
-            QuizAttempt.quiz_id == quiz.id
-        )
-        .all()
-    )
+        return redirect(url_for('vclass.quiz_instructions', quiz_id=quiz_id))
 
-    saved_answers = {}
-    for a in saved_qs:
-        if a.selected_option_id is not None:
-            saved_answers[a.question_id] = a.selected_option_id
-        elif a.answer_text:
-            try:
-                parsed = json.loads(a.answer_text)
-                saved_answers[a.question_id] = parsed
-            except Exception:
-                saved_answers[a.question_id] = a.answer_text
+    saved_answers = QuizPayloadCache.saved_answers(quiz_id, current_user.id)
 
     csrf_token_value = generate_csrf()
 
     return render_template(
         'vclass/take_quiz.html',
         quiz_json=quiz_data,
-        questions=quiz.questions,
         session=session,
         csrf_token_value=csrf_token_value,
         saved_answers=saved_answers,
@@ -451,11 +422,18 @@ def take_quiz(quiz_id):
 @vclass_bp.route('/start-quiz-timer/<int:quiz_id>', methods=['POST'], endpoint='start_quiz_timer')
 @login_required
 def start_quiz_timer(quiz_id):
-    key = f'quiz_{quiz_id}_start_time'
-    if key not in session:
-        session[key] = datetime.utcnow().isoformat()
-        session.modified = True
-    return jsonify({'status': 'started'})
+    quiz = Quiz.query.get_or_404(quiz_id)
+    state = AttemptStateService.start(
+        'quiz', quiz.id, current_user.id,
+        duration_minutes=quiz.duration_minutes,
+        hard_end=quiz.end_datetime
+    )
+    return jsonify({
+        'status': 'started',
+        'started_at': state.started_at.isoformat(),
+        'deadline': state.deadline.isoformat(),
+        'seconds_left': state.seconds_left()
+    })
 
 
 @vclass_bp.route('/autosave_answer', methods=['POST'])
@@ -474,11 +452,16 @@ def autosave_answer():
     if not quiz_id or not question_id:
         return jsonify({'ok': False, 'error': 'missing quiz_id or question_id'}), 400
 
-    # 🔑 STEP 1: Get or create active attempt
+    state = AttemptStateService.get('quiz', quiz_id, current_user.id)
+    if state and (state.finished_at or state.is_expired()):
+        return jsonify({'ok': False, 'error': 'time is up'}), 409
+
+    # 🔑 STEP 1: Get or create active (unsubmitted) attempt
     attempt = QuizAttempt.query.filter_by(
         quiz_id=quiz_id,
-        student_id=current_user.id
-    ).first()
+        student_id=current_user.id,
+        submitted_at=None
+    ).order_by(QuizAttempt.id.desc()).first()
 
     if not attempt:
         attempt = QuizAttempt(
@@ -513,34 +496,11 @@ def autosave_answer():
 @login_required
 def get_saved_answers(quiz_id):
     # If already submitted -> empty (no restore)
-    submitted = QuizAttempt.query.filter_by(quiz_id=quiz_id, student_id=current_user.id).count()
-    if submitted > 0:
+    state = AttemptStateService.get('quiz', quiz_id, current_user.id)
+    if state and state.finished_at:
         return jsonify({})
 
-    # Join StudentAnswer with QuizAttempt to filter by student and quiz
-    answers = (
-        db.session.query(StudentAnswer)
-        .join(QuizAttempt)
-        .filter(
-            QuizAttempt.student_id == current_user.id,
-            QuizAttempt.quiz_id == quiz_id
-        )
-        .all()
-    )
-
-    result = {}
-    for a in answers:
-        if a.selected_option_id is not None:
-            result[str(a.question_id)] = a.selected_option_id
-        elif a.answer_text:
-            try:
-                parsed = json.loads(a.answer_text)
-                result[str(a.question_id)] = parsed
-            except Exception:
-                result[str(a.question_id)] = a.answer_text
-        else:
-            result[str(a.question_id)] = ""
-    return jsonify(result)
+    return jsonify(QuizPayloadCache.saved_answers(quiz_id, current_user.id))
 
 from difflib import SequenceMatcher
 import json
@@ -563,23 +523,35 @@ def submit_quiz(quiz_id):
     quiz = Quiz.query.options(joinedload(Quiz.questions).joinedload(Question.options)).get_or_404(quiz_id)
 
     # prevent double attempts
-    attempts_made = QuizAttempt.query.filter_by(quiz_id=quiz_id, student_id=current_user.id).count()
+    attempts_made = QuizAttempt.query.filter(
+        QuizAttempt.quiz_id == quiz_id,
+        QuizAttempt.student_id == current_user.id,
+        QuizAttempt.submitted_at.isnot(None)
+    ).count()
     if attempts_made >= quiz.attempts_allowed:
         flash("No more attempts allowed.", "danger")
         return redirect(url_for('vclass.quiz_instructions', quiz_id=quiz_id))
 
-    # load autosaved DB answers for fallback
-    saved_answers_db = {str(a.question_id): a for a in StudentAnswer.query.join(QuizAttempt) .filter(QuizAttempt.student_id == current_user.id, QuizAttempt.quiz_id == quiz_id).all()}
+    # the attempt autosave has been writing to; its answers are the fallback
+    attempt = QuizAttempt.query.filter_by(
+        quiz_id=quiz_id, student_id=current_user.id, submitted_at=None
+    ).order_by(QuizAttempt.id.desc()).first()
+    saved_answers_db = {str(a.question_id): a for a in StudentAnswer.query.filter_by(attempt_id=attempt.id).all()} if attempt else {}
+
+    # past the deadline (plus grace) only answers autosaved in time count
+    state = AttemptStateService.get('quiz', quiz_id, current_user.id)
+    accept_form = state is None or AttemptStateService.accepts_submission(state)
 
     def get_submitted_value(q):
-        # 1) check request form for blanks
-        blanks = request.form.getlist(f'answers[{q.id}][]')
-        if blanks and any([b.strip() for b in blanks]):
-            return blanks
-        # 2) single value from form
-        val = request.form.get(f'answers[{q.id}]')
-        if val is not None and val != '':
-            return val
+        if accept_form:
+            # 1) check request form for blanks
+            blanks = request.form.getlist(f'answers[{q.id}][]')
+            if blanks and any([b.strip() for b in blanks]):
+                return blanks
+            # 2) single value from form
+            val = request.form.get(f'answers[{q.id}]')
+            if val is not None and val != '':
+                return val
         # 3) fallback to DB saved
         saved = saved_answers_db.get(str(q.id))
         if saved:
@@ -670,20 +642,18 @@ def submit_quiz(quiz_id):
     )
     db.session.add(submission)
 
-    attempt = QuizAttempt(
-        student_id=current_user.id,
-        quiz_id=quiz.id,
-        score=score,
-        submitted_at=datetime.utcnow()
-    )
-    db.session.add(attempt)
+    # close the autosaved attempt (so its answers are not restored again), or record a new one
+    if attempt is None:
+        attempt = QuizAttempt(student_id=current_user.id, quiz_id=quiz.id)
+        db.session.add(attempt)
+    attempt.score = score
+    attempt.submitted_at = datetime.utcnow()
+
+    AttemptStateService.finish(state)
 
     # optional: mark StudentAnswer rows as attached to attempt (if you have attempt_id FK)
     db.session.commit()
 
-    # clear session timer
-    session.pop(f'quiz_{quiz.id}_start_time', None)
-
     flash("Quiz submitted successfully.", "success")
     return redirect(url_for('vclass.quiz_result', submission_id=submission.id))
 